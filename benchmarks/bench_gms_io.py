@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# Throughput benchmark of the gms_io writers and duplicate checkers, so that
+# their performance at production volumes is known and regressions show up
+#
+# Run from the root of the repository:
+#     python3 benchmarks/bench_gms_io.py --records 100000 --output gms_io.json
+#
+# Redis and MongoDB are used if they are running locally. Otherwise, the
+# in-process fakes from the fakeredis and mongomock modules are used if they
+# are installed, and the combinations needing them are skipped if not.
+
+import contextlib
+import itertools
+import json
+import multiprocessing
+import optparse
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import unittest.mock
+
+sys.path.insert(0,
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gmaps_scraper import gms_io
+
+WRITERS = ["json", "pickle", "mongo"]
+CHECKERS = ["none", "sqlite", "redis"]
+
+REDIS_ADDRESS = ("localhost", 6379)
+MONGO_ADDRESS = ("localhost", 27017)
+
+# Fraction of the records whose place_id was already dumped, as places are
+# returned by more than one cell of a scrape
+DUPLICATE_FRACTION = 0.25
+
+PLACE_TYPES = ["restaurant", "cafe", "bar", "store", "food",
+               "point_of_interest", "establishment"]
+
+def peak_memory():
+    """ Get the peak resident set size of the current process
+
+    Returns:
+        An integer describing the peak resident set size in bytes.
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if (sys.platform == "darwin"):
+        return peak
+    return peak*1024
+
+def is_listening(address):
+    """ Determine whether a server is listening at an address
+
+    Args:
+        address: A (host, port) tuple.
+
+    Returns:
+        True if a connection could be made; False otherwise.
+    """
+
+    with contextlib.closing(socket.socket()) as connection:
+        connection.settimeout(0.5)
+        return connection.connect_ex(address) == 0
+
+def synthetic_places(count, duplicate_fraction, seed = 0):
+    """ Generate place dictionaries shaped like places_nearby results
+
+    Args:
+        count: An integer describing the number of places to generate.
+        duplicate_fraction: A float describing the fraction of the places that
+            repeat the place_id of an earlier place.
+        seed: An integer seeding the random number generator.
+
+    Yields:
+        Place dictionaries.
+    """
+
+    generator = random.Random(seed)
+    for i in range(count):
+        if (i > 0 and generator.random() < duplicate_fraction):
+            number = generator.randrange(i)
+        else:
+            number = i
+        latitude = generator.uniform(42.23, 42.40)
+        longitude = generator.uniform(-71.19, -70.99)
+        yield {
+            "place_id": "ChIJ%023d" % number,
+            "id": "%040x" % number,
+            "name": "Synthetic place %d" % number,
+            "geometry": {
+                "location": {
+                    "lat": latitude,
+                    "lng": longitude
+                },
+                "viewport": {
+                    "northeast": {
+                        "lat": latitude + 0.001,
+                        "lng": longitude + 0.001
+                    },
+                    "southwest": {
+                        "lat": latitude - 0.001,
+                        "lng": longitude - 0.001
+                    }
+                }
+            },
+            "icon": "https://maps.gstatic.com/mapfiles/place_api/icons/"
+                    "generic_business-71.png",
+            "rating": round(generator.uniform(1, 5), 1),
+            "reference": "CmRR%060d" % number,
+            "scope": "GOOGLE",
+            "types": generator.sample(PLACE_TYPES, 3),
+            "vicinity": "%d Synthetic Street, Boston" % number
+        }
+
+def new_checker(checker, directory):
+    """ Initialize a duplicate checker
+
+    Args:
+        checker: A string containing one of CHECKERS.
+        directory: A string containing a directory for files.
+
+    Returns:
+        A duplicate checker object provided by the gms_io library.
+    """
+
+    if (checker == "sqlite"):
+        return gms_io.SQLite3DuplicateChecker(
+            db_path = "%s/seen_places.db" % directory
+        )
+    elif (checker == "redis"):
+        duplicate_checker = gms_io.RedisDuplicateChecker(
+            set_name = "bench_gms_io:%d" % os.getpid(),
+            redis_host = REDIS_ADDRESS[0],
+            redis_port = REDIS_ADDRESS[1]
+        )
+        duplicate_checker.flush()
+        return duplicate_checker
+    return gms_io.DuplicateChecker()
+
+def new_writer(writer, directory):
+    """ Initialize a writer
+
+    Args:
+        writer: A string containing one of WRITERS.
+        directory: A string containing a directory for files.
+
+    Returns:
+        A writer object provided by the gms_io library.
+    """
+
+    if (writer == "pickle"):
+        return gms_io.PickleWriter("%s/data.p" % directory)
+    elif (writer == "mongo"):
+        mongo_writer = gms_io.MongoWriter(
+            "bench_gms_io_%d" % os.getpid(),
+            db_name = "bench_gms_io",
+            host = "%s:%d" % MONGO_ADDRESS
+        )
+        mongo_writer.flush()
+        return mongo_writer
+    return gms_io.JSONWriter("%s/data.json" % directory)
+
+def backends(writer, checker):
+    """ Find the servers a combination needs, or the fakes standing in for
+    them
+
+    Args:
+        writer: A string containing one of WRITERS.
+        checker: A string containing one of CHECKERS.
+
+    Returns:
+        A (patches, reason) tuple, where patches is a list of context managers
+        that replace missing servers with fakes, and reason is a string
+        explaining why the combination cannot be run, or None if it can.
+    """
+
+    patches = []
+
+    if (checker == "redis"):
+        if (not hasattr(gms_io, "RedisDuplicateChecker")):
+            return (patches, "the redis module is not installed")
+        if (not is_listening(REDIS_ADDRESS)):
+            try:
+                import fakeredis
+            except ImportError:
+                return (patches, "Redis is not running and fakeredis is not "
+                                 "installed")
+            patches.append(unittest.mock.patch.object(
+                gms_io.redis, "StrictRedis", fakeredis.FakeStrictRedis
+            ))
+
+    if (writer == "mongo"):
+        if (not hasattr(gms_io, "MongoWriter")):
+            return (patches, "the pymongo module is not installed")
+        if (not is_listening(MONGO_ADDRESS)):
+            try:
+                import mongomock
+            except ImportError:
+                return (patches, "MongoDB is not running and mongomock is not "
+                                 "installed")
+            patches.append(mongomock.patch(servers = (MONGO_ADDRESS,)))
+
+    return (patches, None)
+
+def percentile(values, fraction):
+    """ Find a percentile of a list of values
+
+    Args:
+        values: A sorted list of numbers.
+        fraction: A float between 0 and 1.
+
+    Returns:
+        The value below which the given fraction of the values lie.
+    """
+
+    return values[min(len(values) - 1, int(fraction*len(values)))]
+
+def run_benchmark(writer, checker, batch_size, options):
+    """ Dump synthetic places with one writer and duplicate checker
+
+    Generating the places is not timed.
+
+    Args:
+        writer: A string containing one of WRITERS.
+        checker: A string containing one of CHECKERS.
+        batch_size: An integer describing the number of places per dump.
+        options: An array generated by an OptionParser.
+
+    Returns:
+        A dictionary of measurements.
+    """
+
+    result = {
+        "writer": writer,
+        "checker": checker,
+        "batch_size": batch_size,
+        "records": options.records
+    }
+
+    patches, reason = backends(writer, checker)
+    if (reason is not None):
+        result["skipped"] = reason
+        return result
+
+    directory = tempfile.mkdtemp(prefix = "bench_gms_io_",
+                                 dir = options.directory)
+    latencies = []
+    try:
+        with contextlib.ExitStack() as stack:
+            for patch in patches:
+                stack.enter_context(patch)
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+
+            new_gms_writer = new_writer(writer, directory)
+            new_gms_writer.duplicate_checker = new_checker(checker,
+                                                           directory)
+
+            places = synthetic_places(options.records, options.duplicates)
+            while True:
+                batch = list(itertools.islice(places, batch_size))
+                if (len(batch) == 0):
+                    break
+
+                start_time = time.perf_counter()
+                new_gms_writer.dump(batch)
+                latencies.append(time.perf_counter() - start_time)
+
+            if (writer == "mongo"):
+                new_gms_writer.flush()
+            new_gms_writer.duplicate_checker.flush()
+    finally:
+        shutil.rmtree(directory, ignore_errors = True)
+
+    latencies.sort()
+    result.update({
+        "seconds": sum(latencies),
+        "records_per_second": options.records/max(sum(latencies), 1e-9),
+        "dumps": len(latencies),
+        "p50_dump_seconds": percentile(latencies, 0.5),
+        "p99_dump_seconds": percentile(latencies, 0.99),
+        "peak_memory_bytes": peak_memory()
+    })
+    return result
+
+def benchmark_worker(combination, options, queue):
+    """ Run a benchmark in a process of its own, so that its peak memory is
+    measured on its own
+
+    Args:
+        combination: A (writer, checker, batch_size) tuple.
+        options: An array generated by an OptionParser.
+        queue: A multiprocessing.Queue that the measurements are put in, or
+            a dictionary with an "error" key if the benchmark failed.
+    """
+
+    try:
+        queue.put(run_benchmark(*(combination + (options,))))
+    except Exception as err:
+        writer, checker, batch_size = combination
+        queue.put({"writer": writer, "checker": checker,
+                   "batch_size": batch_size, "error": "%s" % err})
+        raise
+
+def main():
+    parser = optparse.OptionParser(
+        usage = "Usage: python3 benchmarks/bench_gms_io.py [options]"
+    )
+    parser.add_option("--records", dest = "records", metavar = "N",
+                      help = "The number of places dumped by each benchmark "
+                             "(default 100000)",
+                      default = 100000, type = "int")
+    parser.add_option("--batch-sizes", dest = "batch_sizes",
+                      metavar = "SIZES",
+                      help = "The numbers of places per dump, separated by "
+                             "commas (default 1,50,1000)",
+                      default = "1,50,1000")
+    parser.add_option("--writers", dest = "writers", metavar = "WRITERS",
+                      help = "The writers to benchmark, separated by commas "
+                             "(default %s)" % ",".join(WRITERS),
+                      default = ",".join(WRITERS))
+    parser.add_option("--checkers", dest = "checkers", metavar = "CHECKERS",
+                      help = "The duplicate checkers to benchmark, separated "
+                             "by commas (default %s)" % ",".join(CHECKERS),
+                      default = ",".join(CHECKERS))
+    parser.add_option("--duplicates", dest = "duplicates",
+                      metavar = "FRACTION",
+                      help = "The fraction of places that repeat an earlier "
+                             "place_id (default %s)" % DUPLICATE_FRACTION,
+                      default = DUPLICATE_FRACTION, type = "float")
+    parser.add_option("--directory", dest = "directory", metavar = "PATH",
+                      help = "Write files to temporary directories in PATH "
+                             "(default the system's temporary directory)")
+    parser.add_option("--output", dest = "output", metavar = "PATH",
+                      help = "Write the measurements to a JSON file at PATH")
+    (options, args) = parser.parse_args()
+
+    writers = options.writers.split(",")
+    checkers = options.checkers.split(",")
+    batch_sizes = [int(size) for size in options.batch_sizes.split(",")]
+    for writer in writers:
+        if (writer not in WRITERS):
+            parser.error("Unknown writer %s; expected one of %s"
+                         % (writer, ", ".join(WRITERS)))
+    for checker in checkers:
+        if (checker not in CHECKERS):
+            parser.error("Unknown checker %s; expected one of %s"
+                         % (checker, ", ".join(CHECKERS)))
+
+    context = multiprocessing.get_context("spawn")
+    measurements = []
+    print("%-7s %-7s %6s %12s %10s %10s %9s" % (
+        "writer", "checker", "batch", "records/s", "p50 ms", "p99 ms",
+        "peak MB"
+    ))
+    for writer in writers:
+        for checker in checkers:
+            # MongoWriter ignores duplicate checkers
+            if (writer == "mongo" and checker != "none"):
+                continue
+
+            for batch_size in batch_sizes:
+                queue = context.Queue()
+                process = context.Process(
+                    target = benchmark_worker,
+                    args = ((writer, checker, batch_size), options, queue)
+                )
+                process.start()
+                result = queue.get()
+                process.join()
+
+                measurements.append(result)
+                if ("skipped" in result or "error" in result):
+                    print("%-7s %-7s %6d %s" % (
+                        writer, checker, batch_size,
+                        result.get("skipped", result.get("error"))
+                    ))
+                    continue
+                print("%-7s %-7s %6d %12.0f %10.3f %10.3f %9.1f" % (
+                    writer, checker, batch_size,
+                    result["records_per_second"],
+                    result["p50_dump_seconds"]*1000,
+                    result["p99_dump_seconds"]*1000,
+                    result["peak_memory_bytes"]/1e6
+                ))
+
+    if (options.output is not None):
+        with open(options.output, "w") as f:
+            json.dump({
+                "options": vars(options),
+                "environment": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S")
+                },
+                "results": measurements
+            }, f, indent = 4)
+
+if (__name__ == "__main__"):
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# End-to-end benchmark of the scrapers against a local mock of the Google
+# Places API, so that changes to the scrapers can be measured for free
+#
+# Run from the root of the repository:
+#     python3 benchmarks/bench_scrapers.py --model synthetic:5000 --latency 0.05
+
+import contextlib
+import json
+import multiprocessing
+import optparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import googlemaps
+
+sys.path.insert(0,
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gmaps_scraper import eventlog, mock_places, planner, ratelimit, scrapers
+
+# The region places are drawn in, around Boston
+REGION = {
+    "min_latitude": 42.23,
+    "max_latitude": 42.40,
+    "min_longitude": -71.19,
+    "max_longitude": -70.99
+}
+GRID_WIDTH = 3
+
+BENCHMARKS = ["places_nearby", "places_radar", "text_radar", "details"]
+
+def peak_memory():
+    """ Get the peak resident set size of the current process
+
+    Returns:
+        An integer describing the peak resident set size in bytes.
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if (sys.platform == "darwin"):
+        return peak
+    return peak*1024
+
+def new_scraper(name, options, **kwargs):
+    """ Initialize the scraper to be benchmarked
+
+    Args:
+        name: A string containing one of BENCHMARKS.
+        options: An array generated by an OptionParser.
+        kwargs: A dictionary of keyword arguments to be passed to the scraper.
+
+    Returns:
+        A scraper object.
+    """
+
+    if (name == "details"):
+        return scrapers.DetailScraper(max_in_flight = options.max_in_flight,
+                                      **kwargs)
+    elif (name == "text_radar"):
+        return scrapers.PlacesTextScraper(
+            detail_max_in_flight = options.max_in_flight, **kwargs
+        )
+    elif (options.max_in_flight > 1):
+        kwargs["max_in_flight"] = options.max_in_flight
+        if (name == "places_nearby"):
+            return scrapers.AsyncPlacesNearbyScraper(**kwargs)
+        return scrapers.AsyncPlacesRadarScraper(**kwargs)
+    elif (name == "places_nearby"):
+        return scrapers.PlacesNearbyScraper(**kwargs)
+    return scrapers.PlacesRadarScraper(**kwargs)
+
+def run_benchmark(name, options):
+    """ Run one scraper against a mock of the API
+
+    Args:
+        name: A string containing one of BENCHMARKS.
+        options: An array generated by an OptionParser.
+
+    Returns:
+        A dictionary of measurements.
+    """
+
+    points = planner.density_model(options.model).points(**REGION)
+    client = mock_places.MockClient(points, latency = options.latency,
+                                    jitter = options.jitter,
+                                    error_rate = options.error_rate,
+                                    token_delay = options.token_delay)
+    server = None
+    if (options.http):
+        server = mock_places.MockServer(client).start()
+        gmaps = googlemaps.Client(key = mock_places.MOCK_API_KEY,
+                                  base_url = server.url,
+                                  queries_per_second = 1000000,
+                                  queries_per_minute = 1000000)
+    else:
+        gmaps = client
+
+    # The output of the scraper is only kept until the benchmark ends
+    scrapers.OUTPUT_DIRECTORY_ROOT = tempfile.mkdtemp(prefix = "benchmark_")
+    start_time = time.time()
+    try:
+        with open(os.devnull, "w") as devnull:
+            with contextlib.redirect_stdout(
+                    sys.stdout if (options.verbose) else devnull):
+                scraper = new_scraper(
+                    name, options,
+                    gmaps = gmaps,
+                    output_directory_name = "benchmark_%s" % name,
+                    flush_output = True,
+                    rate_limiter = ratelimit.RateLimiter(),
+                    log_level = (eventlog.DEBUG if (options.verbose)
+                                 else eventlog.DEFAULT_LEVEL)
+                )
+                if (name == "details"):
+                    scraper.scrape(["simulated_%d" % i
+                                    for i in range(len(points))])
+                    unique_places = len(points)
+                else:
+                    scraper.page_token_delay = options.token_delay
+                    scraper.scrape_subdivisions(grid_width = GRID_WIDTH,
+                                                query = "benchmark", **REGION)
+                    unique_places = len(scraper.unique_places)
+    finally:
+        if (server is not None):
+            server.stop()
+        seconds = time.time() - start_time
+        eventlog.default_writer().release(scrapers.OUTPUT_DIRECTORY_ROOT)
+        eventlog.default_writer().flush()
+        shutil.rmtree(scrapers.OUTPUT_DIRECTORY_ROOT, ignore_errors = True)
+
+    requests = sum(client.requests.values())
+    return {
+        "benchmark": name,
+        "places": len(points),
+        "unique_places": unique_places,
+        "requests": dict(client.requests),
+        "errors_injected": sum(client.errors.values()),
+        "requests_per_place": (float(requests)/unique_places
+                               if (unique_places > 0) else None),
+        "seconds": seconds,
+        "peak_memory_bytes": peak_memory()
+    }
+
+def benchmark_worker(name, options, queue):
+    """ Run a benchmark in a process of its own, so that its peak memory is
+    measured on its own
+
+    Args:
+        name: A string containing one of BENCHMARKS.
+        options: An array generated by an OptionParser.
+        queue: A multiprocessing.Queue that the measurements are put in, or
+            a dictionary with an "error" key if the benchmark failed.
+    """
+
+    try:
+        queue.put(run_benchmark(name, options))
+    except Exception as err:
+        queue.put({"benchmark": name, "error": "%s" % err})
+        raise
+
+def main():
+    parser = optparse.OptionParser(
+        usage = "Usage: python3 benchmarks/bench_scrapers.py [options]"
+    )
+    parser.add_option("--benchmarks", dest = "benchmarks", metavar = "NAMES",
+                      help = "The benchmarks to run, separated by commas "
+                             "(default %s)" % ",".join(BENCHMARKS),
+                      default = ",".join(BENCHMARKS))
+    parser.add_option("--model", dest = "model", metavar = "MODEL",
+                      help = "The density model the places are drawn from: "
+                             "uniform[:PLACES_PER_KM2], synthetic[:PLACES] or "
+                             "the output file of a previous scrape (default "
+                             "synthetic:2000)",
+                      default = "synthetic:2000")
+    parser.add_option("--latency", dest = "latency", metavar = "SECONDS",
+                      help = "The time every request takes (default 0)",
+                      default = 0.0, type = "float")
+    parser.add_option("--jitter", dest = "jitter", metavar = "SECONDS",
+                      help = "The largest random time added to the latency "
+                             "(default 0)",
+                      default = 0.0, type = "float")
+    parser.add_option("--error-rate", dest = "error_rate",
+                      metavar = "FRACTION",
+                      help = "The fraction of requests that fail (default 0)",
+                      default = 0.0, type = "float")
+    parser.add_option("--token-delay", dest = "token_delay",
+                      metavar = "SECONDS",
+                      help = "The time before a next_page_token becomes "
+                             "valid, which scrapers wait for (default 0)",
+                      default = 0.0, type = "float")
+    parser.add_option("--max-in-flight", dest = "max_in_flight",
+                      metavar = "N",
+                      help = "Make up to N requests at once (default 1)",
+                      default = 1, type = "int")
+    parser.add_option("--http", dest = "http", action = "store_true",
+                      help = "Serve the mock over HTTP and make requests "
+                             "with googlemaps.Client",
+                      default = False)
+    parser.add_option("--output", dest = "output", metavar = "PATH",
+                      help = "Write the measurements to a JSON file at PATH")
+    parser.add_option("--verbose", dest = "verbose", action = "store_true",
+                      help = "Print the output of the scrapers",
+                      default = False)
+    (options, args) = parser.parse_args()
+
+    names = options.benchmarks.split(",")
+    for name in names:
+        if (name not in BENCHMARKS):
+            parser.error("Unknown benchmark %s; expected one of %s"
+                         % (name, ", ".join(BENCHMARKS)))
+
+    context = multiprocessing.get_context("spawn")
+    measurements = []
+    print("%-14s %8s %9s %12s %10s %10s" % (
+        "benchmark", "places", "requests", "req/place", "seconds", "peak MB"
+    ))
+    for name in names:
+        queue = context.Queue()
+        process = context.Process(target = benchmark_worker,
+                                  args = (name, options, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+
+        measurements.append(result)
+        if ("error" in result):
+            print("%-14s failed: %s" % (name, result["error"]))
+            continue
+        print("%-14s %8d %9d %12.3f %10.2f %10.1f" % (
+            name,
+            result["unique_places"],
+            sum(result["requests"].values()),
+            result["requests_per_place"] or 0,
+            result["seconds"],
+            result["peak_memory_bytes"]/1e6
+        ))
+
+    if (options.output is not None):
+        with open(options.output, "w") as f:
+            json.dump({"options": vars(options), "results": measurements}, f,
+                      indent = 4)
+
+if (__name__ == "__main__"):
+    main()
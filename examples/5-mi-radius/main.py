@@ -1,13 +1,26 @@
 #!/usr/bin/env python3
 
 import csv
+import datetime
+import googlemaps
 import json
 import math
 import time
 
+import gmaps_scraper
+
 API_KEY = "API KEY HERE"
 TIMEOUT = 600
 
+# Shared with any other scraper using the same API key, such as
+# examples/continuous, so that they draw from a single quota
+RATE_LIMITER = gmaps_scraper.ratelimit.SQLite3RateLimiter.from_period(
+    gmaps_scraper.scrapers.MAX_REQUESTS_PER_PERIOD,
+    gmaps_scraper.scrapers.PERIOD_LENGTH,
+    gmaps_scraper.scrapers.MAX_BURST,
+    db_path = "../quota.db"
+)
+
 RADIUS_OF_EARTH = 6371000
 
 def haversine(lon1, lat1, lon2, lat2):
@@ -241,7 +254,8 @@ if (__name__ == "__main__"):
                     timeout = TIMEOUT
                 ),
                 output_directory_name = scrape_name,
-                writer = "mongo"
+                writer = "mongo",
+                rate_limiter = RATE_LIMITER
             )
             for bbox in scraping_bboxes:
                 scraper.scrape_subdivisions(
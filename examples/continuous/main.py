@@ -13,6 +13,15 @@ import gmaps_scraper
 API_KEY = "API_KEY_HERE"
 TIMEOUT = 600
 
+# Shared with any other scraper using the same API key, such as
+# examples/5-mi-radius, so that they draw from a single quota
+RATE_LIMITER = gmaps_scraper.ratelimit.SQLite3RateLimiter.from_period(
+    gmaps_scraper.scrapers.MAX_REQUESTS_PER_PERIOD,
+    gmaps_scraper.scrapers.PERIOD_LENGTH,
+    gmaps_scraper.scrapers.MAX_BURST,
+    db_path = "../quota.db"
+)
+
 with open("top50cities.csv", "r") as f:
     BOUNDING_BOXES = collections.OrderedDict(
         (
@@ -40,7 +49,8 @@ def scrape_city(city):
     gmaps_scraper.scrapers.PlacesNearbyScraper(
         gmaps = googlemaps.Client(API_KEY, timeout = TIMEOUT),
         output_directory_name = scrape_name,
-        writer = "mongo"
+        writer = "mongo",
+        rate_limiter = RATE_LIMITER
     ).scrape_subdivisions(
         grid_width = 3,
         query = "", # no place_type causes google to return all place types
@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 
-__all__ = ["geo", "gms_io", "parse_tiger", "scrapers", "staticmaps"]
+__all__ = ["cache", "eventlog", "frontier", "geo", "gms_io", "mock_places",
+           "parse_tiger", "planner", "ratelimit", "saturation", "scrapers",
+           "staticmaps", "telemetry"]
 
+from . import cache
+from . import eventlog
+from . import frontier
 from . import geo
 from . import gms_io
+from . import mock_places
 from . import parse_tiger
+from . import planner
+from . import ratelimit
+from . import saturation
 from . import scrapers
 from . import staticmaps
+from . import telemetry
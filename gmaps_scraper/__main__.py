@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 
+import concurrent.futures
 import glob
+import googlemaps
 import os
+import shutil
 import sys
+import tempfile
+import threading
 import time
 
-from gmaps_scraper import parse_tiger, scrapers
+from gmaps_scraper import (cache, eventlog, frontier, geo, gms_io,
+                           parse_tiger, planner, ratelimit, saturation,
+                           scrapers, telemetry)
 
 # There are 96 types of places that can be acquired
 PLACE_TYPES = [
@@ -104,6 +111,281 @@ PLACE_TYPES = [
 
 VALID_SCRAPE_TYPES = ["places_radar", "places_nearby", "text_radar"]
 
+# The scrapers that re-scrape the failed cells of each scrape type. See
+# SubdivisionScraper.SCRAPE_TYPE.
+ERROR_SCRAPERS = {
+    "places_nearby": scrapers.PlacesNearbyScraper,
+    "places_radar": scrapers.PlacesRadarScraper,
+    "text_radar": scrapers.PlacesTextScraper
+}
+
+def new_rate_limiter(options):
+    """ Initialize the rate limiter chosen with --shared-quota
+
+    Args:
+        options: An array generated by an OptionParser
+
+    Returns:
+        A rate limiter shared with other processes, or None if every scraper
+        should get its own rate limiter
+    """
+
+    if (options.shared_quota is None):
+        return None
+
+    budget = (scrapers.MAX_REQUESTS_PER_PERIOD, scrapers.PERIOD_LENGTH,
+              scrapers.MAX_BURST)
+    if (options.shared_quota == "redis"):
+        print("Sharing quota using Redis")
+        return ratelimit.RedisRateLimiter.from_period(*budget)
+
+    print("Sharing quota using %s" % options.shared_quota)
+    return ratelimit.SQLite3RateLimiter.from_period(
+        *budget, db_path = options.shared_quota
+    )
+
+def new_response_cache(options):
+    """ Initialize the response cache chosen with --cache
+
+    Args:
+        options: An array generated by an OptionParser
+
+    Returns:
+        A cache.SQLite3ResponseCache object, or None if responses should not
+        be cached
+    """
+
+    if (options.cache is None):
+        return None
+
+    print("Caching responses in %s" % options.cache)
+    return cache.SQLite3ResponseCache(db_path = options.cache)
+
+def print_cache_stats(response_cache):
+    """ Print the hit and miss counters of a response cache, if there is one
+
+    Args:
+        response_cache: A response cache object or None.
+    """
+
+    if (response_cache is not None):
+        stats = response_cache.stats()
+        print("Response cache: %d hits, %d misses (%.1f%% hit rate)" % (
+            stats["hits"], stats["misses"], stats["hit_rate"]*100
+        ))
+
+def new_metrics(options):
+    """ Initialize the metrics the scrapers record, and export them as chosen
+    with --metrics-file, --metrics-port and --metrics-summary
+
+    Args:
+        options: An array generated by an OptionParser
+
+    Returns:
+        A telemetry.Metrics object
+    """
+
+    metrics = telemetry.Metrics()
+    if (options.metrics_file is not None):
+        print("Writing metrics to %s" % options.metrics_file)
+        telemetry.TextfileExporter(metrics, options.metrics_file).start()
+    if (options.metrics_port is not None):
+        server = telemetry.MetricsServer(metrics, host = "",
+                                         port = options.metrics_port).start()
+        print("Serving metrics at http://localhost:%d/metrics"
+              % server.server_address[1])
+    telemetry.export_at_exit(metrics, summary_path = options.metrics_summary,
+                             textfile_path = options.metrics_file)
+    return metrics
+
+def new_subdivision_scraper(options, **scraper_kwargs):
+    """ Initialize a places_nearby or places_radar scraper
+
+    Args:
+        options: An array generated by an OptionParser
+        scraper_kwargs: A dictionary of keyword arguments to be passed to the
+            scraper.
+
+    Returns:
+        A scraper of the class chosen by options.type and options.max_in_flight
+    """
+
+    if (options.max_in_flight > 1):
+        scraper_kwargs["max_in_flight"] = options.max_in_flight
+        if (options.type == "places_nearby"):
+            return scrapers.AsyncPlacesNearbyScraper(**scraper_kwargs)
+        return scrapers.AsyncPlacesRadarScraper(**scraper_kwargs)
+
+    if (options.type == "places_nearby"):
+        return scrapers.PlacesNearbyScraper(**scraper_kwargs)
+    return scrapers.PlacesRadarScraper(**scraper_kwargs)
+
+def shared_scraper_kwargs(scraper_kwargs):
+    """ Initialize the output directory, rate limiter and writer to be shared
+    by several scrapers running in different threads
+
+    Args:
+        scraper_kwargs: A dictionary of keyword arguments to be passed to each
+            scraper.
+
+    Returns:
+        A (base_scraper, shared_kwargs) tuple, where base_scraper is the Scraper
+        that initialized the shared objects and shared_kwargs is a copy of
+        scraper_kwargs that passes them on.
+    """
+
+    base_scraper = scrapers.Scraper(**scraper_kwargs)
+    shared_kwargs = dict(scraper_kwargs,
+                         rate_limiter = base_scraper.rate_limiter,
+                         writer = gms_io.SynchronizedWriter(base_scraper.writer),
+                         flush_duplicates = False)
+    return (base_scraper, shared_kwargs)
+
+def scrape_place_types(options, types_to_scrape, scraper_kwargs, kwargs):
+    """ Scrape several place types at once using a pool of worker threads
+
+    Each place type is scraped by its own scraper with its own state file, but
+    all of the scrapers share one rate limiter and one writer, and, with it,
+    one duplicate checker.
+
+    Args:
+        options: An array generated by an OptionParser
+        types_to_scrape: A list of strings containing place types.
+        scraper_kwargs: A dictionary of keyword arguments to be passed to each
+            scraper.
+        kwargs: A dictionary of keyword arguments to be passed to each call to
+            scrape_subdivisions.
+    """
+
+    base_scraper, shared_kwargs = shared_scraper_kwargs(scraper_kwargs)
+
+    def scrape_place_type(place_type):
+        new_scraper = new_subdivision_scraper(
+            options,
+            state_file = "%s/%s_state.json" % (base_scraper.output_directory,
+                                               place_type),
+            **shared_kwargs
+        )
+        new_scraper.scrape_subdivisions(query = place_type, **kwargs)
+        print("Finished scraping place_type %s" % place_type)
+
+    print("Scraping %d place types using %d workers" % (len(types_to_scrape),
+                                                        options.workers))
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers = options.workers
+    ) as pool:
+        # Consume the results so that exceptions raised by workers propagate
+        list(pool.map(scrape_place_type, types_to_scrape))
+
+def scrape_frontier(options, types_to_scrape, scraper_kwargs, kwargs):
+    """ Scrape cells from a frontier shared with other processes
+
+    Seeds the frontier with the top-level cells of every place type, which has
+    no effect if another process has already done so, and then scrapes cells
+    from it until none are left. Run the same command on as many machines or
+    processes as desired to split the scrape between them.
+
+    Args:
+        options: An array generated by an OptionParser
+        types_to_scrape: A list of strings containing place types.
+        scraper_kwargs: A dictionary of keyword arguments to be passed to each
+            scraper.
+        kwargs: A dictionary of keyword arguments describing the region to be
+            scraped.
+    """
+
+    if (options.frontier == "redis"):
+        print("Using a frontier stored in Redis")
+        shared_frontier = frontier.RedisFrontier(
+            name = "%s:frontier" % scraper_kwargs["output_directory_name"]
+        )
+    else:
+        print("Using a frontier stored in %s" % options.frontier)
+        shared_frontier = frontier.SQLite3Frontier(options.frontier)
+
+    base_scraper, shared_kwargs = shared_scraper_kwargs(scraper_kwargs)
+
+    def scrape_frontier_worker(worker_number):
+        new_scraper = new_subdivision_scraper(
+            options,
+            state_file = "%s/worker%d_PID%d_state.json" % (
+                base_scraper.output_directory, worker_number, os.getpid()
+            ),
+            **shared_kwargs
+        )
+        new_scraper.scrape_frontier(
+            shared_frontier,
+            worker = "%s:%d:%d" % (os.uname()[1], os.getpid(), worker_number)
+        )
+
+    bounds = dict((key, kwargs[key]) for key in [
+        "min_latitude", "max_latitude", "min_longitude", "max_longitude",
+        "grid_width"
+    ])
+    seeding_scraper = new_subdivision_scraper(options, **shared_kwargs)
+    for place_type in types_to_scrape:
+        seeding_scraper.seed_frontier(shared_frontier, query = place_type,
+                                      **bounds)
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers = options.workers
+    ) as pool:
+        list(pool.map(scrape_frontier_worker, range(options.workers)))
+
+def plan_scrape(options, new_scraper, query, queries, kwargs):
+    """ Plan a scrape with the density model given to --plan and print its
+    estimated cost
+
+    The scraper is expected to have been made in a throwaway output directory
+    root, which is removed once the scrape has been planned.
+
+    Args:
+        options: An array generated by an OptionParser
+        new_scraper: A SubdivisionScraper object, made with a gms_io.NullWriter
+            and without flushing duplicates.
+        query: A string containing the place type or keyword to be planned.
+        queries: A list of strings containing every place type or keyword to
+            be scraped. See print_plan.
+        kwargs: A dictionary of keyword arguments to be passed to
+            new_scraper.plan.
+    """
+
+    try:
+        print_plan(new_scraper.plan(planner.density_model(options.plan),
+                                    query = query, **kwargs),
+                   queries)
+    finally:
+        new_scraper.events.writer.release(scrapers.OUTPUT_DIRECTORY_ROOT)
+        new_scraper.events.writer.flush()
+        shutil.rmtree(scrapers.OUTPUT_DIRECTORY_ROOT, ignore_errors = True)
+
+def print_plan(report, queries):
+    """ Print the estimated cost of a scrape
+
+    Args:
+        report: A dictionary returned by SubdivisionScraper.plan for one
+            query.
+        queries: A list of strings containing every place type or keyword to
+            be scraped. Each is assumed to cost as much as the planned one.
+    """
+
+    print("Planned %d of %d places with the density model (%0.3f results "
+          "per place)" % (report["places_found"], report["places"],
+                          report["redundancy_ratio"]))
+    print("Cells: %d (deepest at depth %d, %d terminated by the minimum "
+          "radius)" % (report["cells"], report["max_depth"],
+                       report["cells_terminated"]))
+    for endpoint, requests in sorted(report["requests"].items()):
+        print("Requests to %s: %d" % (endpoint, requests))
+    print("Estimated time: %0.1f hours" % (report["estimated_seconds"]/3600))
+
+    if (len(queries) > 1):
+        print("For all %d queries: %d requests, %0.1f hours" % (
+            len(queries),
+            report["total_requests"]*len(queries),
+            report["estimated_seconds"]*len(queries)/3600
+        ))
+
 def scrape_subdivisions(options):
     """ Initialize and start a basic subdivision scraper
 
@@ -139,22 +421,45 @@ def scrape_subdivisions(options):
                                             options.type
                                         )).replace(" ", "_")
 
-    print
-    if (options.type == "places_nearby"):
-        new_scraper = scrapers.PlacesNearbyScraper(
-            api_key = options.api_key,
-            output_directory_name = scraper_output_directory_name,
-            min_radius = options.min_radius
-        )
-    elif (options.type == "places_radar"):
-        new_scraper = scrapers.PlacesRadarScraper(
-            api_key = options.api_key,
-            output_directory_name = scraper_output_directory_name,
-            min_radius = options.min_radius
+    # Plans make no requests, so they need no client
+    if (options.plan is not None):
+        gmaps = None
+    else:
+        gmaps = googlemaps.Client(key = options.api_key)
+
+    scraper_kwargs = {
+        "gmaps": gmaps,
+        "output_directory_name": scraper_output_directory_name,
+        "min_radius": options.min_radius,
+        "rate_limiter": new_rate_limiter(options),
+        "response_cache": new_response_cache(options),
+        "traversal": options.traversal,
+        "split_mode": options.split_mode,
+        "saturation_policy": options.saturation_policy,
+        "metrics": new_metrics(options),
+        "log_level": eventlog.LEVELS[options.log_level],
+        "log_file_level": eventlog.LEVELS[options.log_file_level]
+    }
+    # Plans must leave no trace: the scraper made for one saves nothing, keeps
+    # the duplicates of a scrape under the same name, and is made in a
+    # directory that is removed once the scrape has been planned
+    if (options.plan is not None):
+        scrapers.OUTPUT_DIRECTORY_ROOT = tempfile.mkdtemp(prefix = "plan_")
+        scraper_kwargs.update({
+            "writer": gms_io.NullWriter(),
+            "flush_duplicates": False
+        })
+    # Without a journal, the state files show where a scrape stopped
+    elif (options.journal is not None):
+        print("Journaling cells in %s" % options.journal)
+        scraper_kwargs["journal"] = frontier.CellJournal(options.journal)
+    else:
+        scraper_kwargs["dump_state"] = True
+    if (options.clip):
+        print("Clipping the scrape to the shape of %s" % options.city)
+        scraper_kwargs["polygon"] = geo.Polygon(
+            parse_tiger.dump_rings(state_shapefile, options.city)
         )
-    elif (options.type != "text_radar"):
-        sys.exit(1)
-    print
 
     kwargs = {
         "min_longitude": city_extents["min_longitude"],
@@ -175,7 +480,18 @@ def scrape_subdivisions(options):
         })
 
     if (options.type == "text_radar"):
-        scrapers.PlacesTextScraper(scraper_output_directory_name).scrape_subdivisions(**kwargs)
+        if (options.detail_memo is not None):
+            print("Spilling memoized place details to %s"
+                  % options.detail_memo)
+            scraper_kwargs["detail_memo"] = cache.DetailMemo(
+                spill_path = options.detail_memo
+            )
+        new_scraper = scrapers.PlacesTextScraper(**scraper_kwargs)
+        if (options.plan is not None):
+            plan_scrape(options, new_scraper, options.keyword,
+                        [options.keyword], kwargs)
+            return
+        new_scraper.scrape_subdivisions(query = options.keyword, **kwargs)
     else:
         types_to_scrape = PLACE_TYPES
 
@@ -185,118 +501,168 @@ def scrape_subdivisions(options):
             print("Restricting search to the following categories: %s"
                   % ", ".join(types_to_scrape))
 
+        # The density model describes one place type, which is planned once
+        if (options.plan is not None):
+            new_scraper = new_subdivision_scraper(options, **scraper_kwargs)
+            plan_scrape(options, new_scraper, types_to_scrape[0],
+                        types_to_scrape, kwargs)
+            return
+
         # For each place_type, in a places_nearby or places_radar scrape, the
         # subdivision -> extraction process is used.
-        for place_type in types_to_scrape:
-            new_scraper.scrape_subdivisions(query = place_type, **kwargs)
+        if (options.frontier is not None):
+            scrape_frontier(options, types_to_scrape, scraper_kwargs, kwargs)
+        elif (options.workers > 1):
+            scrape_place_types(options, types_to_scrape, scraper_kwargs,
+                               kwargs)
+        else:
+            new_scraper = new_subdivision_scraper(options, **scraper_kwargs)
+            for place_type in types_to_scrape:
+                new_scraper.scrape_subdivisions(query = place_type, **kwargs)
 
+    print_cache_stats(scraper_kwargs["response_cache"])
     print("Finished scraping %s, %s" % (options.city, options.state))
 
 def scrape_errors(options):
-    """ Initialize and start a subdivision error scraper
+    """ Re-scrape the cells that could not be scraped in an earlier scrape
 
-    Parse the warning_log.csv files of a scrape to find which ones were
-    terminated because the maximum number of retries were exceeded, and
-    re-scrape those subdivisions.
+    Reads the failure ledger that the scrape recorded in its output directory
+    and scrapes every unresolved cell again, along with its children, using a
+    pool of --workers threads that share one rate limiter and one writer.
+    Each cell is scraped by the kind of scraper it failed in, with the bounds
+    and subdivision ID it was recorded with, so no shapefiles are read. Cells
+    are marked as resolved once they have been scraped; cells that fail again
+    stay unresolved, so the command can be repeated until none are left.
 
     Args:
         options: An array generated by an OptionParser
     """
 
-    # An multidimensional array of all terminated branches to be re-scraped.
-    # [n][0] = place_type
-    # [n][1] = subdivision ID
-    terminations = []
-
-    scrapes = sorted(os.listdir(OUTPUT_DIRECTORY_ROOT))
-    if (not options.rescrape in scrapes):
-        print("Please enter a valid scrape name. Possible names:")
-        print("\n".join(scrapes))
+    ledger_path = "%s/%s/%s" % (scrapers.OUTPUT_DIRECTORY_ROOT,
+                                options.rescrape.replace("/", "_"),
+                                scrapers.FAILURE_LEDGER_FILENAME)
+    if (not os.path.isfile(ledger_path)):
+        print("Please enter the name of a scrape with failures. Possible "
+              "names:")
+        if (os.path.isdir(scrapers.OUTPUT_DIRECTORY_ROOT)):
+            print("\n".join(sorted(
+                name for name in os.listdir(scrapers.OUTPUT_DIRECTORY_ROOT)
+                if (os.path.isfile("%s/%s/%s" % (
+                    scrapers.OUTPUT_DIRECTORY_ROOT, name,
+                    scrapers.FAILURE_LEDGER_FILENAME
+                )))
+            )))
         sys.exit(1)
 
-    # Parse termination logs
-    for termination_log in glob.glob("%s/%s/*/termination_log.csv" % (
-                                        OUTPUT_DIRECTORY_ROOT, options.rescrape
-                                    )):
-        file_object = open(termination_log)
-        for line in file_object.readlines():
-            if ("Maximum number of retries exceeded." in line):
-                subdivision_id = line[line.find("root"):line.find(". Place")]
-                place_type = line[(line.find("Place type: ")
-                                   + len("Place type: "))
-                                  :line.find(". Coordinates")]
-                terminations.append([place_type, subdivision_id])
-        file_object.close()
-
-    # Parse scrape names to get the state and city. Some states have multiple
-    # words, so iterate over all options and see which one matches state$ or
-    # city$
-    scrape_name_untimestamped = " ".join(options.rescrape.split("_")[1:-2])
-    for state in os.listdir("tiger-2016/"):
-        if ((scrape_name_untimestamped[-len(state):]) == state):
-
-            state_shapefile = glob.glob("tiger-2016/" + state + "/*.shp")[0]
-
-            for city in parse_tiger.dump_names(state_shapefile):
-                city_name_end = len(scrape_name_untimestamped) - len(state) - 1
-                if (city == (scrape_name_untimestamped[:city_name_end])):
-
-                    print("Parsed location: %s, %s" % (city, state))
-                    city_extents = parse_tiger.get_extents(state_shapefile,
-                                                           city)
-                    print
-
-                    scraper_output_directory_name = ("%s_%s_%s" % (
-                        time.strftime("%Y-%m-%d"),
-                        options.rescrape,
-                        "errors"
-                    )).replace(" ", "_")
-                    scraper_type = "_".join(options.rescrape.split("_")[-2:])
-                    if (scraper_type == "places_nearby"):
-                        new_scraper = scrapers.PlacesNearbyScraper(
-                            options.api_key, scraper_output_directory_name
-                        )
-                    elif (scraper_type == "places_radar"):
-                        new_scraper = scrapers.PlacesRadarScraper(
-                            options.api_key, scraper_output_directory_name
-                        )
-                    else:
-                        print("Error: could not re-scrape scrape_type %s "
-                              % scraper_type)
-                        return
-
-                    for termination in terminations:
-                        print("Scraping place_type %s of subdivision %s" % (
-                            termination[0], termination[1]
-                        ))
-                        new_scraper.scrape_subdivisions(
-                            city_extents["min_latitude"],
-                            city_extents["max_latitude"],
-                            city_extents["min_longitude"],
-                            city_extents["max_longitude"],
-                            3,
-                            termination[0],
-                            target_subdivision_id = termination[1]
-                        )
+    ledger = frontier.SQLite3FailureLedger(ledger_path)
+    failures = ledger.unresolved()
+    if (len(failures) == 0):
+        print("No unresolved failures in %s" % ledger_path)
+        return
+    print("Re-scraping %d cells that failed in %s using %d workers" % (
+        len(failures), options.rescrape, options.workers
+    ))
+
+    # Cells that fail again are recorded in the same ledger
+    scraper_kwargs = {
+        "gmaps": googlemaps.Client(key = options.api_key),
+        "output_directory_name": ("%s_%s_errors" % (
+            time.strftime("%Y-%m-%d"), options.rescrape
+        )).replace(" ", "_"),
+        "min_radius": options.min_radius,
+        "rate_limiter": new_rate_limiter(options),
+        "response_cache": new_response_cache(options),
+        "traversal": options.traversal,
+        "split_mode": options.split_mode,
+        "saturation_policy": options.saturation_policy,
+        "metrics": new_metrics(options),
+        "log_level": eventlog.LEVELS[options.log_level],
+        "log_file_level": eventlog.LEVELS[options.log_file_level],
+        "failures": ledger
+    }
+    metrics = scraper_kwargs["metrics"]
+    base_scraper, shared_kwargs = shared_scraper_kwargs(scraper_kwargs)
+
+    # Every worker thread makes one scraper of each scrape type it needs
+    worker_scrapers = threading.local()
+
+    def scrape_failure(failure):
+        scrape_type = failure["scrape_type"]
+        if (scrape_type not in ERROR_SCRAPERS):
+            print("Error: could not re-scrape scrape type %s of subdivision %s"
+                  % (scrape_type, failure["cell"]["id"]))
+            return
+        if (not hasattr(worker_scrapers, "by_type")):
+            worker_scrapers.by_type = {}
+        if (scrape_type not in worker_scrapers.by_type):
+            worker_scrapers.by_type[scrape_type] = (
+                ERROR_SCRAPERS[scrape_type](**shared_kwargs)
+            )
+
+        print("Scraping place_type %s of subdivision %s" % (
+            failure["query"], failure["cell"]["id"]
+        ))
+        worker_scrapers.by_type[scrape_type].scrape_failure(failure)
+        if (ledger.resolve(failure)):
+            metrics.inc("gmaps_failures_rescraped_total",
+                        scrape_type = scrape_type, outcome = "resolved")
+        else:
+            print("Subdivision %s failed again" % failure["cell"]["id"])
+            metrics.inc("gmaps_failures_rescraped_total",
+                        scrape_type = scrape_type, outcome = "failed")
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers = options.workers
+    ) as pool:
+        list(pool.map(scrape_failure, failures))
+
+    print_cache_stats(scraper_kwargs["response_cache"])
+    print("Finished re-scraping %s; %d cells are still unresolved" % (
+        options.rescrape, ledger.outstanding()
+    ))
 
 def scrape_details(options):
     """ Initialize and start a detail scraper
 
     Thin wrapper that initalizes a DetailScraper, given the name of a formatted
-    JSON generated by process_pickles.py or create_json_parallel_redis.py
+    JSON generated by process_pickles.py or create_json_parallel_redis.py, or
+    of any other source accepted by gms_io.iter_place_ids
 
     Args:
         options: An array generated by an OptionParser
     """
 
-    if (not os.path.exists(options.details)):
-        print("Please enter a valid JSON path.")
+    if (
+        not os.path.exists(options.details)
+        and not options.details.startswith("mongo:")
+    ):
+        print("Please enter a valid JSON, NDJSON or pickle path, or "
+              "mongo:COLLECTION_NAME.")
         sys.exit(1)
 
-    details = scrapers.DetailScraper(options.api_key, "%s_%s_details" % (
-        time.strftime("%Y-%m-%d"),
-        options.details.split("/")[-1]
-    )).scrape(options.details)
+    checkpoint = None
+    if (options.checkpoint is not None):
+        print("Checkpointing fetched places in %s" % options.checkpoint)
+        checkpoint = gms_io.SQLite3CheckpointLedger(
+            db_path = options.checkpoint
+        )
+
+    response_cache = new_response_cache(options)
+    details = scrapers.DetailScraper(
+        googlemaps.Client(key = options.api_key),
+        "%s_%s_details" % (
+            time.strftime("%Y-%m-%d"),
+            options.details.split("/")[-1]
+        ),
+        rate_limiter = new_rate_limiter(options),
+        response_cache = response_cache,
+        max_in_flight = options.max_in_flight,
+        checkpoint = checkpoint,
+        metrics = new_metrics(options),
+        log_level = eventlog.LEVELS[options.log_level],
+        log_file_level = eventlog.LEVELS[options.log_file_level]
+    ).scrape(options.details)
+    print_cache_stats(response_cache)
 
 def main():
     api_key = None
@@ -318,11 +684,15 @@ def main():
                       default = api_key)
     parser.add_option("--scrape-errors", dest = "rescrape",
                       metavar = "SCRAPE_NAME",
-                      help = "Re-scrape terminated branches from the given "
-                             "scrape. Overrides all other options.")
+                      help = "Re-scrape the cells of the given scrape whose "
+                             "requests kept failing, as recorded in its "
+                             "failure ledger, using --workers threads. "
+                             "Overrides all other options.")
     parser.add_option("--scrape-details", dest = "details",
                       metavar = "JSON_NAME",
-                      help = "Scrape details from the given formatted JSON. "
+                      help = "Scrape details of the places in the given JSON, "
+                             "NDJSON or pickle file, or in the MongoDB "
+                             "collection given as mongo:COLLECTION_NAME. "
                              "Overrides all other options except "
                              "--scrape-errors.")
     parser.add_option("--state", dest = "state", metavar = "STATE",
@@ -350,13 +720,125 @@ def main():
     parser.add_option("--outdir", dest = "outdir", metavar = "OUTDIR",
                       help = "(Optional) Write all results to subdirectories "
                              "of OUTDIR")
+    parser.add_option("--max-in-flight", dest = "max_in_flight",
+                      metavar = "N",
+                      help = "For places_nearby and places_radar scrapers: "
+                             "scrape up to N cells at once. With "
+                             "--scrape-details: fetch up to N places at once "
+                             "(default 1)",
+                      default = 1, type = "int")
+    parser.add_option("--workers", dest = "workers", metavar = "N",
+                      help = "For places_nearby and places_radar scrapers: "
+                             "scrape N place types at once, sharing one rate "
+                             "limiter and one writer. With --scrape-errors: "
+                             "re-scrape N cells at once (default 1)",
+                      default = 1, type = "int")
+    parser.add_option("--shared-quota", dest = "shared_quota",
+                      metavar = "BACKEND",
+                      help = "Share one quota with every other scraper using "
+                             "BACKEND, which is either \"redis\" or the path "
+                             "to an SQLite database")
+    parser.add_option("--cache", dest = "cache", metavar = "PATH",
+                      help = "Cache API responses in the SQLite database at "
+                             "PATH, so that re-running a scrape replays the "
+                             "responses instead of requesting them again")
+    parser.add_option("--detail-memo", dest = "detail_memo",
+                      metavar = "PATH",
+                      help = "For text_radar scrapers: move place details "
+                             "that no longer fit in memory to the SQLite "
+                             "database at PATH instead of dropping them, so "
+                             "no place's details are fetched twice")
+    parser.add_option("--checkpoint", dest = "checkpoint", metavar = "PATH",
+                      help = "With --scrape-details: record fetched places "
+                             "in the SQLite database at PATH, so that a "
+                             "restarted scrape skips them and saves any that "
+                             "were fetched but not written out")
+    parser.add_option("--frontier", dest = "frontier", metavar = "BACKEND",
+                      help = "For places_nearby and places_radar scrapers: "
+                             "take cells from a queue shared with other "
+                             "processes, stored in BACKEND, which is either "
+                             "\"redis\" or the path to an SQLite database. "
+                             "--workers sets the number of worker threads.")
+    parser.add_option("--journal", dest = "journal", metavar = "PATH",
+                      help = "For places_nearby, places_radar and text_radar "
+                             "scrapers: record every cell started and "
+                             "finished in the journal at PATH. Running the "
+                             "same command again resumes every place type "
+                             "from the cells it left pending. Not used with "
+                             "--frontier.")
+    parser.add_option("--traversal", dest = "traversal", metavar = "ORDER",
+                      help = "For places_nearby and places_radar scrapers: "
+                             "the order in which cells are scraped, which is "
+                             "one of dfs (depth first), bfs (breadth first) or "
+                             "density (densest cells first) (default %s)"
+                             % scrapers.DEFAULT_TRAVERSAL,
+                      choices = sorted(frontier.TRAVERSALS),
+                      default = scrapers.DEFAULT_TRAVERSAL)
+    parser.add_option("--split-mode", dest = "split_mode", metavar = "MODE",
+                      help = "For places_nearby and places_radar scrapers: "
+                             "divide cells with too many results into a 3x3 "
+                             "grid (grid), at the median of their results "
+                             "(adaptive) or into a hexagonal lattice of "
+                             "smaller circles (hex) (default %s)"
+                             % scrapers.DEFAULT_SPLIT_MODE,
+                      choices = scrapers.SPLIT_MODES,
+                      default = scrapers.DEFAULT_SPLIT_MODE)
+    parser.add_option("--saturation", dest = "saturation_policy",
+                      metavar = "POLICY",
+                      help = "For places_nearby, places_radar and text_radar "
+                             "scrapers: divide cells with at least the "
+                             "scraper's threshold of results (threshold) or "
+                             "only cells that the API's result cap and paging "
+                             "show to be incomplete (signals) (default %s)"
+                             % scrapers.DEFAULT_SATURATION_POLICY,
+                      choices = sorted(saturation.POLICIES),
+                      default = scrapers.DEFAULT_SATURATION_POLICY)
+    parser.add_option("--clip", dest = "clip", action = "store_true",
+                      help = "For places_nearby and places_radar scrapers: "
+                             "skip cells outside of the city's shape and drop "
+                             "results outside of it, instead of scraping its "
+                             "whole bounding box",
+                      default = False)
+    parser.add_option("--plan", dest = "plan", metavar = "MODEL",
+                      help = "Estimate the requests, depth and time the "
+                             "scrape would take without making any requests, "
+                             "by simulating it against a density model: "
+                             "uniform[:PLACES_PER_KM2], synthetic[:PLACES] or "
+                             "the output file of a previous scrape. Each place "
+                             "type is assumed to follow the model.")
+    parser.add_option("--metrics-file", dest = "metrics_file",
+                      metavar = "PATH",
+                      help = "Write request, retry, error, cell, throttling "
+                             "and dump metrics to PATH in the Prometheus text "
+                             "format every %d seconds and at exit"
+                             % telemetry.TEXTFILE_INTERVAL)
+    parser.add_option("--metrics-port", dest = "metrics_port",
+                      metavar = "PORT",
+                      help = "Serve the metrics at /metrics on PORT for "
+                             "Prometheus to scrape",
+                      type = "int")
+    parser.add_option("--metrics-summary", dest = "metrics_summary",
+                      metavar = "PATH",
+                      help = "Write a JSON summary of the metrics to PATH at "
+                             "exit")
+    parser.add_option("--log-level", dest = "log_level", metavar = "LEVEL",
+                      help = "Print messages at LEVEL or above: debug, info, "
+                             "warning or error. The details of every cell and "
+                             "page are printed at debug (default info)",
+                      choices = sorted(eventlog.LEVELS), default = "info")
+    parser.add_option("--log-file-level", dest = "log_file_level",
+                      metavar = "LEVEL",
+                      help = "Write records at LEVEL or above to %s in the "
+                             "output directory (default info)"
+                             % eventlog.EVENTS_FILENAME,
+                      choices = sorted(eventlog.LEVELS), default = "info")
     parser.add_option("--resume-at", dest = "resume", metavar = "ID",
                       help = "Resume at this subdivision ID")
     parser.add_option("--target", dest = "target", metavar = "ID",
                       help = "Scrape only this subdivision ID")
     (options, args) = parser.parse_args()
 
-    if (options.api_key is None):
+    if (options.api_key is None and options.plan is None):
         if (not os.path.isfile("credentials.py")):
             print("Could not find credentials.py. One has been created for "
                   "you.")
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# Library providing a cache of Google Maps API responses, so that re-running a
+# scrape replays responses that were already paid for, and a memo of place
+# details, so that a scrape pays for each place's details only once
+
+import collections
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# Default number of seconds a response is kept for, per endpoint
+DEFAULT_TTLS = {
+    "places_nearby": 7*24*60*60, # One week
+    "places_radar": 7*24*60*60,
+    "place": 30*24*60*60 # Thirty days
+}
+
+# Number of seconds a response is kept for if its endpoint is not listed above
+DEFAULT_TTL = 24*60*60 # One day
+
+# Default maximum total size of the cached responses, in bytes
+MAX_BYTES = 1024*1024*1024 # One gigabyte
+
+# Fraction of max_bytes that the cache is shrunk to when it grows too large, so
+# that eviction does not run on every insertion
+EVICTION_TARGET = 0.9
+
+# Default number of place details a DetailMemo keeps in memory
+DETAIL_MEMO_SIZE = 10000
+
+# Number of decimal places coordinates and radii are rounded to in cache keys.
+# Six decimal places of a degree are about ten centimeters.
+KEY_PRECISION = 6
+
+def normalize_params(params):
+    """ Normalize the parameters of a request so that equal requests match
+
+    Locations are converted to rounded "lat,lng" strings and other floats are
+    rounded, so requests for the same cell always have the same key even if
+    their coordinates were computed slightly differently.
+
+    Args:
+        params: A dictionary of keyword arguments passed to a
+            googlemaps.Client method.
+
+    Returns:
+        A dictionary of normalized parameters.
+    """
+
+    normalized = {}
+    for name, value in params.items():
+        if (value is None):
+            continue
+        if (name == "location"):
+            if (isinstance(value, dict)):
+                value = (value["lat"], value["lng"])
+            value = "%.*f,%.*f" % (KEY_PRECISION, float(value[0]),
+                                   KEY_PRECISION, float(value[1]))
+        elif (isinstance(value, float)):
+            value = round(value, KEY_PRECISION)
+        normalized[name] = value
+
+    return normalized
+
+def request_key(endpoint, params):
+    """ Compute the key under which a request's response is cached
+
+    Args:
+        endpoint: A string containing the name of the googlemaps.Client method.
+        params: A dictionary of keyword arguments passed to the method.
+
+    Returns:
+        A string containing the SHA-256 digest of the endpoint and the
+        normalized parameters.
+    """
+
+    return hashlib.sha256(json.dumps(
+        [endpoint, normalize_params(params)], sort_keys = True
+    ).encode("utf-8")).hexdigest()
+
+class SQLite3ResponseCache(object):
+    """ Cache of API responses stored in an SQLite database
+
+    Responses are keyed by their endpoint and normalized parameters, including
+    page tokens, and expire after a time to live that depends on the endpoint.
+    When the cached responses grow larger than max_bytes, the least recently
+    used ones are evicted until they take up EVICTION_TARGET of max_bytes.
+    Any number of scrapers and processes can share one database.
+
+    Attributes:
+        db_path: A string containing the path to the SQLite database.
+        ttls: A dictionary mapping endpoints to the number of seconds their
+            responses are kept for.
+        max_bytes: An integer describing the maximum total size of the cached
+            responses.
+        hits: An integer indicating how many requests were answered from the
+            cache.
+        misses: An integer indicating how many requests were not.
+        total_bytes: An integer estimating the total size of the cached
+            responses. Other processes sharing the database make this drift,
+            so it is recounted before evicting.
+        connection: An sqlite3.Connection object.
+        lock: A threading.Lock object serializing use of the connection and
+            the counters.
+    """
+
+    def __init__(self, db_path = "responses.db", ttls = None,
+                 max_bytes = MAX_BYTES):
+        """ Initializes SQLite3ResponseCache class and its database
+
+        Args:
+            db_path: A string containing the path to the SQLite database.
+            ttls: An optional dictionary mapping endpoints to the number of
+                seconds their responses are kept for, overriding DEFAULT_TTLS.
+            max_bytes: An integer describing the maximum total size of the
+                cached responses.
+        """
+
+        self.db_path = db_path
+        self.ttls = dict(DEFAULT_TTLS)
+        if (ttls is not None):
+            self.ttls.update(ttls)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(self.db_path, timeout = 60,
+                                          check_same_thread = False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS responses ("
+                                "key TEXT PRIMARY KEY, endpoint TEXT, "
+                                "response TEXT, size INTEGER, "
+                                "expires REAL, last_used REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS "
+                                "least_recently_used ON responses (last_used)")
+        self.connection.commit()
+        self.total_bytes = self.count_bytes()
+
+    def get(self, endpoint, params):
+        """ Look up the response to a request
+
+        Args:
+            endpoint: A string containing the name of the googlemaps.Client
+                method.
+            params: A dictionary of keyword arguments passed to the method.
+
+        Returns:
+            The cached response, or None if there is no response that has not
+            expired.
+        """
+
+        key = request_key(endpoint, params)
+        with self.lock:
+            now = time.time()
+            row = self.connection.execute(
+                "SELECT response, expires FROM responses WHERE key=?", (key,)
+            ).fetchone()
+
+            if (row is None or row[1] < now):
+                if (row is not None):
+                    self.connection.execute("DELETE FROM responses WHERE key=?",
+                                            (key,))
+                    self.connection.commit()
+                self.misses += 1
+                return None
+
+            self.connection.execute("UPDATE responses SET last_used=? "
+                                    "WHERE key=?", (now, key))
+            self.connection.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def contains(self, endpoint, params):
+        """ Determine whether a request has a cached response, without counting
+        a hit or a miss
+
+        Args:
+            See get.
+
+        Returns:
+            True if the request has a response that has not expired; False
+            otherwise.
+        """
+
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT expires FROM responses WHERE key=?",
+                (request_key(endpoint, params),)
+            ).fetchone()
+        return (row is not None and row[0] >= time.time())
+
+    def put(self, endpoint, params, response):
+        """ Store the response to a request
+
+        Evicts the least recently used responses if the cache grows larger
+        than max_bytes.
+
+        Args:
+            endpoint: A string containing the name of the googlemaps.Client
+                method.
+            params: A dictionary of keyword arguments passed to the method.
+            response: The JSON-serializable response returned by the method.
+        """
+
+        data = json.dumps(response)
+        key = request_key(endpoint, params)
+        with self.lock:
+            now = time.time()
+            row = self.connection.execute(
+                "SELECT size FROM responses WHERE key=?", (key,)
+            ).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, data, len(data),
+                 now + self.ttls.get(endpoint, DEFAULT_TTL), now)
+            )
+            self.total_bytes += len(data) - (row[0] if (row) else 0)
+            if (self.total_bytes > self.max_bytes):
+                self.evict(now)
+            self.connection.commit()
+
+    def count_bytes(self):
+        """ Count the total size of the cached responses
+
+        Returns:
+            An integer describing the total size, in bytes.
+        """
+
+        return self.connection.execute(
+            "SELECT Coalesce(Sum(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def evict(self, now):
+        """ Remove expired responses and, if the cache is still too large, the
+        least recently used ones. The caller must hold self.lock.
+
+        Args:
+            now: A float of the current Unix time.
+        """
+
+        self.connection.execute("DELETE FROM responses WHERE expires<?",
+                                (now,))
+        self.total_bytes = self.count_bytes()
+        if (self.total_bytes <= self.max_bytes):
+            return
+
+        # Walk from the least recently used response until enough space is
+        # freed, then delete everything up to there at once
+        target_bytes = self.max_bytes*EVICTION_TARGET
+        cursor = self.connection.execute(
+            "SELECT last_used, size FROM responses ORDER BY last_used"
+        )
+        for last_used, size in cursor:
+            self.total_bytes -= size
+            if (self.total_bytes <= target_bytes):
+                break
+        cursor.close()
+        self.connection.execute("DELETE FROM responses WHERE last_used<=?",
+                                (last_used,))
+        self.total_bytes = self.count_bytes()
+
+    def stats(self):
+        """ Get the hit and miss counters
+
+        Returns:
+            A dictionary with the keys "hits", "misses" and "hit_rate".
+        """
+
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": float(self.hits)/lookups if (lookups) else 0.0
+            }
+
+    def flush(self):
+        """ Remove all cached responses """
+
+        with self.lock:
+            self.connection.execute("DELETE FROM responses")
+            self.connection.commit()
+            self.total_bytes = 0
+
+class DetailMemo(object):
+    """ Memo of place details, keyed by place_id
+
+    Subdivision cells overlap, since each cell's circle covers the corners of
+    its neighbors, and cells are scraped again when they are divided, so the
+    same place is often found many times in one scrape. Scrapers that fetch
+    the details of every place they find consult the memo first, so each
+    place's details are only paid for once.
+
+    Up to max_entries details are kept in memory. When the memo is full, the
+    least recently used details are dropped, or moved to an SQLite database
+    if spill_path is given, from which they are moved back when they are used
+    again. Unlike SQLite3ResponseCache, entries do not expire, so a memo
+    should only live as long as a scrape.
+
+    Attributes:
+        max_entries: An integer describing the maximum number of details kept
+            in memory.
+        spill_path: A string containing the path to the SQLite database that
+            details are spilled to, or None if they are dropped.
+        entries: A collections.OrderedDict mapping place_ids to details, from
+            least to most recently used.
+        hits: An integer indicating how many lookups found the details.
+        misses: An integer indicating how many did not.
+        connection: An sqlite3.Connection object, or None if spill_path is
+            None.
+        lock: A threading.Lock object guarding the memo, so it can be shared
+            between threads.
+    """
+
+    def __init__(self, max_entries = DETAIL_MEMO_SIZE, spill_path = None):
+        """ Initializes DetailMemo class
+
+        Args:
+            max_entries: An integer describing the maximum number of details
+                kept in memory.
+            spill_path: An optional string containing the path to an SQLite
+                database that details are moved to when they are evicted from
+                memory.
+        """
+
+        self.max_entries = max_entries
+        self.spill_path = spill_path
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.connection = None
+        if (self.spill_path is not None):
+            self.connection = sqlite3.connect(self.spill_path, timeout = 60,
+                                              check_same_thread = False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=OFF")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS details ("
+                                    "place_id TEXT PRIMARY KEY, result TEXT)")
+            self.connection.commit()
+
+    def get(self, place_id):
+        """ Look up the details of a place
+
+        Args:
+            place_id: A string containing the place_id.
+
+        Returns:
+            The memoized details, or None if the place has not been memoized.
+        """
+
+        with self.lock:
+            if (place_id in self.entries):
+                self.entries.move_to_end(place_id)
+                self.hits += 1
+                return self.entries[place_id]
+
+            if (self.connection is not None):
+                row = self.connection.execute(
+                    "SELECT result FROM details WHERE place_id=?", (place_id,)
+                ).fetchone()
+                if (row is not None):
+                    self.connection.execute(
+                        "DELETE FROM details WHERE place_id=?", (place_id,)
+                    )
+                    self.insert(place_id, json.loads(row[0]))
+                    self.connection.commit()
+                    self.hits += 1
+                    return self.entries[place_id]
+
+            self.misses += 1
+            return None
+
+    def put(self, place_id, result):
+        """ Memoize the details of a place
+
+        Args:
+            place_id: A string containing the place_id.
+            result: The dictionary of details returned by the API.
+        """
+
+        with self.lock:
+            self.insert(place_id, result)
+            if (self.connection is not None):
+                self.connection.commit()
+
+    def insert(self, place_id, result):
+        """ Add details to memory, evicting the least recently used details if
+        the memo is full. The caller must hold self.lock.
+
+        Args:
+            See put.
+        """
+
+        self.entries[place_id] = result
+        self.entries.move_to_end(place_id)
+        while (len(self.entries) > self.max_entries):
+            evicted_id, evicted_result = self.entries.popitem(last = False)
+            if (self.connection is not None):
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO details VALUES (?, ?)",
+                    (evicted_id, json.dumps(evicted_result))
+                )
+
+    def stats(self):
+        """ Get the hit and miss counters
+
+        Returns:
+            A dictionary with the keys "hits", "misses" and "hit_rate".
+        """
+
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": float(self.hits)/lookups if (lookups) else 0.0
+            }
+
+    def flush(self):
+        """ Forget all memoized details """
+
+        with self.lock:
+            self.entries.clear()
+            if (self.connection is not None):
+                self.connection.execute("DELETE FROM details")
+                self.connection.commit()
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# Library providing leveled, structured logging for scrapers, written to files
+# in batches by a background thread
+
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+# Levels of log records, from least to most severe
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+# Names of the levels, as accepted on the command line
+LEVELS = {
+    "debug": DEBUG,
+    "info": INFO,
+    "warning": WARNING,
+    "error": ERROR
+}
+LEVEL_NAMES = dict((number, name) for name, number in LEVELS.items())
+
+DEFAULT_LEVEL = INFO
+
+# Largest number of lines written to files before they are flushed
+BATCH_SIZE = 1000
+
+# Name of the JSON lines file that scrapers write their records to, in their
+# output directory
+EVENTS_FILENAME = "events.jsonl"
+
+class Record(object):
+    """ A log record, which is formatted only when it is written
+
+    Attributes:
+        time: A float of the Unix time when the record was made.
+        level: An integer of one of the levels, such as INFO.
+        name: A string naming the scrape that made the record, or None.
+        event: A short string naming what happened, such as "retry".
+        message: A string containing a message, which is formatted with args
+            using the % operator.
+        args: A tuple of arguments to the message.
+        fields: A dictionary of additional values describing what happened.
+    """
+
+    __slots__ = ["time", "level", "name", "event", "message", "args", "fields"]
+
+    def __init__(self, level, name, event, message, args, fields):
+        """ Initializes Record class
+
+        Args:
+            See the attributes.
+        """
+
+        self.time = time.time()
+        self.level = level
+        self.name = name
+        self.event = event
+        self.message = message
+        self.args = args
+        self.fields = fields
+
+    def text(self):
+        """ Format the message
+
+        A single dictionary argument is used as a mapping, so that messages
+        can refer to its keys, as in "%(splits)d".
+
+        Returns:
+            A string containing the message formatted with its arguments.
+        """
+
+        if (len(self.args) == 0):
+            return self.message
+        if (len(self.args) == 1 and isinstance(self.args[0], dict)):
+            return self.message % self.args[0]
+        return self.message % self.args
+
+    def to_json(self):
+        """ Format the record as a line of JSON
+
+        Returns:
+            A string containing a JSON object with the time, level, scrape
+            name, event, message and fields of the record, and a newline.
+            Values that JSON cannot represent are written as strings.
+        """
+
+        record = dict(self.fields)
+        record.update({
+            "time": self.time,
+            "level": LEVEL_NAMES.get(self.level, self.level),
+            "scrape": self.name,
+            "event": self.event,
+            "message": self.text()
+        })
+        return json.dumps(record, default = str) + "\n"
+
+class LogWriter(object):
+    """ Appends lines to files from a background thread
+
+    Files are opened when they are first written to and kept open. Lines are
+    taken from a queue in batches of up to batch_size, and each file is flushed
+    once per batch. A file that was deleted or replaced since it was opened,
+    such as a log removed by flush_output, is opened again.
+
+    Attributes:
+        queue: A queue.Queue object of (path, line) tuples waiting to be
+            written. line is a string, an object with a to_json method, or
+            None to close the files in the directory at path.
+        files: A dictionary mapping paths to open file objects.
+        batch_size: An integer describing the largest number of lines written
+            before the files are flushed.
+        thread: The threading.Thread object writing the lines, or None if it
+            has not been started.
+        lock: A threading.Lock object guarding the thread.
+    """
+
+    def __init__(self, batch_size = BATCH_SIZE):
+        """ Initializes LogWriter class
+
+        Args:
+            See the attributes.
+        """
+
+        self.queue = queue.Queue()
+        self.files = {}
+        self.batch_size = batch_size
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """ Start writing lines on a background thread, if it is not running
+
+        Returns:
+            The writer, so that it can be started as it is made.
+        """
+
+        with self.lock:
+            if (self.thread is None):
+                self.thread = threading.Thread(target = self.run)
+                self.thread.daemon = True
+                self.thread.start()
+        return self
+
+    def write(self, path, line):
+        """ Queue a line to be appended to a file
+
+        Args:
+            path: A string containing the path of the file.
+            line: A string ending in a newline, or a Record whose JSON is
+                written.
+        """
+
+        self.start()
+        self.queue.put((path, line))
+
+    def release(self, directory):
+        """ Close the files in a directory once their queued lines are written
+
+        Call this before deleting the directory.
+
+        Args:
+            directory: A string containing the path of the directory.
+        """
+
+        self.start()
+        self.queue.put((directory, None))
+
+    def flush(self):
+        """ Wait until every queued line has been written and flushed """
+
+        if (self.thread is not None):
+            self.queue.join()
+
+    def close(self):
+        """ Write the queued lines, stop the thread and close every file """
+
+        with self.lock:
+            thread = self.thread
+            self.thread = None
+        if (thread is not None):
+            self.queue.put((None, None))
+            thread.join()
+
+    def run(self):
+        """ Write batches of lines until stopped by close """
+
+        stopped = False
+        while (not stopped):
+            batch = [self.queue.get()]
+            while (len(batch) < self.batch_size):
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                stopped = self.write_batch(batch)
+            finally:
+                for dummy_entry in batch:
+                    self.queue.task_done()
+
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def write_batch(self, batch):
+        """ Write a batch of lines and flush the files they were written to
+
+        Args:
+            batch: A list of entries taken from self.queue.
+
+        Returns:
+            True if the batch asked the writer to stop; False otherwise.
+        """
+
+        stopped = False
+        written = {}
+        for path, line in batch:
+            if (path is None):
+                stopped = True
+                continue
+            if (line is None):
+                self.flush_files(written)
+                written = {}
+                self.close_files(path)
+                continue
+
+            if (path not in written):
+                f = self.open_file(path)
+                if (f is None):
+                    continue
+                written[path] = f
+            try:
+                if (not isinstance(line, str)):
+                    line = line.to_json()
+                written[path].write(line)
+            except Exception as err:
+                sys.stderr.write("Could not write to log %s: %s\n"
+                                 % (path, err))
+
+        self.flush_files(written)
+        return stopped
+
+    def open_file(self, path):
+        """ Get an open file to append to, reopening it if it was replaced
+
+        Args:
+            path: A string containing the path of the file.
+
+        Returns:
+            A file object, or None if the file could not be opened.
+        """
+
+        f = self.files.get(path)
+        if (f is not None):
+            try:
+                if (os.stat(path).st_ino == os.fstat(f.fileno()).st_ino):
+                    return f
+            except OSError:
+                pass
+            f.close()
+            del self.files[path]
+
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+            f = open(path, "a")
+        except OSError as err:
+            sys.stderr.write("Could not open log %s: %s\n" % (path, err))
+            return None
+        self.files[path] = f
+        return f
+
+    def flush_files(self, files):
+        """ Flush files, ignoring those that can no longer be written
+
+        Args:
+            files: A dictionary mapping paths to file objects.
+        """
+
+        for f in files.values():
+            try:
+                f.flush()
+            except OSError:
+                pass
+
+    def close_files(self, directory):
+        """ Close the open files in a directory
+
+        Args:
+            directory: A string containing the path of the directory.
+        """
+
+        prefix = os.path.join(directory, "")
+        for path in list(self.files.keys()):
+            if (path.startswith(prefix)):
+                self.files.pop(path).close()
+
+# The writer shared by every EventLog in the process, made by default_writer
+_default_writer = None
+_default_writer_lock = threading.Lock()
+
+def default_writer():
+    """ Get the LogWriter shared by every EventLog in the process
+
+    The writer is made when it is first needed, and writes its queued lines
+    when the interpreter exits.
+
+    Returns:
+        A LogWriter object.
+    """
+
+    global _default_writer
+    with _default_writer_lock:
+        if (_default_writer is None):
+            _default_writer = LogWriter()
+            atexit.register(_default_writer.close)
+        return _default_writer
+
+class EventLog(object):
+    """ Records leveled, structured events
+
+    Records at console_level or above are printed as their message, as the
+    scrapers have always printed them. Records at level or above are written
+    to a JSON lines file by a LogWriter. Records below both levels are dropped
+    before anything is formatted, and arguments and fields that are callables
+    are only called for records that are kept, so that expensive diagnostics
+    cost nothing when they are not wanted:
+
+        events.debug("cell", "Visualization: %s", gsm.generate_url)
+
+    Attributes:
+        name: A string naming the scrape, which is added to every record, or
+            None.
+        path: A string containing the path of the JSON lines file, or None if
+            records are only printed.
+        level: An integer of the lowest level written to path.
+        console_level: An integer of the lowest level printed.
+        writer: The LogWriter object writing the file.
+    """
+
+    def __init__(self, name = None, path = None, level = DEFAULT_LEVEL,
+                 console_level = DEFAULT_LEVEL, writer = None):
+        """ Initializes EventLog class
+
+        Args:
+            See the attributes. By default, the writer is the one returned by
+            default_writer.
+        """
+
+        self.name = name
+        self.path = path
+        self.level = level
+        self.console_level = console_level
+        if (writer is None):
+            writer = default_writer()
+        self.writer = writer
+
+    def enabled(self, level):
+        """ Determine whether records at a level are kept
+
+        Args:
+            level: An integer of one of the levels.
+
+        Returns:
+            True if records at the level are printed or written; False
+            otherwise.
+        """
+
+        return ((level >= self.console_level)
+                or (self.path is not None and level >= self.level))
+
+    def log(self, level, event, message, *args, **fields):
+        """ Record an event
+
+        Args:
+            level: An integer of one of the levels.
+            event: A short string naming what happened, such as "retry".
+            message: A string containing a message, formatted with args using
+                the % operator.
+            args: Arguments to the message.
+            fields: Keyword arguments giving additional values to be written
+                with the record.
+        """
+
+        if (not self.enabled(level)):
+            return
+
+        record = Record(
+            level, self.name, event, message,
+            tuple((arg() if (callable(arg)) else arg) for arg in args),
+            dict((key, (value() if (callable(value)) else value))
+                 for key, value in fields.items())
+        )
+        if (level >= self.console_level):
+            print(record.text())
+        if (self.path is not None and level >= self.level):
+            self.writer.write(self.path, record)
+
+    def debug(self, event, message, *args, **fields):
+        """ Record an event at the DEBUG level. See log. """
+
+        self.log(DEBUG, event, message, *args, **fields)
+
+    def info(self, event, message, *args, **fields):
+        """ Record an event at the INFO level. See log. """
+
+        self.log(INFO, event, message, *args, **fields)
+
+    def warning(self, event, message, *args, **fields):
+        """ Record an event at the WARNING level. See log. """
+
+        self.log(WARNING, event, message, *args, **fields)
+
+    def error(self, event, message, *args, **fields):
+        """ Record an event at the ERROR level. See log. """
+
+        self.log(ERROR, event, message, *args, **fields)
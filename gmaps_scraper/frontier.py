@@ -0,0 +1,852 @@
+#!/usr/bin/env python3
+# Library providing queues of pending subdivision cells: in-memory traversal
+# orders for a single scraper and durable queues, so that many worker processes
+# can scrape one region, and a ledger of the cells that could not be scraped
+
+import collections
+import fcntl
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Default number of seconds a worker can hold a cell before it is handed to
+# another worker
+LEASE_LENGTH = 600
+
+# A cell journal is synced to disk after this many records or this many
+# seconds, whichever comes first
+JOURNAL_SYNC_RECORDS = 100
+JOURNAL_SYNC_INTERVAL = 1.0
+
+class DepthFirstTraversal(object):
+    """ In-memory stack of pending cells
+
+    Every cell's subtree is finished before its next sibling is started, which
+    is the order the subdivision scraper has always used.
+
+    Entries are (cell, estimate) tuples, where estimate is the expected
+    density of places in the cell. It is only used by DensityTraversal.
+
+    Attributes:
+        entries: A list of pending entries; the last one is popped first.
+    """
+
+    def __init__(self):
+        """ Initializes DepthFirstTraversal class """
+
+        self.entries = []
+
+    def push(self, entries):
+        """ Add the children of a cell
+
+        Args:
+            entries: A list of (cell, estimate) tuples, in processing order.
+        """
+
+        self.entries.extend(reversed(entries))
+
+    def pop(self):
+        """ Remove and return the next (cell, estimate) tuple """
+
+        return self.entries.pop()
+
+    def __len__(self):
+        return len(self.entries)
+
+class BreadthFirstTraversal(DepthFirstTraversal):
+    """ In-memory queue of pending cells
+
+    Every level of the subdivision tree is finished before the next one is
+    started, so the whole region is covered coarsely before any of it is
+    covered in detail.
+
+    Attributes:
+        entries: A collections.deque of pending entries.
+    """
+
+    def __init__(self):
+        """ Initializes BreadthFirstTraversal class """
+
+        self.entries = collections.deque()
+
+    def push(self, entries):
+        """ See DepthFirstTraversal.push """
+
+        self.entries.extend(entries)
+
+    def pop(self):
+        """ See DepthFirstTraversal.pop """
+
+        return self.entries.popleft()
+
+class DensityTraversal(DepthFirstTraversal):
+    """ In-memory priority queue of pending cells
+
+    The cell with the highest expected density is scraped first, so that most
+    places are found early, for example when a quota is about to run out.
+    Cells with equal estimates are processed in the order they were pushed.
+
+    Attributes:
+        entries: A heap of (-estimate, sequence number, entry) tuples.
+        counter: An itertools.count object generating sequence numbers.
+    """
+
+    def __init__(self):
+        """ Initializes DensityTraversal class """
+
+        self.entries = []
+        self.counter = itertools.count()
+
+    def push(self, entries):
+        """ See DepthFirstTraversal.push """
+
+        for entry in entries:
+            heapq.heappush(self.entries,
+                           (-entry[1], next(self.counter), entry))
+
+    def pop(self):
+        """ See DepthFirstTraversal.pop """
+
+        return heapq.heappop(self.entries)[2]
+
+# Traversal orders that can be chosen by name
+TRAVERSALS = {
+    "dfs": DepthFirstTraversal,
+    "bfs": BreadthFirstTraversal,
+    "density": DensityTraversal
+}
+
+class CellJournal(object):
+    """ Append-only journal of the cells of subdivision scrapes
+
+    Lets a scraper that was stopped resume exactly where it was. Each line of
+    the journal is a JSON record of one of the following operations:
+        push: The top-level cells of a query were added to the frontier.
+        start: A cell was begun by a worker.
+        finish: A cell was scraped, terminated or divided. The record holds
+            the cell's children, if any, so that a cell is never finished
+            without its children having been added.
+    Records are written with a single write to a file opened for appending,
+    under an exclusive flock, so any number of scrapers, in any number of
+    processes, can share a journal as long as each query is scraped by one of
+    them at a time. Writes are synced to disk in batches of sync_records
+    records or every sync_interval seconds, so a crash of the machine loses
+    at most the last batch, whose cells are scraped again.
+
+    When the journal is opened, it is read back to reconstruct the pending
+    frontier of every query: the cells that were pushed but never finished,
+    including those that were started by a worker that was stopped, in the
+    order they were pushed. A partially written last line is ignored, and is
+    ended with a newline so that the records appended after it can be read.
+
+    Attributes:
+        path: A string containing the path to the journal.
+        sync_records, sync_interval: See JOURNAL_SYNC_RECORDS and
+            JOURNAL_SYNC_INTERVAL.
+        fd: An integer file descriptor of the journal, opened for appending.
+        batches: A dictionary mapping each query to a list of the batches of
+            (cell, estimate) entries that were pushed, in order.
+        finished: A dictionary mapping each query to a set of the IDs of the
+            cells that were finished.
+        started: A dictionary mapping each query to a set of the IDs of the
+            cells that were started.
+        unsynced: An integer describing the number of records written since
+            the last sync.
+        last_sync: A float of the Unix time of the last sync.
+        lock: A threading.Lock object serializing writes.
+    """
+
+    def __init__(self, path = "journal.jsonl",
+                 sync_records = JOURNAL_SYNC_RECORDS,
+                 sync_interval = JOURNAL_SYNC_INTERVAL):
+        """ Initializes CellJournal class and reads back the journal
+
+        Args:
+            See the attributes.
+        """
+
+        self.path = path
+        self.sync_records = sync_records
+        self.sync_interval = sync_interval
+        self.batches = {}
+        self.finished = {}
+        self.started = {}
+        self.unsynced = 0
+        self.last_sync = time.time()
+        self.lock = threading.Lock()
+
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        with open(path, "rb") as f:
+            # Records are only written under this lock, so a last line without
+            # a newline was torn by a scraper that was killed. It is ended, so
+            # that the next record is not joined to it.
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0, os.SEEK_END)
+            if (f.tell() > 0):
+                f.seek(-1, os.SEEK_END)
+                if (f.read(1) != b"\n"):
+                    os.write(self.fd, b"\n")
+            f.seek(0)
+            for line in f:
+                try:
+                    record = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    # A line that was being written when its scraper was
+                    # killed
+                    continue
+                self.apply(record)
+
+    def apply(self, record):
+        """ Add a record to the reconstructed frontiers
+
+        Args:
+            record: A dictionary read from or written to the journal.
+        """
+
+        query = record["query"]
+        if (record["op"] == "push"):
+            self.batches.setdefault(query, []).append(
+                [tuple(entry) for entry in record["entries"]]
+            )
+        elif (record["op"] == "start"):
+            self.started.setdefault(query, set()).add(record["id"])
+        elif (record["op"] == "finish"):
+            self.finished.setdefault(query, set()).add(record["id"])
+            if (len(record["children"]) > 0):
+                self.batches.setdefault(query, []).append(
+                    [tuple(entry) for entry in record["children"]]
+                )
+
+    def append(self, record):
+        """ Write a record and apply it
+
+        Args:
+            record: A JSON serializable dictionary with "op" and "query" keys.
+        """
+
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        with self.lock:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                written = 0
+                while (written < len(line)):
+                    written += os.write(self.fd, line[written:])
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            self.apply(record)
+
+            self.unsynced += 1
+            if (
+                self.unsynced >= self.sync_records
+                or (time.time() - self.last_sync) >= self.sync_interval
+            ):
+                self.sync_locked()
+
+    def sync_locked(self):
+        """ Sync the journal to disk. self.lock must be held. """
+
+        os.fsync(self.fd)
+        self.unsynced = 0
+        self.last_sync = time.time()
+
+    def sync(self):
+        """ Sync the records written so far to disk """
+
+        with self.lock:
+            if (self.unsynced > 0):
+                self.sync_locked()
+
+    def close(self):
+        """ Sync and close the journal """
+
+        self.sync()
+        os.close(self.fd)
+
+    def has_query(self, query):
+        """ Determine whether a query was started
+
+        Args:
+            query: A string containing a place_type or keyword.
+
+        Returns:
+            True if the top-level cells of the query were pushed; False
+            otherwise.
+        """
+
+        return (query in self.batches)
+
+    def is_finished(self, query, subdivision_id):
+        """ Determine whether a cell was finished
+
+        Args:
+            query: A string containing a place_type or keyword.
+            subdivision_id: A string containing the ID of the cell.
+
+        Returns:
+            True if the cell was finished; False otherwise.
+        """
+
+        return (subdivision_id in self.finished.get(query, ()))
+
+    def push(self, query, entries):
+        """ Record the top-level cells of a query
+
+        Args:
+            query: A string containing a place_type or keyword.
+            entries: A list of (cell, estimate) tuples, as pushed to a
+                traversal.
+        """
+
+        self.append({"op": "push", "query": query,
+                     "entries": [list(entry) for entry in entries]})
+
+    def start(self, query, cell, worker = None):
+        """ Record that a cell was begun
+
+        Args:
+            query: A string containing a place_type or keyword.
+            cell: A cell dictionary.
+            worker: An optional string identifying the worker. Defaults to
+                the hostname and PID.
+        """
+
+        if (worker is None):
+            worker = "%s:%d" % (os.uname()[1], os.getpid())
+        self.append({"op": "start", "query": query, "id": cell["id"],
+                     "worker": worker})
+
+    def finish(self, query, cell, children = ()):
+        """ Record that a cell was done, along with its children
+
+        Args:
+            query: A string containing a place_type or keyword.
+            cell: A cell dictionary.
+            children: A list of (cell, estimate) tuples of the cell's
+                children, in the order they were pushed.
+        """
+
+        self.append({"op": "finish", "query": query, "id": cell["id"],
+                     "children": [list(entry) for entry in children]})
+
+    def pending(self, query):
+        """ Reconstruct the pending frontier of a query
+
+        Args:
+            query: A string containing a place_type or keyword.
+
+        Returns:
+            A list of batches of (cell, estimate) tuples that were pushed but
+            not finished. Pushing the batches to an empty traversal in order
+            restores the traversal as it was.
+        """
+
+        finished = self.finished.get(query, set())
+        batches = []
+        for batch in self.batches.get(query, []):
+            batch = [entry for entry in batch
+                     if (entry[0]["id"] not in finished)]
+            if (len(batch) > 0):
+                batches.append(batch)
+        return batches
+
+    def interrupted(self, query):
+        """ Count the cells that were started but never finished
+
+        Args:
+            query: A string containing a place_type or keyword.
+
+        Returns:
+            An integer describing the number of interrupted cells.
+        """
+
+        return len(self.started.get(query, set())
+                   - self.finished.get(query, set()))
+
+    def cells(self, query):
+        """ Iterate over every cell that was pushed for a query
+
+        Args:
+            query: A string containing a place_type or keyword.
+
+        Yields:
+            Cell dictionaries, whether they were finished or not.
+        """
+
+        for batch in self.batches.get(query, []):
+            for entry in batch:
+                yield entry[0]
+
+class SQLite3Frontier(object):
+    """ Durable queue of pending cells stored in an SQLite database
+
+    Every cell is stored with the query it is to be scraped for. Workers lease
+    pending cells, scrape them and then complete them, adding the cell's
+    children if it was subdivided. A leased cell that is not completed before
+    its lease expires, for example because its worker crashed, is handed out
+    again. Cells are identified by their query and subdivision ID, so pushing
+    a cell that is already known has no effect.
+
+    Any number of processes on one machine can share a database.
+
+    Attributes:
+        db_path: A string containing the path to the SQLite database.
+        lease_length: A float describing how many seconds a lease lasts.
+        connection: An sqlite3.Connection object.
+        lock: A threading.Lock object serializing use of the connection.
+    """
+
+    def __init__(self, db_path = "frontier.db", lease_length = LEASE_LENGTH):
+        """ Initializes SQLite3Frontier class and its database
+
+        Args:
+            db_path: A string containing the path to the SQLite database.
+            lease_length: A float describing how many seconds a lease lasts.
+        """
+
+        self.db_path = db_path
+        self.lease_length = lease_length
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(self.db_path, timeout = 60,
+                                          isolation_level = None,
+                                          check_same_thread = False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS cells ("
+                                "query TEXT, id TEXT, depth INTEGER, "
+                                "cell TEXT, done INTEGER DEFAULT 0, "
+                                "lease_expires REAL DEFAULT 0, worker TEXT, "
+                                "PRIMARY KEY (query, id))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS pending_cells "
+                                "ON cells (done, lease_expires)")
+
+    def transaction(self, function, *args):
+        """ Run a function in an immediate transaction
+
+        Args:
+            function: A function that takes an sqlite3.Cursor object followed
+                by args.
+            args: Arguments to be passed to function.
+
+        Returns:
+            The value returned by function.
+        """
+
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                value = function(cursor, *args)
+                cursor.execute("COMMIT")
+            except:
+                cursor.execute("ROLLBACK")
+                raise
+            return value
+
+    def insert_cells(self, cursor, cells, query):
+        """ Insert cells that are not known yet using the given cursor """
+
+        cursor.executemany(
+            "INSERT OR IGNORE INTO cells (query, id, depth, cell) "
+            "VALUES (?, ?, ?, ?)",
+            [(query, cell["id"], cell["id"].count("->"), json.dumps(cell))
+             for cell in cells]
+        )
+
+    def push(self, cells, query):
+        """ Add cells to the queue
+
+        Args:
+            cells: A list of cell dictionaries generated by
+                SubdivisionScraper.make_cells.
+            query: A string containing the place_type or keyword to be scraped.
+        """
+
+        self.transaction(self.insert_cells, cells, query)
+
+    def lease(self, worker = ""):
+        """ Lease the oldest pending cell
+
+        Args:
+            worker: A string identifying the worker, for information only.
+
+        Returns:
+            A (cell, query) tuple, or None if no cell is available.
+        """
+
+        def lease_cell(cursor):
+            now = time.time()
+            cursor.execute("SELECT rowid, query, cell FROM cells "
+                           "WHERE done=0 AND lease_expires<? "
+                           "ORDER BY rowid LIMIT 1", (now,))
+            row = cursor.fetchone()
+            if (row is None):
+                return None
+            cursor.execute("UPDATE cells SET lease_expires=?, worker=? "
+                           "WHERE rowid=?",
+                           (now + self.lease_length, worker, row[0]))
+            return (json.loads(row[2]), row[1])
+
+        return self.transaction(lease_cell)
+
+    def complete(self, cell, query, children = ()):
+        """ Mark a leased cell as done and add its children to the queue
+
+        Both happen in one transaction, so a cell is never marked as done
+        without its children having been added.
+
+        Args:
+            cell: The cell dictionary returned by lease.
+            query: The query returned by lease.
+            children: A list of cell dictionaries to be added to the queue.
+        """
+
+        def complete_cell(cursor):
+            self.insert_cells(cursor, children, query)
+            cursor.execute("UPDATE cells SET done=1 WHERE query=? AND id=?",
+                           (query, cell["id"]))
+
+        self.transaction(complete_cell)
+
+    def release(self, cell, query):
+        """ Give up the lease on a cell so that another worker can take it
+
+        Args:
+            cell: The cell dictionary returned by lease.
+            query: The query returned by lease.
+        """
+
+        self.transaction(lambda cursor: cursor.execute(
+            "UPDATE cells SET lease_expires=0 WHERE query=? AND id=?",
+            (query, cell["id"])
+        ))
+
+    def outstanding(self):
+        """ Count the cells that are pending or leased
+
+        Returns:
+            An integer describing the number of cells that are not done.
+        """
+
+        with self.lock:
+            return self.connection.execute(
+                "SELECT Count(*) FROM cells WHERE done=0"
+            ).fetchone()[0]
+
+    def flush(self):
+        """ Remove all cells from the queue """
+
+        self.transaction(lambda cursor: cursor.execute("DELETE FROM cells"))
+
+class SQLite3FailureLedger(object):
+    """ Durable record of the cells that could not be scraped
+
+    A cell is recorded with its bounds, query and scrape type when its
+    requests fail more than the allowed number of times, so that it can be
+    scraped again later without knowing anything else about the scrape.
+    Cells are identified by their scrape type, query and subdivision ID: a
+    cell that fails again is recorded once, with its failures counted, and is
+    marked as unresolved again.
+
+    The database is only created when the first failure is recorded, so
+    scrapes without failures leave no ledger behind. Any number of scrapers
+    and processes on one machine can share a database.
+
+    Attributes:
+        db_path: A string containing the path to the SQLite database.
+        connection: An sqlite3.Connection object, or None if the database has
+            not been opened yet.
+        lock: A threading.Lock object serializing use of the connection.
+    """
+
+    def __init__(self, db_path = "failures.db"):
+        """ Initializes SQLite3FailureLedger class
+
+        Args:
+            db_path: A string containing the path to the SQLite database.
+        """
+
+        self.db_path = db_path
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """ Open the database and create its table, if not done already
+
+        Must be called while holding self.lock.
+
+        Returns:
+            An sqlite3.Connection object.
+        """
+
+        if (self.connection is None):
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok = True)
+            connection = sqlite3.connect(self.db_path, timeout = 60,
+                                         isolation_level = None,
+                                         check_same_thread = False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS failures ("
+                               "entry INTEGER PRIMARY KEY, "
+                               "scrape_type TEXT, query TEXT, id TEXT, "
+                               "cell TEXT, scrape TEXT, reason TEXT, "
+                               "failures INTEGER DEFAULT 1, "
+                               "first_failed REAL, last_failed REAL, "
+                               "resolved INTEGER DEFAULT 0, "
+                               "UNIQUE (scrape_type, query, id))")
+            connection.execute("CREATE INDEX IF NOT EXISTS unresolved_failures "
+                               "ON failures (resolved, scrape_type)")
+            self.connection = connection
+        return self.connection
+
+    def record(self, scrape_type, query, cell, scrape = None, reason = ""):
+        """ Record that a cell could not be scraped
+
+        Args:
+            scrape_type: A string naming the kind of scraper, such as
+                "places_nearby". See SubdivisionScraper.scrape_type.
+            query: A string containing the place_type or keyword that was
+                being scraped.
+            cell: A cell dictionary generated by SubdivisionScraper.make_cells.
+            scrape: An optional string naming the scrape, for information
+                only.
+            reason: A string describing why the cell could not be scraped.
+        """
+
+        now = time.time()
+        with self.lock:
+            self.connect().execute(
+                "INSERT INTO failures (scrape_type, query, id, cell, scrape, "
+                "reason, first_failed, last_failed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (scrape_type, query, id) DO UPDATE SET "
+                "failures=failures + 1, reason=excluded.reason, "
+                "last_failed=excluded.last_failed, resolved=0",
+                (scrape_type, query, cell["id"], json.dumps(cell), scrape,
+                 reason, now, now)
+            )
+
+    def unresolved(self, scrape_type = None):
+        """ Get the cells that have not been scraped since they failed
+
+        Args:
+            scrape_type: An optional string. If given, only cells of this
+                scrape type are returned.
+
+        Returns:
+            A list of dictionaries, in the order the cells first failed, with
+            the keys "entry" (an integer identifying the record), "scrape_type",
+            "query", "cell", "scrape", "reason" and "failures" (the number of
+            times the cell failed).
+        """
+
+        statement = ("SELECT entry, scrape_type, query, cell, scrape, reason, "
+                     "failures FROM failures WHERE resolved=0")
+        parameters = ()
+        if (scrape_type is not None):
+            statement += " AND scrape_type=?"
+            parameters = (scrape_type,)
+
+        with self.lock:
+            rows = self.connect().execute(statement + " ORDER BY entry",
+                                          parameters).fetchall()
+        return [{
+            "entry": row[0],
+            "scrape_type": row[1],
+            "query": row[2],
+            "cell": json.loads(row[3]),
+            "scrape": row[4],
+            "reason": row[5],
+            "failures": row[6]
+        } for row in rows]
+
+    def resolve(self, failure):
+        """ Mark a cell as scraped, unless it failed again in the meantime
+
+        Args:
+            failure: A dictionary returned by unresolved.
+
+        Returns:
+            True if the cell was marked as resolved; False if it failed again
+            since failure was read.
+        """
+
+        with self.lock:
+            return self.connect().execute(
+                "UPDATE failures SET resolved=1 WHERE entry=? AND failures=?",
+                (failure["entry"], failure["failures"])
+            ).rowcount == 1
+
+    def outstanding(self):
+        """ Count the cells that have not been scraped since they failed
+
+        Returns:
+            An integer describing the number of unresolved cells.
+        """
+
+        with self.lock:
+            return self.connect().execute(
+                "SELECT Count(*) FROM failures WHERE resolved=0"
+            ).fetchone()[0]
+
+    def close(self):
+        """ Close the database, if it was opened """
+
+        with self.lock:
+            if (self.connection is not None):
+                self.connection.close()
+                self.connection = None
+
+try:
+    import redis
+    class RedisFrontier(object):
+        """ Durable queue of pending cells stored in Redis
+
+        Behaves like SQLite3Frontier, but can be shared by workers on any
+        number of machines. Pending cells are kept in a list, leased cells in a
+        sorted set scored by the time their lease expires, and every cell that
+        was ever pushed in a set so that cells are only pushed once. Each
+        operation is a single Lua script, so it is atomic and takes one round
+        trip.
+
+        Attributes:
+            name: A string prefixed to the names of the Redis keys.
+            lease_length: A float describing how many seconds a lease lasts.
+            redis: A redis.StrictRedis object.
+            keys: A dictionary containing the names of the Redis keys.
+            leased_entries: A dictionary mapping the (query, subdivision ID)
+                pairs of cells leased by this object to their Redis entries.
+        """
+
+        # KEYS: pending list, seen set; ARGV: JSON-encoded [query, cell] pairs
+        PUSH_SCRIPT = """
+            for i = 1, #ARGV do
+                local entry = cjson.decode(ARGV[i])
+                local key = entry[1] .. "\\n" .. entry[2]["id"]
+                if (redis.call("SADD", KEYS[2], key) == 1) then
+                    redis.call("RPUSH", KEYS[1], ARGV[i])
+                end
+            end
+        """
+
+        # KEYS: pending list, leased sorted set; ARGV: lease length
+        LEASE_SCRIPT = """
+            -- Needed before Redis 5 to write after reading the server's clock
+            if (redis.replicate_commands) then
+                redis.replicate_commands()
+            end
+
+            local clock = redis.call("TIME")
+            local now = tonumber(clock[1]) + tonumber(clock[2])/1000000
+            local expired = redis.call("ZRANGEBYSCORE", KEYS[2], "-inf", now)
+            for i = 1, #expired do
+                redis.call("ZREM", KEYS[2], expired[i])
+                redis.call("LPUSH", KEYS[1], expired[i])
+            end
+
+            local entry = redis.call("LPOP", KEYS[1])
+            if (not entry) then
+                return false
+            end
+            redis.call("ZADD", KEYS[2], now + tonumber(ARGV[1]), entry)
+            return entry
+        """
+
+        # KEYS: pending list, seen set, leased sorted set; ARGV: the leased
+        # entry followed by JSON-encoded [query, cell] pairs of its children
+        COMPLETE_SCRIPT = """
+            for i = 2, #ARGV do
+                local entry = cjson.decode(ARGV[i])
+                local key = entry[1] .. "\\n" .. entry[2]["id"]
+                if (redis.call("SADD", KEYS[2], key) == 1) then
+                    redis.call("RPUSH", KEYS[1], ARGV[i])
+                end
+            end
+            redis.call("ZREM", KEYS[3], ARGV[1])
+        """
+
+        def __init__(self, name = "frontier", lease_length = LEASE_LENGTH,
+                     redis_db = 0, redis_host = "localhost",
+                     redis_port = 6379):
+            """ Initializes RedisFrontier class
+
+            Args:
+                name: A string prefixed to the names of the Redis keys.
+                lease_length: A float describing how many seconds a lease
+                    lasts.
+                redis_db, redis_host, redis_port: The Redis database to use.
+            """
+
+            self.name = name
+            self.lease_length = lease_length
+            self.redis = redis.StrictRedis(host = redis_host,
+                                           port = redis_port, db = redis_db)
+            self.keys = {
+                "pending": "%s:pending" % name,
+                "seen": "%s:seen" % name,
+                "leased": "%s:leased" % name
+            }
+            self.push_script = self.redis.register_script(self.PUSH_SCRIPT)
+            self.lease_script = self.redis.register_script(self.LEASE_SCRIPT)
+            self.complete_script = self.redis.register_script(
+                self.COMPLETE_SCRIPT
+            )
+            self.leased_entries = {}
+
+        def push(self, cells, query):
+            """ See SQLite3Frontier.push """
+
+            if (len(cells) > 0):
+                self.push_script(
+                    keys = [self.keys["pending"], self.keys["seen"]],
+                    args = [json.dumps([query, cell]) for cell in cells]
+                )
+
+        def lease(self, worker = ""):
+            """ See SQLite3Frontier.lease """
+
+            entry = self.lease_script(
+                keys = [self.keys["pending"], self.keys["leased"]],
+                args = [self.lease_length]
+            )
+            if (entry is None):
+                return None
+
+            query, cell = json.loads(entry)
+            self.leased_entries[(query, cell["id"])] = entry
+            return (cell, query)
+
+        def complete(self, cell, query, children = ()):
+            """ See SQLite3Frontier.complete """
+
+            entry = self.leased_entries.pop((query, cell["id"]))
+            self.complete_script(
+                keys = [self.keys["pending"], self.keys["seen"],
+                        self.keys["leased"]],
+                args = ([entry]
+                        + [json.dumps([query, child]) for child in children])
+            )
+
+        def release(self, cell, query):
+            """ See SQLite3Frontier.release """
+
+            entry = self.leased_entries.pop((query, cell["id"]))
+            pipeline = self.redis.pipeline()
+            pipeline.zrem(self.keys["leased"], entry)
+            pipeline.lpush(self.keys["pending"], entry)
+            pipeline.execute()
+
+        def outstanding(self):
+            """ See SQLite3Frontier.outstanding """
+
+            return (self.redis.llen(self.keys["pending"])
+                    + self.redis.zcard(self.keys["leased"]))
+
+        def flush(self):
+            """ See SQLite3Frontier.flush """
+
+            self.redis.delete(*self.keys.values())
+except ImportError:
+    print("RedisFrontier class unavailable; could not import redis module.")
@@ -38,23 +38,250 @@ def point_in_polygon(point, polygon):
             lng.append(polygon[i + 1][0])
             lat.append(polygon[i + 1][1])
 
-        # The smaller point should be the bottom-left point
-        lng = sorted(lng)
-        lat = sorted(lat)
-
-        # The ray intersects with the line segment if:
-        #     lat_1 <= point_lat <= lat_2
-        #     point_lng <= the average of lng_1 and lng_2
-        if ((point[1] >= lat[0])
-            and (point[1] <= lat[1])
-            and (point[0] <= (lng[0]+lng[1])/2)):
-            intersections += 1
+        # The ray intersects with the line segment if the segment straddles
+        # the point's latitude and crosses it to the right of the point. Each
+        # end of the segment counts as above the point if its latitude is
+        # larger, so a vertex on the ray is only counted once.
+        if ((lat[0] > point[1]) != (lat[1] > point[1])):
+            crossing_lng = (lng[0] + (point[1] - lat[0])
+                            * (lng[1] - lng[0])/(lat[1] - lat[0]))
+            if (point[0] < crossing_lng):
+                intersections += 1
 
     if (intersections % 2):
         return True
     else:
         return False
 
+def segment_intersects_rectangle(start, end, min_latitude, max_latitude,
+                                 min_longitude, max_longitude):
+    """ Determine whether a line segment touches a rectangle
+
+    Uses the Liang-Barsky algorithm to clip the segment to the rectangle.
+
+    Args:
+        start, end: (longitude, latitude) coordinate pairs of the ends of the
+            segment.
+        min_latitude, max_latitude, min_longitude, max_longitude: Floating
+            points describing the bounds of the rectangle.
+
+    Returns:
+        True if any part of the segment lies within the rectangle; False
+        otherwise.
+    """
+
+    d_lng = end[0] - start[0]
+    d_lat = end[1] - start[1]
+    t_min = 0.0
+    t_max = 1.0
+
+    for p, q in ((-d_lng, start[0] - min_longitude),
+                 (d_lng, max_longitude - start[0]),
+                 (-d_lat, start[1] - min_latitude),
+                 (d_lat, max_latitude - start[1])):
+        if (p == 0):
+            # Parallel to this side and outside of it
+            if (q < 0):
+                return False
+        else:
+            t = float(q)/p
+            if (p < 0):
+                t_min = max(t_min, t)
+            else:
+                t_max = min(t_max, t)
+            if (t_min > t_max):
+                return False
+
+    return True
+
+class Polygon(object):
+    """ A polygon made of one or more rings, such as a TIGER place
+
+    Rings are combined using the even-odd rule, so a ring inside another ring
+    is a hole. Bounding boxes of the polygon and of each ring are kept, so
+    most tests of points and rectangles far from the boundary are answered
+    without looking at the rings' edges.
+
+    Attributes:
+        rings: A list of rings, each an array of (longitude, latitude)
+            coordinate pairs. See point_in_polygon.
+        ring_extents: A list of (min_latitude, max_latitude, min_longitude,
+            max_longitude) tuples describing the bounding box of each ring.
+        extents: A (min_latitude, max_latitude, min_longitude, max_longitude)
+            tuple describing the bounding box of the polygon.
+    """
+
+    def __init__(self, rings):
+        """ Initializes Polygon class
+
+        Args:
+            rings: A list of rings, each an array of (longitude, latitude)
+                coordinate pairs.
+        """
+
+        self.rings = [ring for ring in rings if (len(ring) >= 3)]
+        if (len(self.rings) == 0):
+            raise ValueError("A polygon needs at least one ring of three or "
+                             "more points")
+
+        self.ring_extents = []
+        for ring in self.rings:
+            longitudes = [point[0] for point in ring]
+            latitudes = [point[1] for point in ring]
+            self.ring_extents.append((min(latitudes), max(latitudes),
+                                      min(longitudes), max(longitudes)))
+
+        self.extents = (min(extents[0] for extents in self.ring_extents),
+                        max(extents[1] for extents in self.ring_extents),
+                        min(extents[2] for extents in self.ring_extents),
+                        max(extents[3] for extents in self.ring_extents))
+
+    def contains(self, point):
+        """ Determine whether a point lies within the polygon
+
+        Args:
+            point: A (longitude, latitude) coordinate pair to be tested.
+
+        Returns:
+            True if the point lies within the polygon; False otherwise.
+        """
+
+        inside = False
+        for ring, extents in zip(self.rings, self.ring_extents):
+            if (
+                extents[0] <= point[1] <= extents[1]
+                and extents[2] <= point[0] <= extents[3]
+                and point_in_polygon(point, ring)
+            ):
+                inside = not inside
+
+        return inside
+
+    def intersects_rectangle(self, min_latitude, max_latitude, min_longitude,
+                             max_longitude):
+        """ Determine whether any part of a rectangle lies within the polygon
+
+        Args:
+            min_latitude, max_latitude, min_longitude, max_longitude: Floating
+                points describing the bounds of the rectangle.
+
+        Returns:
+            True if the rectangle and the polygon overlap; False if the
+            rectangle lies entirely outside of the polygon.
+        """
+
+        bounds = (min_latitude, max_latitude, min_longitude, max_longitude)
+
+        def overlaps(extents):
+            return (extents[0] <= max_latitude and min_latitude <= extents[1]
+                    and extents[2] <= max_longitude
+                    and min_longitude <= extents[3])
+
+        if (not overlaps(self.extents)):
+            return False
+
+        if (self.contains(((min_longitude + max_longitude)/2,
+                           (min_latitude + max_latitude)/2))):
+            return True
+
+        # Otherwise, the rectangle only overlaps the polygon if the boundary
+        # of the polygon passes through it
+        for ring, extents in zip(self.rings, self.ring_extents):
+            if (not overlaps(extents)):
+                continue
+            for i in range(len(ring)):
+                if (segment_intersects_rectangle(ring[i - 1], ring[i],
+                                                 *bounds)):
+                    return True
+
+        return False
+
+def to_plane(origin, point):
+    """ Project a point onto a plane tangent to the Earth at an origin
+
+    An equirectangular projection is used, which is accurate for distances of
+    up to a few tens of kilometers.
+
+    Args:
+        origin: A (longitude, latitude) coordinate pair at the center of the
+            plane.
+        point: A (longitude, latitude) coordinate pair to be projected.
+
+    Returns:
+        An (x, y) tuple of the distances east and north of the origin, in
+        meters.
+    """
+
+    return (radians(point[0] - origin[0])*RADIUS_OF_EARTH
+            * cos(radians(origin[1])),
+            radians(point[1] - origin[1])*RADIUS_OF_EARTH)
+
+def from_plane(origin, point):
+    """ Reverse to_plane
+
+    Args:
+        origin: A (longitude, latitude) coordinate pair at the center of the
+            plane.
+        point: An (x, y) tuple of the distances east and north of the origin,
+            in meters.
+
+    Returns:
+        A (longitude, latitude) coordinate pair.
+    """
+
+    return (origin[0] + degrees(point[0]/(RADIUS_OF_EARTH
+                                          * cos(radians(origin[1])))),
+            origin[1] + degrees(point[1]/RADIUS_OF_EARTH))
+
+def hexagon(center, radius):
+    """ Find the corners of a regular hexagon with a corner pointing north
+
+    Args:
+        center: An (x, y) tuple of the center of the hexagon.
+        radius: A float of the distance from the center to each corner.
+
+    Returns:
+        A list of six (x, y) tuples, counterclockwise from the north-east
+        corner.
+    """
+
+    return [(center[0] + radius*cos(radians(30 + 60*i)),
+             center[1] + radius*sin(radians(30 + 60*i)))
+            for i in range(6)]
+
+def convex_polygons_overlap(lhs, rhs, tolerance = 1e-9):
+    """ Determine whether two convex polygons share some area
+
+    Uses the separating axis theorem: two convex polygons are disjoint if and
+    only if the projections of their corners onto the normal of one of their
+    edges do not overlap. Polygons that only touch along an edge or at a
+    corner do not overlap.
+
+    Args:
+        lhs, rhs: Lists of (x, y) tuples, the corners of each polygon in
+            order.
+        tolerance: A float of how far the projections must overlap, relative
+            to the length of the edge, for the polygons to overlap.
+
+    Returns:
+        True if the polygons overlap; False otherwise.
+    """
+
+    for polygon in (lhs, rhs):
+        for i in range(len(polygon)):
+            normal = (polygon[i][1] - polygon[i - 1][1],
+                      polygon[i - 1][0] - polygon[i][0])
+            margin = tolerance*(normal[0]**2 + normal[1]**2)
+            lhs_projections = [normal[0]*x + normal[1]*y for x, y in lhs]
+            rhs_projections = [normal[0]*x + normal[1]*y for x, y in rhs]
+            if (
+                max(lhs_projections) <= min(rhs_projections) + margin
+                or max(rhs_projections) <= min(lhs_projections) + margin
+            ):
+                return False
+
+    return True
+
 def haversine(lon1, lat1, lon2, lat2):
     """ Calculate the distance between two points on a sphere using the
     haversine forumula
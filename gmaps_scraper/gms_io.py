@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
 # Library providing data dumping classes in a modular way for gmaps_scraper
 
+import fcntl
 import pickle
 import json
 import os
+import re
 import sqlite3
+import threading
+import time
+
+# Largest number of place_ids RedisDuplicateChecker.check_many adds in one
+# round trip
+CHECK_BATCH_SIZE = 500
 
 class DuplicateChecker(object):
     """ A dummy class to be used when deduplication is not desirable
@@ -20,37 +28,138 @@ class DuplicateChecker(object):
     def check(self, *args, **kwargs):
         return True
 
+    def check_many(self, place_ids):
+        """ Checks to see if any of a list of place_ids have been dumped
+
+        Args:
+            place_ids: A list of place_id strings.
+
+        Returns:
+            A list of bools, one for each place_id, which are True if the
+            place_id did not exist yet and False if it did. A place_id that
+            appears more than once in place_ids is only new the first time.
+        """
+
+        return [self.check(place_id) for place_id in place_ids]
+
     def flush(self):
         pass
 
 class SQLite3DuplicateChecker(DuplicateChecker):
+    """ A duplicate checker that keeps the seen place_ids in an SQLite database
+
+    One connection is kept open in WAL mode, and place_ids are the primary key
+    of a table without rowids, so checking a place_id is a single B-tree
+    lookup however many have been seen, and each one is only stored once.
+    check_many checks a whole dump in one transaction, which is only written
+    to disk once.
+
+    Tables made by earlier versions, which had no index and could hold repeated
+    place_ids, are deduplicated and indexed when they are opened.
+
+    Attributes:
+        table: A string containing the name of the table.
+        db_path: A string containing the path to the SQLite database.
+        connection: An sqlite3.Connection object.
+        lock: A threading.Lock object serializing use of the connection.
+    """
+
     def __init__(self, table = "seen_places", db_path = "seen_places.db"):
+        """ Initializes SQLite3DuplicateChecker class and its database
+
+        Args:
+            See the attributes.
+        """
+
         self.table = table
         self.db_path = db_path
-        with sqlite3.connect(self.db_path) as connection:
-            try:
-                connection.execute("CREATE TABLE %s (id)" % self.table)
-                connection.commit()
-            except:
-                pass
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(self.db_path, timeout = 60,
+                                          isolation_level = None,
+                                          check_same_thread = False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS %s "
+                                "(id TEXT PRIMARY KEY) WITHOUT ROWID"
+                                % self.table)
+        self.index_table()
+
+    def index_table(self):
+        """ Add a unique index to a table made by an earlier version
+
+        Tables made by this version have a primary key, and tables that were
+        already migrated have the unique index, so neither is deduplicated
+        again.
+        """
+
+        columns = self.connection.execute(
+            "PRAGMA table_info(%s)" % self.table
+        ).fetchall()
+        if (any(column[5] for column in columns)):
+            return
+        indexes = self.connection.execute(
+            "PRAGMA index_list(%s)" % self.table
+        ).fetchall()
+        if (any(index[1] == "%s_ids" % self.table for index in indexes)):
+            return
+
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.connection.execute(
+                "DELETE FROM %s WHERE rowid NOT IN "
+                "(SELECT Min(rowid) FROM %s GROUP BY id)"
+                % (self.table, self.table)
+            )
+            self.connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS "
+                                    "%s_ids ON %s (id)"
+                                    % (self.table, self.table))
+            self.connection.execute("COMMIT")
+        except:
+            self.connection.execute("ROLLBACK")
+            raise
 
     def check(self, place_id):
-        with sqlite3.connect(self.db_path) as connection:
-            cursor = connection.cursor()
-            cursor.execute("INSERT INTO %s VALUES (?)" % self.table,
-                           (place_id,))
-            cursor.execute("SELECT Count(id) FROM %s WHERE id=?" % self.table,
-                           (place_id,))
-            connection.commit()
-            return cursor.fetchone()[0] == 1
+        """ Checks to see if place_id has already been dumped
 
-    def flush(self):
-        with sqlite3.connect(self.db_path) as connection:
+        Args:
+            place_id: A string containing the place_id to be checked.
+
+        Returns:
+            True if the place_id does not exist yet; False if it does.
+        """
+
+        return self.check_many([place_id])[0]
+
+    def check_many(self, place_ids):
+        """ See DuplicateChecker.check_many """
+
+        statement = "INSERT OR IGNORE INTO %s VALUES (?)" % self.table
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
             try:
-                connection.execute("DELETE FROM %s" % self.table)
-                connection.commit()
+                new = []
+                for place_id in place_ids:
+                    cursor.execute(statement, (place_id,))
+                    new.append(cursor.rowcount == 1)
+                cursor.execute("COMMIT")
             except:
-                pass
+                cursor.execute("ROLLBACK")
+                raise
+        return new
+
+    def flush(self):
+        """ Empties the table of seen place_ids """
+
+        with self.lock:
+            self.connection.execute("DELETE FROM %s" % self.table)
+
+    def close(self):
+        """ Close the connection to the database """
+
+        with self.lock:
+            self.connection.close()
 
 try:
     import redis
@@ -75,6 +184,22 @@ try:
             """
             return self.redis.sadd(self.set_name, place_id) == 1
 
+        def check_many(self, place_ids):
+            """ See DuplicateChecker.check_many
+
+            The place_ids are added in pipelines of up to CHECK_BATCH_SIZE
+            commands, so a dump costs one round trip per batch instead of one
+            per place.
+            """
+
+            new = []
+            for start in range(0, len(place_ids), CHECK_BATCH_SIZE):
+                pipeline = self.redis.pipeline(transaction = False)
+                for place_id in place_ids[start:start + CHECK_BATCH_SIZE]:
+                    pipeline.sadd(self.set_name, place_id)
+                new.extend((added == 1) for added in pipeline.execute())
+            return new
+
         def flush(self):
             """ Empties the working set """
             self.redis.delete(self.set_name)
@@ -88,6 +213,8 @@ class Writer(object):
     Attributes:
         duplicate_checker: An object of the DuplicateChecker class or of one of
             its child classes.
+        events: An eventlog.EventLog object that skipped duplicates are
+            reported to at the DEBUG level, or None if they are printed.
     """
 
     def __init__(self, *args, **kwargs):
@@ -95,6 +222,19 @@ class Writer(object):
         """
 
         self.duplicate_checker = DuplicateChecker(*args, **kwargs)
+        self.events = None
+
+    def ignore_duplicate(self, place_id):
+        """ Report a place that is not written because it was seen before
+
+        Args:
+            place_id: A string containing the place_id of the place.
+        """
+
+        if (self.events is None):
+            print("Ignoring duplicate %s" % place_id)
+        else:
+            self.events.debug("duplicate", "Ignoring duplicate %s", place_id)
 
 try:
     import pymongo
@@ -160,7 +300,7 @@ try:
                 try:
                     self.collection.insert_one(_dict)
                 except pymongo.errors.DuplicateKeyError:
-                    print("Ignoring duplicate %s" % _dict["place_id"])
+                    self.ignore_duplicate(_dict["place_id"])
 
         def flush(self):
             """ Drops the current collection """
@@ -194,23 +334,39 @@ class PickleWriter(Writer):
         pickle_path: A string containing a path to a pickle file.
     """
 
-    def __init__(self, pickle_path):
-        """ Initializes PickleWriter class """
+    def __init__(self, pickle_path, *args, **kwargs):
+        """ Initializes PickleWriter class
+
+        Args:
+            pickle_path: A string containing a path to a pickle file.
+            args: A dictionary of keyword arguments. See
+                RedisDuplicateChecker.__init__ for more information.
+        """
+
+        Writer.__init__(self, *args, **kwargs)
         self.pickle_path = pickle_path
 
     def dump(self, data):
-        """ Dump data to a pickle object
+        """ Dump the new dictionaries in data to the pickle file as one list
 
         Args:
-            data: A Python data structure to be dumped to the pickle file.
+            data: An iterable containing dictionaries to be dumped.
         """
 
-        with open(self.pickle_path, "a+b") as f:
-            for _dict in data:
-                if (self.duplicate_checker.check(_dict["place_id"])):
-                    pickle.dump(data, f)
-                else:
-                    print("Ignoring duplicate %s" % _dict["place_id"])
+        data = list(data)
+        new_data = []
+        new = self.duplicate_checker.check_many(
+            [_dict["place_id"] for _dict in data]
+        )
+        for _dict, is_new in zip(data, new):
+            if (is_new):
+                new_data.append(_dict)
+            else:
+                self.ignore_duplicate(_dict["place_id"])
+
+        if (len(new_data) > 0):
+            with open(self.pickle_path, "a+b") as f:
+                pickle.dump(new_data, f)
 
 class JSONWriter(Writer):
     """ Handles writing to a JSON
@@ -245,14 +401,397 @@ class JSONWriter(Writer):
         """
 
         with open(self.json_path, "rb+") as f:
+            # Lock the file in case other processes are writing to it, such as
+            # workers sharing a frontier. The lock is released on close.
+            fcntl.flock(f, fcntl.LOCK_EX)
             if (len(data) > 0):
                 f.seek(-2, os.SEEK_END)
                 if (f.tell() != 2):
                     f.write(bytes(",\n", "UTF-8"))
-                for _dict in data:
-                    if (self.duplicate_checker.check(_dict["place_id"])):
+                new = self.duplicate_checker.check_many(
+                    [_dict["place_id"] for _dict in data]
+                )
+                for _dict, is_new in zip(data, new):
+                    if (is_new):
                         f.write(bytes("%s,\n" % json.dumps(_dict), "UTF-8"))
                     else:
-                        print("Ignoring duplicate %s" % _dict["place_id"])
+                        self.ignore_duplicate(_dict["place_id"])
                 f.seek(-2, os.SEEK_END)
                 f.write(bytes("\n]", "UTF-8"))
+
+class NullWriter(Writer):
+    """ Discards everything it is given, for dry runs """
+
+    def dump(self, data):
+        """ Discard data
+
+        Args:
+            data: An array of dictionaries.
+        """
+
+        pass
+
+class SynchronizedWriter(Writer):
+    """ Wraps another writer so that it can be shared between threads
+
+    Calls to dump are serialized with a lock, so scrapers running in different
+    threads can share one writer and, with it, one duplicate checker. All other
+    attributes are looked up on the wrapped writer.
+
+    Attributes:
+        writer: The wrapped writer object.
+        lock: A threading.Lock object that serializes calls to dump.
+    """
+
+    def __init__(self, writer):
+        """ Initializes SynchronizedWriter class
+
+        Args:
+            writer: The writer object to be wrapped.
+        """
+
+        self.writer = writer
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.writer, name)
+
+    def dump(self, data):
+        """ Dump data using the wrapped writer, one thread at a time
+
+        Args:
+            data: An iterable containing dictionaries to be dumped.
+        """
+
+        with self.lock:
+            self.writer.dump(data)
+
+# Maximum number of places a checkpoint ledger records before committing them
+CHECKPOINT_BATCH_SIZE = 20
+
+# Maximum number of seconds a checkpoint ledger waits before committing
+CHECKPOINT_BATCH_SECONDS = 1.0
+
+class SQLite3CheckpointLedger(object):
+    """ Durable record of the places whose details have been fetched
+
+    Every fetched result is recorded in an SQLite database before it is
+    dumped, so results that were paid for survive a crash, and is marked as
+    dumped once the writer has saved it. Records are committed in groups of up
+    to batch_size, or after batch_seconds, so checkpointing does not cost a
+    disk sync per place. A crash loses at most one uncommitted group, which is
+    simply fetched again.
+
+    When a scrape is restarted with the same ledger, results that were
+    recorded but not dumped are replayed, and place_ids that were already
+    fetched are skipped by primary key lookup, no matter where they appear in
+    the input.
+
+    Attributes:
+        db_path: A string containing the path to the SQLite database.
+        batch_size: An integer describing the maximum number of uncommitted
+            records.
+        batch_seconds: A float describing the maximum number of seconds a
+            record stays uncommitted.
+        uncommitted: An integer indicating how many records have not been
+            committed yet.
+        last_commit: A float of the time.monotonic() time of the last commit.
+        connection: An sqlite3.Connection object.
+        lock: A threading.Lock object serializing use of the connection.
+    """
+
+    def __init__(self, db_path = "checkpoint.db",
+                 batch_size = CHECKPOINT_BATCH_SIZE,
+                 batch_seconds = CHECKPOINT_BATCH_SECONDS):
+        """ Initializes SQLite3CheckpointLedger class and its database
+
+        Args:
+            db_path: A string containing the path to the SQLite database.
+            batch_size: An integer describing the maximum number of
+                uncommitted records.
+            batch_seconds: A float describing the maximum number of seconds a
+                record stays uncommitted.
+        """
+
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(self.db_path, timeout = 60,
+                                          check_same_thread = False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS places ("
+                                "place_id TEXT PRIMARY KEY, result TEXT, "
+                                "dumped INTEGER DEFAULT 0)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS undumped_places "
+                                "ON places (dumped)")
+        self.connection.commit()
+
+    def contains(self, place_id):
+        """ Checks to see if a place has already been fetched
+
+        Args:
+            place_id: A string containing the place_id to be checked.
+
+        Returns:
+            True if the place has been recorded; False otherwise.
+        """
+
+        with self.lock:
+            return self.connection.execute(
+                "SELECT 1 FROM places WHERE place_id=?", (place_id,)
+            ).fetchone() is not None
+
+    def record(self, place_id, result):
+        """ Record the fetched details of a place
+
+        Args:
+            place_id: A string containing the place_id.
+            result: The dictionary of details returned by the API.
+        """
+
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO places VALUES (?, ?, 0)",
+                (place_id, json.dumps(result))
+            )
+            self.uncommitted += 1
+            if (
+                self.uncommitted >= self.batch_size
+                or (time.monotonic() - self.last_commit) >= self.batch_seconds
+            ):
+                self.commit_locked()
+
+    def mark_dumped(self, place_ids):
+        """ Mark places as saved by the writer and commit
+
+        Their results are dropped from the database, as they are no longer
+        needed.
+
+        Args:
+            place_ids: An iterable of place_id strings.
+        """
+
+        with self.lock:
+            self.connection.executemany(
+                "UPDATE places SET dumped=1, result=NULL WHERE place_id=?",
+                [(place_id,) for place_id in place_ids]
+            )
+            self.commit_locked()
+
+    def undumped_results(self):
+        """ Get the results that were recorded but not dumped
+
+        Returns:
+            A list of (place_id, result) tuples, where place_id is the
+            place_id the result was recorded under, which can differ from the
+            place_id in the result, and result is a dictionary of details.
+        """
+
+        with self.lock:
+            return [(row[0], json.loads(row[1]))
+                    for row in self.connection.execute(
+                        "SELECT place_id, result FROM places WHERE dumped=0"
+                    )]
+
+    def commit(self):
+        """ Commit all recorded places """
+
+        with self.lock:
+            self.commit_locked()
+
+    def commit_locked(self):
+        """ Commit all recorded places. The caller must hold self.lock. """
+
+        self.connection.commit()
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
+
+    def flush(self):
+        """ Forget all recorded places """
+
+        with self.lock:
+            self.connection.execute("DELETE FROM places")
+            self.commit_locked()
+
+# Number of characters read from a file at a time by the streaming readers
+READ_CHUNK_SIZE = 1024*1024
+
+# Whitespace and commas between the elements of a JSON array
+SEPARATORS = re.compile(r"[\s,]*")
+
+def iter_json_array(json_path):
+    """ Lazily read the objects of a JSON array, such as one written by
+    JSONWriter
+
+    Objects are decoded one at a time from a small buffer, so memory use does
+    not depend on the size of the file and reading can start immediately.
+
+    Args:
+        json_path: A string containing a path to a JSON file containing an
+            array.
+
+    Yields:
+        The elements of the array, in order.
+    """
+
+    decoder = json.JSONDecoder()
+    with open(json_path, "r") as f:
+        buffer = f.read(READ_CHUNK_SIZE)
+        position = SEPARATORS.match(buffer).end()
+        if (buffer[position:position + 1] != "["):
+            raise ValueError("%s does not contain a JSON array" % json_path)
+        position += 1
+
+        while True:
+            # Skip the separators between elements
+            position = SEPARATORS.match(buffer, position).end()
+            if (buffer[position:position + 1] == "]"):
+                return
+
+            try:
+                obj, end = decoder.raw_decode(buffer, position)
+                # A number at the end of the buffer may continue in the next
+                # chunk
+                complete = (end < len(buffer))
+            except ValueError:
+                complete = False
+
+            if (not complete):
+                # Keep the unread part of the buffer and read more of the file
+                chunk = f.read(READ_CHUNK_SIZE)
+                if (len(chunk) == 0):
+                    if (position < len(buffer)):
+                        # Let the decoder report the error, or yield the last
+                        # element if it was complete after all
+                        obj, end = decoder.raw_decode(buffer, position)
+                        yield obj
+                    return
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            yield obj
+            position = end
+
+def iter_ndjson(ndjson_path):
+    """ Lazily read a file containing one JSON object per line
+
+    Args:
+        ndjson_path: A string containing a path to a newline-delimited JSON
+            file.
+
+    Yields:
+        The object on each non-blank line, in order.
+    """
+
+    with open(ndjson_path, "r") as f:
+        for line in f:
+            if (line.strip()):
+                yield json.loads(line)
+
+def iter_pickle(pickle_path):
+    """ Lazily read the places in a stream of pickles, such as one written by
+    PickleWriter
+
+    Args:
+        pickle_path: A string containing a path to a file of consecutive
+            pickles, each of a dictionary or of a list of dictionaries.
+
+    Yields:
+        Each dictionary, in order.
+    """
+
+    with open(pickle_path, "rb") as f:
+        while True:
+            try:
+                obj = pickle.load(f)
+            except EOFError:
+                return
+            if (isinstance(obj, dict)):
+                yield obj
+            else:
+                for _dict in obj:
+                    yield _dict
+
+def iter_places(source):
+    """ Lazily read the places in a source
+
+    Args:
+        source: One of the following:
+            * A string containing the path to a JSON array, such as one
+              written by JSONWriter.
+            * A string containing the path to a newline-delimited JSON file,
+              ending with .ndjson or .jsonl. Files ending with .json that do
+              not start with "[" are also read as newline-delimited JSON.
+            * A string containing the path to a pickle file, ending with .p or
+              .pickle.
+            * A string of the form "mongo:COLLECTION_NAME", naming a MongoDB
+              collection written by MongoWriter with its default database and
+              host.
+            * Any other iterable of places, such as a pymongo.cursor.Cursor.
+
+    Returns:
+        An iterator of the places, in order.
+    """
+
+    if (not isinstance(source, str)):
+        return iter(source)
+
+    if (source.startswith("mongo:")):
+        return iter_mongo(source[len("mongo:"):])
+    elif (source.endswith(".p") or source.endswith(".pickle")):
+        return iter_pickle(source)
+    elif (source.endswith(".ndjson") or source.endswith(".jsonl")):
+        return iter_ndjson(source)
+
+    with open(source, "r") as f:
+        first_character = f.read(READ_CHUNK_SIZE).lstrip()[:1]
+    if (first_character == "["):
+        return iter_json_array(source)
+    return iter_ndjson(source)
+
+def iter_place_ids(source):
+    """ Lazily read the place_ids of the places in a source
+
+    Args:
+        source: Any source accepted by iter_places, which may also contain
+            place_id strings instead of places.
+
+    Yields:
+        place_id strings, in order.
+    """
+
+    for place in iter_places(source):
+        if (isinstance(place, str)):
+            yield place
+        else:
+            yield place["place_id"]
+
+try:
+    import pymongo
+    def iter_mongo(collection_name, db_name = "places_db",
+                   host = "localhost:27017"):
+        """ Lazily read the places in a MongoDB collection, such as one written
+        by MongoWriter
+
+        Args:
+            collection_name: A string containing the name of the MongoDB
+                collection.
+            db_name: A string containing the name of the MongoDB database.
+            host: A string containing the name of the MongoDB host and its
+                port.
+
+        Returns:
+            A pymongo.cursor.Cursor object yielding dictionaries that only
+            contain the place_id of each place.
+        """
+
+        collection = pymongo.MongoClient(host)[db_name][collection_name]
+        return collection.find({}, {"place_id": 1, "_id": 0})
+except:
+    print("iter_mongo function unavailable; could not import pymongo")
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# Library providing a local stand-in for the Google Places API, so that
+# scrapers can be run and benchmarked without spending any quota
+
+import collections
+import googlemaps
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+from . import planner
+
+# From https://developers.google.com/places/web-service/search: "There is a
+# short delay between when a next_page_token is issued, and when it will become
+# valid." Tokens used sooner are answered with INVALID_REQUEST.
+TOKEN_DELAY = 2.0
+
+# The paths that googlemaps.Client requests, and the method serving each
+ENDPOINTS = {
+    "/maps/api/place/nearbysearch/json": "places_nearby",
+    "/maps/api/place/radarsearch/json": "places_radar",
+    "/maps/api/place/details/json": "place"
+}
+
+# A key that passes googlemaps.Client's check of the format of API keys
+MOCK_API_KEY = "AIzaMockPlacesKey"
+
+class MockClient(planner.SimulatedClient):
+    """ A stand-in for googlemaps.Client that behaves like the real API
+
+    Adds what SimulatedClient leaves out: every request takes time, a fraction
+    of them fail, next_page_tokens only become valid after a delay, and
+    responses carry a status. Errors are raised as
+    googlemaps.exceptions.ApiError, as googlemaps.Client raises them.
+
+    Attributes:
+        See planner.SimulatedClient.
+        latency: A float describing the number of seconds every request takes.
+        jitter: A float describing the largest number of seconds added to the
+            latency at random.
+        error_rate: A float describing the fraction of requests that fail with
+            UNKNOWN_ERROR.
+        token_delay: A float describing the number of seconds before a
+            next_page_token becomes valid.
+        generator: A random.Random object deciding the jitter and errors.
+        token_times: A dictionary mapping each next_page_token to the Unix time
+            at which it was issued.
+        errors: A collections.Counter object counting the errors injected into
+            the requests to each endpoint.
+    """
+
+    def __init__(self, points, latency = 0.0, jitter = 0.0, error_rate = 0.0,
+                 token_delay = TOKEN_DELAY, seed = 0):
+        """ Initializes MockClient class
+
+        Args:
+            points: A list of (latitude, longitude) coordinate pairs, as drawn
+                by planner.DensityModel.points.
+            latency, jitter, error_rate, token_delay: See the attributes.
+            seed: An integer seeding the random number generator, so that the
+                same errors are injected every time.
+        """
+
+        planner.SimulatedClient.__init__(self, points)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+        self.generator = random.Random(seed)
+        self.token_times = {}
+        self.errors = collections.Counter()
+
+    def simulate_request(self, endpoint):
+        """ Wait for the latency and inject an error at random
+
+        Args:
+            endpoint: A string containing the name of the method.
+
+        Raises:
+            googlemaps.exceptions.ApiError: The request failed. Failed requests
+                are counted in self.requests, as they count against the quota.
+        """
+
+        with self.lock:
+            delay = self.latency + self.generator.uniform(0, self.jitter)
+            failed = (self.generator.random() < self.error_rate)
+            if (failed):
+                self.requests[endpoint] += 1
+                self.errors[endpoint] += 1
+
+        if (delay > 0):
+            time.sleep(delay)
+        if (failed):
+            raise googlemaps.exceptions.ApiError("UNKNOWN_ERROR",
+                                                 "Injected error")
+
+    def with_status(self, response):
+        """ Add a status to a response
+
+        Args:
+            response: A response dictionary.
+
+        Returns:
+            The response, with a status of OK or ZERO_RESULTS.
+        """
+
+        if (len(response.get("results", [None])) == 0):
+            response["status"] = "ZERO_RESULTS"
+        else:
+            response["status"] = "OK"
+        return response
+
+    def places_nearby(self, location = None, radius = None, page_token = None,
+                      **kwargs):
+        """ Simulate googlemaps.Client.places_nearby
+
+        See planner.SimulatedClient.places_nearby.
+
+        Raises:
+            googlemaps.exceptions.ApiError: The request failed, or the
+                page_token is unknown or not valid yet.
+        """
+
+        self.simulate_request("places_nearby")
+
+        if (page_token is not None):
+            with self.lock:
+                issued = self.token_times.get(page_token)
+                if (issued is None
+                        or (time.time() - issued) < self.token_delay):
+                    self.requests["places_nearby"] += 1
+                    raise googlemaps.exceptions.ApiError("INVALID_REQUEST")
+                del self.token_times[page_token]
+
+        response = planner.SimulatedClient.places_nearby(
+            self, location, radius, page_token, **kwargs
+        )
+        if ("next_page_token" in response):
+            with self.lock:
+                self.token_times[response["next_page_token"]] = time.time()
+        return self.with_status(response)
+
+    def places_radar(self, location = None, radius = None, **kwargs):
+        """ Simulate googlemaps.Client.places_radar
+
+        See planner.SimulatedClient.places_radar.
+
+        Raises:
+            googlemaps.exceptions.ApiError: The request failed.
+        """
+
+        self.simulate_request("places_radar")
+        return self.with_status(planner.SimulatedClient.places_radar(
+            self, location, radius, **kwargs
+        ))
+
+    def place(self, place_id, **kwargs):
+        """ Simulate googlemaps.Client.place
+
+        See planner.SimulatedClient.place. The details are the simulated place
+        and a name.
+
+        Raises:
+            googlemaps.exceptions.ApiError: The request failed, or the place_id
+                is unknown.
+        """
+
+        self.simulate_request("place")
+        try:
+            response = planner.SimulatedClient.place(self, place_id, **kwargs)
+        except (ValueError, IndexError):
+            raise googlemaps.exceptions.ApiError("NOT_FOUND")
+
+        response["result"] = dict(response["result"],
+                                  name = "Mock place %s" % place_id)
+        return self.with_status(response)
+
+class MockRequestHandler(http.server.BaseHTTPRequestHandler):
+    """ Answers the requests googlemaps.Client makes with a MockClient
+
+    The MockClient is the client attribute of the server.
+    """
+
+    def do_GET(self):
+        """ Answer a request to one of ENDPOINTS """
+
+        url = urllib.parse.urlparse(self.path)
+        if (url.path not in ENDPOINTS):
+            self.send_error(404)
+            return
+
+        params = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            body = self.call(ENDPOINTS[url.path], params)
+        except googlemaps.exceptions.ApiError as err:
+            body = {"status": err.status}
+            if (err.message is not None):
+                body["error_message"] = err.message
+
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def call(self, endpoint, params):
+        """ Call the MockClient method serving an endpoint
+
+        Args:
+            endpoint: A string containing the name of the method.
+            params: A dictionary of the query parameters of the request.
+
+        Returns:
+            A response dictionary.
+        """
+
+        client = self.server.client
+        if (endpoint == "place"):
+            return client.place(params.get("placeid",
+                                           params.get("place_id", "")))
+
+        kwargs = {}
+        if ("location" in params):
+            latitude, longitude = params["location"].split(",")
+            kwargs["location"] = {
+                "lat": float(latitude),
+                "lng": float(longitude)
+            }
+        if ("radius" in params):
+            kwargs["radius"] = float(params["radius"])
+
+        if (endpoint == "places_nearby"):
+            return client.places_nearby(page_token = params.get("pagetoken"),
+                                        **kwargs)
+        return client.places_radar(**kwargs)
+
+    def log_message(self, *dummy_args):
+        """ Keep requests out of the output """
+
+        pass
+
+class MockServer(http.server.ThreadingHTTPServer):
+    """ Serves a MockClient on localhost over HTTP
+
+    Point googlemaps.Client at the server to test everything between a scraper
+    and the network:
+
+        server = MockServer(MockClient(points)).start()
+        gmaps = googlemaps.Client(key = MOCK_API_KEY, base_url = server.url)
+
+    Note that places_radar is only served to versions of googlemaps that still
+    provide it.
+
+    Attributes:
+        client: The MockClient object answering requests.
+        url: A string containing the base URL of the server.
+        thread: The threading.Thread object serving requests, or None if the
+            server is not running.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, client, host = "127.0.0.1", port = 0):
+        """ Initializes MockServer class
+
+        Args:
+            client: A MockClient object.
+            host: A string containing the address to listen on.
+            port: An integer describing the port to listen on. By default, a
+                free port is chosen.
+        """
+
+        http.server.ThreadingHTTPServer.__init__(self, (host, port),
+                                                 MockRequestHandler)
+        self.client = client
+        self.url = "http://%s:%d" % self.server_address[:2]
+        self.thread = None
+
+    def start(self):
+        """ Start serving requests on a background thread
+
+        Returns:
+            The server, so that it can be started as it is made.
+        """
+
+        self.thread = threading.Thread(target = self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """ Stop serving requests and close the socket """
+
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+        self.thread = None
@@ -49,6 +49,18 @@ def dump_points(shp_file, name = "all"):
             points += shape_record.shape.points
     return points
 
+# Get the rings of all shapes with the given name, split by shape part, in a
+# form that can be passed to geo.Polygon
+def dump_rings(shp_file, name = "all"):
+    rings = []
+    for shape_record in shapefile.Reader(shp_file).shapeRecords():
+        if (name == "all") or (shape_record.record[4] == name):
+            shape = shape_record.shape
+            starts = list(shape.parts) + [len(shape.points)]
+            for i in range(len(shape.parts)):
+                rings.append(shape.points[starts[i]:starts[i + 1]])
+    return rings
+
 # Parse the given shp_file for info of the shape with the given name, or, if
 # none is specified, the info of the shapefile as a whole
 # Returns a dictionary of various information about the target shape:
@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+# Library providing density models and a simulated Google Maps client, which
+# let a subdivision scrape be planned without making any requests
+
+import collections
+import math
+import random
+import threading
+
+from . import geo, gms_io
+
+# Places per square kilometer assumed by the uniform prior
+UNIFORM_DENSITY = 20.0
+
+# Number of places and clusters of the synthetic model
+SYNTHETIC_PLACES = 5000
+SYNTHETIC_CLUSTERS = 5
+
+# Fraction of the synthetic places that belong to a cluster, and the standard
+# deviation of a cluster as a fraction of the extent of the region
+SYNTHETIC_CLUSTERED_FRACTION = 0.5
+SYNTHETIC_CLUSTER_SPREAD = 0.05
+
+# Size, in degrees, of the buckets the simulated client indexes places by
+BUCKET_DEGREES = 0.01
+
+# What the simulated API serves, mirroring the real one
+NEARBY_PAGE_SIZE = 20
+NEARBY_MAX_PAGES = 3
+RADAR_RESULT_CAP = 200
+
+# Seconds the real API is assumed to take to answer a request
+REQUEST_LATENCY = 0.3
+
+def region_area(min_latitude, max_latitude, min_longitude, max_longitude):
+    """ Find the area of a region
+
+    Args:
+        min_latitude, max_latitude, min_longitude, max_longitude: Floating
+            points describing the bounds of the region.
+
+    Returns:
+        A float of the area in square kilometers.
+    """
+
+    middle_latitude = (min_latitude + max_latitude)/2
+    height = geo.haversine(min_longitude, min_latitude, min_longitude,
+                           max_latitude)
+    width = geo.haversine(min_longitude, middle_latitude, max_longitude,
+                          middle_latitude)
+    return width*height/1e6
+
+class DensityModel(object):
+    """ Base density model class
+
+    Density models describe where the places to be scraped are expected to
+    be. Subclasses define points, which draws a set of simulated places.
+    """
+
+    def points(self, min_latitude, max_latitude, min_longitude,
+               max_longitude):
+        """ Draw the places of a region
+
+        Args:
+            min_latitude, max_latitude, min_longitude, max_longitude: Floating
+                points describing the bounds of the region.
+
+        Returns:
+            A list of (latitude, longitude) coordinate pairs.
+        """
+
+        return []
+
+class UniformModel(DensityModel):
+    """ A uniform prior: places are spread evenly over the region
+
+    Attributes:
+        density: A float describing the number of places per square kilometer.
+        seed: An integer seeding the random number generator, so that plans can
+            be repeated.
+    """
+
+    def __init__(self, density = UNIFORM_DENSITY, seed = 0):
+        """ Initializes UniformModel class
+
+        Args:
+            density: A float describing the number of places per square
+                kilometer.
+            seed: An integer seeding the random number generator.
+        """
+
+        self.density = density
+        self.seed = seed
+
+    def points(self, min_latitude, max_latitude, min_longitude,
+               max_longitude):
+        """ Draw places uniformly
+
+        See DensityModel.points.
+        """
+
+        generator = random.Random(self.seed)
+        count = int(round(self.density*region_area(
+            min_latitude, max_latitude, min_longitude, max_longitude
+        )))
+        return [(generator.uniform(min_latitude, max_latitude),
+                 generator.uniform(min_longitude, max_longitude))
+                for i in range(count)]
+
+class SyntheticModel(DensityModel):
+    """ A synthetic distribution: Gaussian clusters over a uniform background
+
+    Attributes:
+        places: An integer describing the total number of places.
+        clusters: An integer describing the number of clusters.
+        clustered_fraction: A float describing the fraction of the places that
+            belong to a cluster.
+        spread: A float describing the standard deviation of a cluster as a
+            fraction of the extent of the region.
+        seed: An integer seeding the random number generator, so that plans can
+            be repeated.
+    """
+
+    def __init__(self, places = SYNTHETIC_PLACES,
+                 clusters = SYNTHETIC_CLUSTERS,
+                 clustered_fraction = SYNTHETIC_CLUSTERED_FRACTION,
+                 spread = SYNTHETIC_CLUSTER_SPREAD, seed = 0):
+        """ Initializes SyntheticModel class
+
+        Args:
+            See the attributes.
+        """
+
+        self.places = places
+        self.clusters = clusters
+        self.clustered_fraction = clustered_fraction
+        self.spread = spread
+        self.seed = seed
+
+    def points(self, min_latitude, max_latitude, min_longitude,
+               max_longitude):
+        """ Draw places around randomly placed clusters
+
+        Places drawn outside of the region are drawn again.
+
+        See DensityModel.points.
+        """
+
+        generator = random.Random(self.seed)
+        centers = [(generator.uniform(min_latitude, max_latitude),
+                    generator.uniform(min_longitude, max_longitude))
+                   for i in range(self.clusters)]
+
+        points = []
+        while (len(points) < self.places):
+            if (len(centers) > 0
+                    and generator.random() < self.clustered_fraction):
+                center = generator.choice(centers)
+                point = (
+                    generator.gauss(center[0],
+                                    self.spread*(max_latitude - min_latitude)),
+                    generator.gauss(center[1],
+                                    self.spread*(max_longitude - min_longitude))
+                )
+            else:
+                point = (generator.uniform(min_latitude, max_latitude),
+                         generator.uniform(min_longitude, max_longitude))
+
+            if (min_latitude <= point[0] <= max_latitude
+                    and min_longitude <= point[1] <= max_longitude):
+                points.append(point)
+
+        return points
+
+class ObservedModel(DensityModel):
+    """ The places found by a previous scrape
+
+    Attributes:
+        source: Any source accepted by gms_io.iter_places, such as the path of
+            a JSON, NDJSON or pickle file written by a writer.
+    """
+
+    def __init__(self, source):
+        """ Initializes ObservedModel class
+
+        Args:
+            source: Any source accepted by gms_io.iter_places.
+        """
+
+        self.source = source
+
+    def points(self, min_latitude, max_latitude, min_longitude,
+               max_longitude):
+        """ Read the places of a previous scrape
+
+        Places without a location, outside of the region or found more than
+        once are left out.
+
+        See DensityModel.points.
+        """
+
+        points = []
+        seen = set()
+        for place in gms_io.iter_places(self.source):
+            try:
+                location = place["geometry"]["location"]
+                point = (location["lat"], location["lng"])
+            except (KeyError, TypeError):
+                continue
+
+            key = place.get("place_id", point)
+            if (key in seen):
+                continue
+            seen.add(key)
+
+            if (min_latitude <= point[0] <= max_latitude
+                    and min_longitude <= point[1] <= max_longitude):
+                points.append(point)
+
+        return points
+
+def density_model(spec):
+    """ Make a density model from a description
+
+    Args:
+        spec: One of the following strings:
+            * "uniform" or "uniform:DENSITY", for a UniformModel with DENSITY
+              places per square kilometer.
+            * "synthetic" or "synthetic:PLACES", for a SyntheticModel of
+              PLACES places.
+            * The path of the output of a previous scrape, for an
+              ObservedModel.
+
+    Returns:
+        A density model object.
+    """
+
+    name, separator, argument = spec.partition(":")
+    if (name == "uniform"):
+        if (separator):
+            return UniformModel(float(argument))
+        return UniformModel()
+    elif (name == "synthetic"):
+        if (separator):
+            return SyntheticModel(int(argument))
+        return SyntheticModel()
+
+    return ObservedModel(spec)
+
+class SimulatedClient(object):
+    """ A stand-in for googlemaps.Client that serves simulated places
+
+    The places_nearby, places_radar and place methods answer like the Google
+    Maps API does, including its result caps and next_page_tokens, from a set
+    of points drawn by a density model. Places are served in the order they
+    were drawn. No requests are made and no time is spent waiting.
+
+    Attributes:
+        places: A list of place dictionaries with a place_id and a location.
+        buckets: A dictionary mapping (row, column) keys to lists of the
+            indices of the places in a BUCKET_DEGREES square.
+        requests: A collections.Counter object counting the requests made to
+            each endpoint.
+        page_tokens: An integer indicating how many next_page_tokens were
+            handed out.
+        tokens: A dictionary mapping each next_page_token to the places and
+            page it stands for.
+        lock: A threading.Lock object guarding the counters and tokens.
+    """
+
+    def __init__(self, points):
+        """ Initializes SimulatedClient class
+
+        Args:
+            points: A list of (latitude, longitude) coordinate pairs, as drawn
+                by DensityModel.points.
+        """
+
+        self.places = []
+        self.buckets = collections.defaultdict(list)
+        for i, (latitude, longitude) in enumerate(points):
+            self.places.append({
+                "place_id": "simulated_%d" % i,
+                "geometry": {
+                    "location": {
+                        "lat": latitude,
+                        "lng": longitude
+                    }
+                }
+            })
+            self.buckets[self.bucket_key(latitude, longitude)].append(i)
+
+        self.requests = collections.Counter()
+        self.page_tokens = 0
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+    def bucket_key(self, latitude, longitude):
+        """ Find the bucket a point belongs to
+
+        Args:
+            latitude, longitude: Floating points describing the point.
+
+        Returns:
+            A (row, column) tuple.
+        """
+
+        return (int(math.floor(latitude/BUCKET_DEGREES)),
+                int(math.floor(longitude/BUCKET_DEGREES)))
+
+    def places_in_circle(self, location, radius):
+        """ Find the places within a circle
+
+        Args:
+            location: A dictionary with the keys "lat" and "lng" describing
+                the center of the circle.
+            radius: A float describing the radius of the circle in meters.
+
+        Returns:
+            A list of place dictionaries, in the order they were drawn.
+        """
+
+        latitude = location["lat"]
+        longitude = location["lng"]
+        latitude_margin = math.degrees(radius/geo.RADIUS_OF_EARTH)
+        longitude_margin = latitude_margin/max(
+            math.cos(math.radians(latitude)), 1e-6
+        )
+        min_key = self.bucket_key(latitude - latitude_margin,
+                                  longitude - longitude_margin)
+        max_key = self.bucket_key(latitude + latitude_margin,
+                                  longitude + longitude_margin)
+
+        bucket_count = (max_key[0] - min_key[0] + 1)*(
+            max_key[1] - min_key[1] + 1)
+        if (bucket_count > len(self.buckets)):
+            candidates = [index for indices in self.buckets.values()
+                          for index in indices]
+        else:
+            candidates = []
+            for row in range(min_key[0], max_key[0] + 1):
+                for column in range(min_key[1], max_key[1] + 1):
+                    candidates.extend(self.buckets.get((row, column), []))
+
+        places = []
+        for index in sorted(candidates):
+            place = self.places[index]
+            place_location = place["geometry"]["location"]
+            if (geo.haversine(longitude, latitude, place_location["lng"],
+                              place_location["lat"]) <= radius):
+                places.append(place)
+        return places
+
+    def places_nearby(self, location = None, radius = None, page_token = None,
+                      **dummy_kwargs):
+        """ Simulate googlemaps.Client.places_nearby
+
+        Up to NEARBY_PAGE_SIZE places are served per page, for up to
+        NEARBY_MAX_PAGES pages.
+
+        Returns:
+            A response dictionary.
+        """
+
+        with self.lock:
+            self.requests["places_nearby"] += 1
+            if (page_token is not None):
+                places, page = self.tokens.pop(page_token)
+            else:
+                places = self.places_in_circle(
+                    location, radius
+                )[:NEARBY_PAGE_SIZE*NEARBY_MAX_PAGES]
+                page = 0
+
+            response = {
+                "results": places[page*NEARBY_PAGE_SIZE:
+                                  (page + 1)*NEARBY_PAGE_SIZE]
+            }
+            if ((page + 1)*NEARBY_PAGE_SIZE < len(places)):
+                self.page_tokens += 1
+                token = "simulated_token_%d" % self.page_tokens
+                self.tokens[token] = (places, page + 1)
+                response["next_page_token"] = token
+
+            return response
+
+    def places_radar(self, location = None, radius = None, **dummy_kwargs):
+        """ Simulate googlemaps.Client.places_radar
+
+        Up to RADAR_RESULT_CAP places are served.
+
+        Returns:
+            A response dictionary.
+        """
+
+        with self.lock:
+            self.requests["places_radar"] += 1
+
+        return {
+            "results": self.places_in_circle(location,
+                                             radius)[:RADAR_RESULT_CAP]
+        }
+
+    def place(self, place_id, **dummy_kwargs):
+        """ Simulate googlemaps.Client.place
+
+        Returns:
+            A response dictionary whose result is the simulated place.
+        """
+
+        with self.lock:
+            self.requests["place"] += 1
+
+        return {"result": self.places[int(place_id.rsplit("_", 1)[1])]}
+
+def quota_rate(rate_limiter):
+    """ Find the sustained rate and burst a rate limiter allows
+
+    Args:
+        rate_limiter: A rate limiter object provided by the ratelimit library.
+
+    Returns:
+        A (rate, burst) tuple, where rate is a float of requests per second and
+        burst is the number of requests that can be made at once, or
+        (None, None) if the rate limiter does not limit requests.
+    """
+
+    if (hasattr(rate_limiter, "rate") and hasattr(rate_limiter, "capacity")):
+        return (rate_limiter.rate, rate_limiter.capacity)
+    elif (hasattr(rate_limiter, "max_requests")
+            and hasattr(rate_limiter, "period_length")):
+        return (float(rate_limiter.max_requests)/rate_limiter.period_length,
+                rate_limiter.max_requests)
+    return (None, None)
+
+def estimate_seconds(requests, page_tokens, rate_limiter,
+                     page_token_delay, max_in_flight = 1,
+                     latency = REQUEST_LATENCY):
+    """ Estimate how long a scrape would take
+
+    The scrape is either bound by the quota, once the burst the rate limiter
+    allows has been spent, or by the time the requests and the waits for
+    next_page_tokens take, divided among the requests in flight.
+
+    Args:
+        requests: An integer describing the number of requests.
+        page_tokens: An integer describing the number of next_page_tokens that
+            were waited for.
+        rate_limiter: A rate limiter object provided by the ratelimit library.
+        page_token_delay: A float describing the number of seconds waited
+            before a next_page_token is used.
+        max_in_flight: An integer describing the number of requests that can
+            be running at once.
+        latency: A float describing the number of seconds a request takes.
+
+    Returns:
+        A float of the estimated number of seconds.
+    """
+
+    work = (requests*latency + page_tokens*page_token_delay)/max_in_flight
+
+    rate, burst = quota_rate(rate_limiter)
+    if (rate is None or rate <= 0):
+        return work
+    return max(work, max(0, requests - burst)/rate)
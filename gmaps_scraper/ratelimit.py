@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# Library providing rate limiters that can be shared between scrapers
+
+import asyncio
+import sqlite3
+import threading
+import time
+
+class RateLimiter(object):
+    """ Base rate limiter class
+
+    Rate limiters hand out permission to make requests. Subclasses define
+    reserve, which claims capacity for a request and returns how long the
+    caller has to wait before making it. The waiting itself is done by acquire,
+    which sleeps, or by acquire_async, which awaits, so one rate limiter can be
+    shared by threads and coroutines alike.
+
+    Attributes:
+        acquisitions: An integer indicating how many requests were allowed.
+        waits: An integer indicating how many of those requests were held up.
+        total_wait: A float of the total number of seconds that requests were
+            held up for.
+        stats_lock: A threading.Lock object guarding the statistics.
+    """
+
+    def __init__(self):
+        """ Initializes the statistics """
+
+        self.acquisitions = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.stats_lock = threading.Lock()
+
+    def reserve(self, tokens = 1):
+        """ Claim capacity for a request
+
+        Args:
+            tokens: An integer describing how many requests to claim.
+
+        Returns:
+            A float of the number of seconds the caller must wait before making
+            the request.
+        """
+
+        return 0.0
+
+    def record_wait(self, wait):
+        """ Add a wait imposed on a caller to the statistics
+
+        Args:
+            wait: A float of the number of seconds the caller was held up.
+        """
+
+        with self.stats_lock:
+            self.acquisitions += 1
+            if (wait > 0):
+                self.waits += 1
+                self.total_wait += wait
+
+    def acquire(self, tokens = 1):
+        """ Block until a request can be made
+
+        THIS MUST BE RUN ONCE BEFORE EVERY REQUEST!!!!
+
+        Args:
+            tokens: An integer describing how many requests to claim.
+
+        Returns:
+            A float of the number of seconds the caller was held up.
+        """
+
+        wait = self.reserve(tokens)
+        if (wait > 0):
+            time.sleep(wait)
+        self.record_wait(wait)
+        return wait
+
+    async def acquire_async(self, tokens = 1):
+        """ Wait, without blocking the event loop, until a request can be made
+
+        Args:
+            tokens: An integer describing how many requests to claim.
+
+        Returns:
+            A float of the number of seconds the caller was held up.
+        """
+
+        wait = self.reserve(tokens)
+        if (wait > 0):
+            await asyncio.sleep(wait)
+        self.record_wait(wait)
+        return wait
+
+class TokenBucket(RateLimiter):
+    """ Token bucket rate limiter
+
+    The bucket holds up to capacity tokens and is refilled at a constant rate.
+    Every request takes a token; a request that finds the bucket empty reserves
+    the next token to be added and waits exactly until then. This allows short
+    bursts of up to capacity requests while spreading the remaining requests
+    evenly, so at most capacity + rate * t requests are made in any interval of
+    t seconds.
+
+    Attributes:
+        rate: A float describing how many tokens are added per second.
+        capacity: A float describing the maximum number of tokens in the bucket.
+        tokens: A float of the number of tokens currently in the bucket. This
+            becomes negative when requests are waiting for tokens.
+        last_update: A float of the time.monotonic() time when tokens was last
+            updated.
+        lock: A threading.Lock object guarding the bucket.
+    """
+
+    def __init__(self, rate, capacity = 1):
+        """ Initializes TokenBucket class with a full bucket
+
+        Args:
+            rate: A float describing how many tokens are added per second.
+            capacity: A float describing the maximum number of tokens in the
+                bucket.
+        """
+
+        RateLimiter.__init__(self)
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.last_update = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_period(cls, max_requests, period_length, capacity = 1, **kwargs):
+        """ Create a token bucket that never exceeds a budget per period
+
+        The rate is chosen so that a full burst followed by a period of
+        sustained requests still fits within max_requests.
+
+        Args:
+            max_requests: An integer describing the maximum number of requests
+                that can be made in one period.
+            period_length: A float describing the length of a period, in
+                seconds.
+            capacity: A float describing the maximum burst size.
+            kwargs: A dictionary of keyword arguments passed on to the
+                constructor.
+
+        Returns:
+            An object of the class this is called on.
+        """
+
+        return cls(float(max_requests - capacity)/period_length, capacity,
+                   **kwargs)
+
+    def reserve(self, tokens = 1):
+        """ Take tokens from the bucket
+
+        See RateLimiter.reserve.
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.last_update)*self.rate)
+            self.last_update = now
+
+            self.tokens -= tokens
+            if (self.tokens >= 0):
+                return 0.0
+            return -self.tokens/self.rate
+
+class PeriodRateLimiter(RateLimiter):
+    """ Limits the number of requests made in fixed-length periods
+
+    Periods of a fixed length are defined and a maximum number of requests per
+    period can not be exceeded; requests made after the limit is reached wait
+    until the next period.
+
+    Attributes:
+        max_requests: An integer describing the maximum number of requests that
+            can be made in one period.
+        period_length: A float describing the length of a period, in seconds.
+        period_start_time: A float of the Unix time when the period that the
+            last request was reserved in was started. This is in the future if
+            requests are waiting for the next period.
+        requests_this_period: An integer indicating how many requests were
+            reserved in that period.
+        lock: A threading.Lock object guarding the counters.
+    """
+
+    def __init__(self, max_requests, period_length):
+        """ Initializes PeriodRateLimiter class
+
+        Args:
+            max_requests: An integer describing the maximum number of requests
+                that can be made in one period.
+            period_length: A float describing the length of a period, in
+                seconds.
+        """
+
+        RateLimiter.__init__(self)
+        self.max_requests = max_requests
+        self.period_length = period_length
+        self.period_start_time = time.time()
+        self.requests_this_period = 0
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens = 1):
+        """ Count requests against the current period or the next one
+
+        See RateLimiter.reserve.
+        """
+
+        with self.lock:
+            now = time.time()
+
+            # End of period
+            if ((now - self.period_start_time) >= self.period_length):
+                self.period_start_time = now
+                self.requests_this_period = 0
+
+            if ((self.requests_this_period + tokens) > self.max_requests):
+                print("Max requests per period reached (%d). %f Seconds until "
+                      "next period." % (
+                    self.max_requests,
+                    self.period_start_time + self.period_length - now
+                ))
+                self.period_start_time += self.period_length
+                self.requests_this_period = 0
+
+            self.requests_this_period += tokens
+            return max(0.0, self.period_start_time - now)
+
+class SQLite3RateLimiter(TokenBucket):
+    """ Token bucket rate limiter shared by all processes using one database
+
+    The state of the bucket is kept in an SQLite database. Every reservation
+    is made in an immediate transaction, which takes the database's file lock,
+    so any number of processes on one machine can draw from a single quota.
+    See TokenBucket for a description of the algorithm.
+
+    Attributes:
+        See TokenBucket. The tokens attribute is not used.
+        db_path: A string containing the path to the SQLite database.
+        name: A string containing the name of the bucket. Scrapers using
+            different API keys can share a database by using different names.
+        connection: An sqlite3.Connection object.
+        lock: A threading.Lock object serializing use of the connection.
+    """
+
+    def __init__(self, rate, capacity = 1, db_path = "quota.db",
+                 name = "default"):
+        """ Initializes SQLite3RateLimiter class and its database
+
+        Args:
+            rate: A float describing how many tokens are added per second.
+            capacity: A float describing the maximum number of tokens in the
+                bucket.
+            db_path: A string containing the path to the SQLite database.
+            name: A string containing the name of the bucket.
+        """
+
+        TokenBucket.__init__(self, rate, capacity)
+        self.db_path = db_path
+        self.name = name
+
+        # Transactions are managed manually so that every reservation takes the
+        # file lock for as short a time as possible
+        self.connection = sqlite3.connect(self.db_path, timeout = 60,
+                                          isolation_level = None,
+                                          check_same_thread = False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS buckets ("
+                                "name TEXT PRIMARY KEY, tokens REAL, "
+                                "last_update REAL)")
+
+    def reserve(self, tokens = 1):
+        """ Take tokens from the shared bucket
+
+        See RateLimiter.reserve.
+        """
+
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                cursor.execute("SELECT tokens, last_update FROM buckets "
+                               "WHERE name=?", (self.name,))
+                row = cursor.fetchone()
+                if (row is None):
+                    available = self.capacity
+                else:
+                    available = min(self.capacity,
+                                    row[0] + max(0, now - row[1])*self.rate)
+
+                available -= tokens
+                cursor.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)",
+                               (self.name, available, now))
+                cursor.execute("COMMIT")
+            except:
+                cursor.execute("ROLLBACK")
+                raise
+
+        if (available >= 0):
+            return 0.0
+        return -available/self.rate
+
+try:
+    import redis
+    class RedisRateLimiter(TokenBucket):
+        """ Token bucket rate limiter shared by all processes using one Redis
+
+        The state of the bucket is kept in a Redis hash and updated by a Lua
+        script, so every reservation is atomic and takes a single round trip.
+        The Redis server's clock is used, so scrapers on different machines
+        can share a quota. See TokenBucket for a description of the algorithm.
+
+        Attributes:
+            See TokenBucket. The tokens attribute is not used.
+            key: A string containing the name of the Redis hash.
+            redis: A redis.StrictRedis object.
+            script: The registered Lua script that updates the bucket.
+        """
+
+        SCRIPT = """
+            -- Needed before Redis 5 to write after reading the server's clock
+            if (redis.replicate_commands) then
+                redis.replicate_commands()
+            end
+
+            local rate = tonumber(ARGV[1])
+            local capacity = tonumber(ARGV[2])
+            local requested = tonumber(ARGV[3])
+
+            local clock = redis.call("TIME")
+            local now = tonumber(clock[1]) + tonumber(clock[2])/1000000
+
+            local state = redis.call("HMGET", KEYS[1], "tokens", "last_update")
+            local tokens = tonumber(state[1])
+            local last_update = tonumber(state[2])
+            if (tokens == nil) then
+                tokens = capacity
+                last_update = now
+            end
+
+            tokens = math.min(capacity,
+                              tokens + math.max(0, now - last_update)*rate)
+            tokens = tokens - requested
+            redis.call("HMSET", KEYS[1], "tokens", tostring(tokens),
+                       "last_update", tostring(now))
+            redis.call("EXPIRE", KEYS[1],
+                       math.ceil((capacity - tokens)/rate) + 60)
+
+            if (tokens >= 0) then
+                return "0"
+            end
+            return tostring(-tokens/rate)
+        """
+
+        def __init__(self, rate, capacity = 1, key = "gmaps_scraper_quota",
+                     redis_db = 0, redis_host = "localhost",
+                     redis_port = 6379):
+            """ Initializes RedisRateLimiter class
+
+            Args:
+                rate: A float describing how many tokens are added per second.
+                capacity: A float describing the maximum number of tokens in
+                    the bucket.
+                key: A string containing the name of the Redis hash. Scrapers
+                    using different API keys should use different names.
+                redis_db, redis_host, redis_port: The Redis database to use.
+            """
+
+            TokenBucket.__init__(self, rate, capacity)
+            self.key = key
+            self.redis = redis.StrictRedis(host = redis_host,
+                                           port = redis_port, db = redis_db)
+            self.script = self.redis.register_script(self.SCRIPT)
+
+        def reserve(self, tokens = 1):
+            """ Take tokens from the shared bucket
+
+            See RateLimiter.reserve.
+            """
+
+            return float(self.script(keys = [self.key],
+                                     args = [self.rate, self.capacity, tokens]))
+except ImportError:
+    print("RedisRateLimiter class unavailable; could not import redis module.")
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# Library providing saturation policies, which decide whether a cell of the
+# subdivision tree returned every place in it or has to be divided
+
+import math
+import threading
+
+from . import geo
+
+# Fraction of the result cap above which SignalPolicy also looks at where the
+# results lie, as the API sometimes returns short pages
+NEAR_CAP_FRACTION = 0.9
+
+class ScrapeResults(list):
+    """ The results of a cell, together with what the API said about them
+
+    This is a list of results, so it can be used wherever the array returned
+    by a scrape function is expected.
+
+    Attributes:
+        result_cap: An integer describing the largest number of results the
+            API returns for one request, such as 60 for places_nearby, or
+            None if it is unknown.
+        truncated: A bool describing whether or not the API indicated that it
+            had more results than it returned, such as a next_page_token on the
+            last page.
+    """
+
+    def __init__(self, results = (), result_cap = None, truncated = False):
+        """ Initializes ScrapeResults class
+
+        Args:
+            results: An iterable of results returned by the Google Maps API.
+            result_cap: An optional integer describing the largest number of
+                results the API returns for one request.
+            truncated: A bool describing whether or not the API indicated that
+                it had more results than it returned.
+        """
+
+        list.__init__(self, results)
+        self.result_cap = result_cap
+        self.truncated = truncated
+
+    def merge(self, results):
+        """ Add the results of another request for the same cell
+
+        Args:
+            results: An array of results, or a ScrapeResults object whose
+                truncated flag is carried over.
+        """
+
+        self.extend(results)
+        self.truncated = self.truncated or getattr(results, "truncated", False)
+
+def cell_corners(cell):
+    """ Get the corners of a cell
+
+    Args:
+        cell: A cell dictionary generated by SubdivisionScraper.make_cells.
+
+    Returns:
+        A list of (longitude, latitude) coordinate pairs.
+    """
+
+    if ("hexagon" in cell):
+        return [tuple(corner) for corner in cell["hexagon"]]
+
+    return [(cell["min_longitude"], cell["min_latitude"]),
+            (cell["max_longitude"], cell["min_latitude"]),
+            (cell["max_longitude"], cell["max_latitude"]),
+            (cell["min_longitude"], cell["max_latitude"])]
+
+def inside_fraction(cell, results):
+    """ Find the fraction of results that lie within a cell rather than in the
+    rest of its circle
+
+    Args:
+        cell: A cell dictionary generated by SubdivisionScraper.make_cells.
+        results: An array of results returned by the Google Maps API. Results
+            without a location are left out.
+
+    Returns:
+        A float between 0 and 1, or 0 if no result has a location.
+    """
+
+    corners = cell_corners(cell)
+    located = 0
+    inside = 0
+    for result in results:
+        try:
+            location = result["geometry"]["location"]
+            point = (location["lng"], location["lat"])
+        except (KeyError, TypeError):
+            continue
+
+        located += 1
+        if (geo.point_in_polygon(point, corners)):
+            inside += 1
+
+    if (located == 0):
+        return 0.0
+    return float(inside)/located
+
+def area_fraction(cell):
+    """ Find the fraction of a cell's circle that is covered by the cell
+
+    Args:
+        cell: A cell dictionary generated by SubdivisionScraper.make_cells.
+
+    Returns:
+        A float between 0 and 1.
+    """
+
+    origin = (cell["center_longitude"], cell["center_latitude"])
+    corners = [geo.to_plane(origin, corner) for corner in cell_corners(cell)]
+
+    # Shoelace formula
+    area = abs(sum(corners[i - 1][0]*corners[i][1]
+                   - corners[i][0]*corners[i - 1][1]
+                   for i in range(len(corners))))/2
+
+    return min(1.0, area/(math.pi*cell["radius_meters"]**2))
+
+def threshold_for(scraper, cell):
+    """ Find the threshold the legacy rule applies to a cell
+
+    The scraper's threshold is relaxed for the first four levels of the
+    subdivision tree.
+
+    Args:
+        scraper: A SubdivisionScraper object with a threshold attribute.
+        cell: A cell dictionary generated by SubdivisionScraper.make_cells.
+
+    Returns:
+        An integer describing the number of results at or above which the cell
+        is divided.
+    """
+
+    depth = cell["id"].count("->")
+    if (depth <= 4):
+        return int(scraper.threshold * (1 - 0.6/depth))
+    return scraper.threshold
+
+class SaturationPolicy(object):
+    """ Base saturation policy class
+
+    Saturation policies decide whether the results of a cell are complete or
+    whether the cell has to be divided. Subclasses define is_saturated;
+    should_split calls it and keeps statistics, comparing every decision with
+    the legacy threshold rule so that the effect of a policy can be measured.
+
+    Attributes:
+        cells: An integer indicating how many cells were decided on.
+        splits: An integer indicating how many of them were divided.
+        splits_avoided: An integer indicating how many cells were not divided
+            that the legacy threshold rule would have divided.
+        splits_added: An integer indicating how many cells were divided that
+            the legacy threshold rule would not have divided.
+        lock: A threading.Lock object guarding the statistics.
+    """
+
+    def __init__(self):
+        """ Initializes the statistics """
+
+        self.reset()
+
+    def reset(self):
+        """ Reset the statistics and their lock, so that a copy of a policy
+        keeps statistics of its own """
+
+        self.lock = threading.Lock()
+        self.cells = 0
+        self.splits = 0
+        self.splits_avoided = 0
+        self.splits_added = 0
+
+    def is_saturated(self, scraper, cell, results):
+        """ Decide whether a cell has to be divided
+
+        Args:
+            scraper: The SubdivisionScraper object that scraped the cell.
+            cell: A cell dictionary generated by SubdivisionScraper.make_cells.
+            results: The array returned by the scraper's scrape function,
+                usually a ScrapeResults object.
+
+        Returns:
+            True if the cell should be divided; False otherwise.
+        """
+
+        return False
+
+    def should_split(self, scraper, cell, results):
+        """ Decide whether a cell has to be divided and count the decision
+
+        Args:
+            See is_saturated.
+
+        Returns:
+            True if the cell should be divided; False otherwise.
+        """
+
+        split = self.is_saturated(scraper, cell, results)
+        legacy_split = (len(results) >= threshold_for(scraper, cell))
+
+        with self.lock:
+            self.cells += 1
+            if (split):
+                self.splits += 1
+            if (legacy_split and not split):
+                self.splits_avoided += 1
+            elif (split and not legacy_split):
+                self.splits_added += 1
+
+        return split
+
+    def stats(self):
+        """ Get the statistics
+
+        Returns:
+            A dictionary with the keys "cells", "splits", "splits_avoided" and
+            "splits_added".
+        """
+
+        with self.lock:
+            return {
+                "cells": self.cells,
+                "splits": self.splits,
+                "splits_avoided": self.splits_avoided,
+                "splits_added": self.splits_added
+            }
+
+class ThresholdPolicy(SaturationPolicy):
+    """ The legacy policy: divide cells with at least a threshold of results
+
+    The scraper's threshold attribute is used, relaxed for the first four
+    levels of the subdivision tree. See threshold_for.
+    """
+
+    def is_saturated(self, scraper, cell, results):
+        """ Compare the number of results with the threshold
+
+        See SaturationPolicy.is_saturated.
+        """
+
+        threshold = threshold_for(scraper, cell)
+        if (threshold != scraper.threshold):
+            scraper.events.debug("threshold", "Relaxing threshold to %d",
+                                 threshold)
+
+        if (len(results) >= threshold):
+            scraper.events.debug(
+                "saturated", "Making subdivisions because threshold was met "
+                "(%d)", threshold, id = cell["id"]
+            )
+            return True
+
+        return False
+
+class SignalPolicy(SaturationPolicy):
+    """ Divide cells based on what the API said about their results
+
+    The API returns every place in a circle unless it hits its result cap, so
+    a cell only has to be divided if:
+        * The API indicated that it had more results, such as with a
+          next_page_token on the last page it serves.
+        * The number of results reached the API's result cap.
+        * The number of results came within near_cap_fraction of the cap, and
+          at least as large a fraction of them lie within the cell as the
+          fraction of the circle that the cell covers. The API sometimes
+          serves short pages, so a nearly full circle that is dense where the
+          cell is is treated as saturated; one whose results mostly lie in
+          the neighbors' part of the circle is not.
+
+    Results without a known cap are judged by the legacy threshold rule.
+
+    Attributes:
+        See SaturationPolicy.
+        near_cap_fraction: A float describing the fraction of the result cap
+            at which the location of the results is looked at.
+    """
+
+    def __init__(self, near_cap_fraction = NEAR_CAP_FRACTION):
+        """ Initializes SignalPolicy class
+
+        Args:
+            near_cap_fraction: A float describing the fraction of the result
+                cap at which the location of the results is looked at.
+        """
+
+        SaturationPolicy.__init__(self)
+        self.near_cap_fraction = near_cap_fraction
+
+    def is_saturated(self, scraper, cell, results):
+        """ Look for signs that the API left results out
+
+        See SaturationPolicy.is_saturated.
+        """
+
+        if (getattr(results, "truncated", False)):
+            scraper.events.debug(
+                "saturated",
+                "Making subdivisions because the API has more results",
+                id = cell["id"]
+            )
+            return True
+
+        result_cap = getattr(results, "result_cap", None)
+        if (result_cap is None):
+            return ThresholdPolicy.is_saturated(self, scraper, cell, results)
+
+        if (len(results) >= result_cap):
+            scraper.events.debug(
+                "saturated", "Making subdivisions because the result cap was "
+                "met (%d)", result_cap, id = cell["id"]
+            )
+            return True
+
+        if (len(results) >= self.near_cap_fraction*result_cap):
+            fraction = inside_fraction(cell, results)
+            scraper.events.debug("inside_fraction",
+                                 "%0.3f of the results lie within the cell",
+                                 fraction, id = cell["id"])
+            if (fraction >= area_fraction(cell)):
+                scraper.events.debug(
+                    "saturated", "Making subdivisions because the cell is "
+                    "nearly at the result cap and is dense", id = cell["id"]
+                )
+                return True
+
+        return False
+
+# The saturation policies that can be chosen by name
+POLICIES = {
+    "threshold": ThresholdPolicy,
+    "signals": SignalPolicy
+}
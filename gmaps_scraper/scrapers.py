@@ -1,18 +1,32 @@
 #!/usr/bin/env python3
 
+import asyncio
+import concurrent.futures
+import contextlib
+import copy
+import functools
 import googlemaps
+import itertools
 import json
 import math
 import os
 import shutil
-import subprocess
 import sys
+import tempfile
+import threading
 import time
 
 from . import parse_tiger
+from . import cache
+from . import eventlog
+from . import frontier
 from . import geo
 from . import gms_io
+from . import planner
+from . import ratelimit
+from . import saturation
 from . import staticmaps
+from . import telemetry
 
 # From https://developers.google.com/places/web-service/search: The maximum
 # allowed radius is 50000 meters.
@@ -27,51 +41,246 @@ PERIOD_LENGTH = 60*60 # One hour
 # Maximum number of requests that can be made in one period
 MAX_REQUESTS_PER_PERIOD = 5000
 
-# Default time to sleep between requests
-REQUEST_DELAY = 1.5
+# Maximum number of requests that can be made in a burst before the rate
+# limiter spreads requests evenly over the period
+MAX_BURST = 10
+
+# Time to sleep before requesting the next page of results, as Google needs a
+# short delay before a next_page_token becomes valid
+PAGE_TOKEN_DELAY = 1.5
+
+# Time to sleep before retrying a failed request
+RETRY_DELAY = 1.5
 
 # Maximum number of times a request can be retried
 MAX_RETRIES = 5
 
+# Default maximum number of requests that the asynchronous scrapers can have in
+# flight at once
+MAX_IN_FLIGHT = 8
+
 # Files that will be written to (names are changed later)
 OUTPUT_DIRECTORY_ROOT = "output/raw/" # The top level output directory
 
+# The ledger of the cells that could not be scraped, in the output directory.
+# See frontier.SQLite3FailureLedger.
+FAILURE_LEDGER_FILENAME = "failures.db"
+
 # Used by scrape_details
 JSON_DIRECTORY = "output/json/" # The directory containing all of the JSONs
 
 DEFAULT_WRITER = "json"
 
+# Default order in which the cells of the subdivision tree are scraped
+DEFAULT_TRAVERSAL = "dfs"
+
+# Default way of dividing a cell that has too many results
+DEFAULT_SPLIT_MODE = "grid"
+
+# Number of children made by an adaptive split
+ADAPTIVE_SPLIT_CELLS = 4
+
+# The smallest fraction of a side that an adaptive split can cut off, so that
+# cells shrink even if all of their results are in a corner
+MIN_SPLIT_FRACTION = 0.25
+
+# Ratio between the radius of a hexagonal cell and the radius of its children
+HEX_CHILD_RATIO = 2
+
+# The ways cells can be divided
+SPLIT_MODES = ["grid", "adaptive", "hex"]
+
+# Default way of deciding whether a cell has to be divided. See
+# saturation.POLICIES.
+DEFAULT_SATURATION_POLICY = "threshold"
+
+# Largest number of results places_nearby returns for one location: three
+# pages of 20
+NEARBY_MAX_PAGES = 3
+NEARBY_RESULT_CAP = 60
+
+# Largest number of results places_radar returns
+RADAR_RESULT_CAP = 200
+
+# Number of cells between the progress reports of subdivision scrapers. The
+# details of every cell are only reported at the DEBUG level.
+PROGRESS_INTERVAL = 100
+
+class SubdivisionID(object):
+    """ The ID of a cell in a subdivision tree, parsed into integers
+
+    A subdivision ID such as "root -> 9 -> 1" names the first child of the
+    ninth child of the region "root". Comparing IDs as strings means splitting
+    and parsing them every time, so the functions below parse every ID once
+    into a tuple of child numbers, which compares and hashes as fast as a
+    tuple of small integers does. A packed integer is not used, as cells can
+    have any number of children.
+
+    IDs are ordered by their child numbers, ignoring the name of the region,
+    so that a cell comes after its ancestors and before its next sibling.
+    str() gives back the ID in its original format, for logs, state files and
+    the command line.
+
+    Attributes:
+        root: A string containing the name of the region the tree divides.
+        path: A tuple of integers of the child numbers leading to the cell.
+    """
+
+    __slots__ = ["root", "path"]
+
+    SEPARATOR = " -> "
+
+    def __init__(self, path = (), root = "root"):
+        """ Initializes SubdivisionID class
+
+        Args:
+            See the attributes.
+        """
+
+        self.root = root
+        self.path = tuple(path)
+
+    @classmethod
+    def parse(cls, subdivision_id):
+        """ Get the SubdivisionID of an ID in either format
+
+        Strings are parsed once and cached, as the same IDs are compared many
+        times while skipping to a target.
+
+        Args:
+            subdivision_id: A string containing a subdivision ID, or a
+                SubdivisionID object, which is returned as it is.
+
+        Returns:
+            A SubdivisionID object.
+
+        Raises:
+            ValueError: A child number is not an integer.
+        """
+
+        if (isinstance(subdivision_id, cls)):
+            return subdivision_id
+        return parse_subdivision_id(subdivision_id)
+
+    @property
+    def depth(self):
+        """ The number of divisions between the region and the cell """
+
+        return len(self.path)
+
+    def child(self, number):
+        """ Get the ID of a child of the cell
+
+        Args:
+            number: An integer of the child number, counting from 1.
+
+        Returns:
+            A SubdivisionID object.
+        """
+
+        return SubdivisionID(self.path + (number,), self.root)
+
+    def parent(self):
+        """ Get the ID of the parent of the cell
+
+        Returns:
+            A SubdivisionID object, or None if the ID names the region.
+        """
+
+        if (len(self.path) == 0):
+            return None
+        return SubdivisionID(self.path[:-1], self.root)
+
+    def is_ancestor_of(self, other):
+        """ See if a cell is divided, directly or not, into another cell
+
+        Args:
+            other: A SubdivisionID object.
+
+        Returns:
+            True if other is a descendant of this cell; False otherwise.
+        """
+
+        depth = len(self.path)
+        return (len(other.path) > depth and other.path[:depth] == self.path)
+
+    def __str__(self):
+        return self.SEPARATOR.join(
+            [self.root] + [str(number) for number in self.path]
+        )
+
+    def __repr__(self):
+        return "SubdivisionID(%r)" % str(self)
+
+    def __hash__(self):
+        return hash((self.root, self.path))
+
+    def __eq__(self, other):
+        if (not isinstance(other, SubdivisionID)):
+            return NotImplemented
+        return (self.root == other.root and self.path == other.path)
+
+    def __ne__(self, other):
+        if (not isinstance(other, SubdivisionID)):
+            return NotImplemented
+        return not (self == other)
+
+    def __lt__(self, other):
+        return self.path < other.path
+
+    def __le__(self, other):
+        return self.path <= other.path
+
+    def __gt__(self, other):
+        return self.path > other.path
+
+    def __ge__(self, other):
+        return self.path >= other.path
+
+# Number of parsed subdivision IDs kept by parse_subdivision_id
+SUBDIVISION_ID_CACHE_SIZE = 4096
+
+@functools.lru_cache(maxsize = SUBDIVISION_ID_CACHE_SIZE)
+def parse_subdivision_id(subdivision_id_string):
+    """ Parse a subdivision ID string. See SubdivisionID.parse. """
+
+    parts = subdivision_id_string.split(SubdivisionID.SEPARATOR)
+    return SubdivisionID([int(number) for number in parts[1:]], parts[0])
+
 def subdivision_gt(lhs, rhs):
     """ See if one subdivision ID comes after another id
 
     Args:
-        lhs, rhs: Subdivision IDs to compare
+        lhs, rhs: Subdivision IDs to compare, as strings or SubdivisionID
+            objects
 
     Returns:
         True if lhs > rhs; False otherwise
     """
 
-    return lhs.split(" -> ")[1:] > rhs.split(" -> ")[1:]
+    # Numbers are compared as integers, as cells can have more than 9 children
+    return SubdivisionID.parse(lhs) > SubdivisionID.parse(rhs)
 
 def subdivision_lt(lhs, rhs):
     return subdivision_gt(rhs, lhs)
 
 def subdivision_geq(lhs, rhs):
-    return (lhs == rhs) or subdivision_gt(lhs, rhs)
+    lhs = SubdivisionID.parse(lhs)
+    rhs = SubdivisionID.parse(rhs)
+    return (lhs == rhs) or (lhs > rhs)
 
 def subdivision_child_of(lhs, rhs):
     """ See if one subdivision is a child of another subdivision
 
     Args:
-        lhs: rhs: Subdivision IDs to compare
+        lhs: rhs: Subdivision IDs to compare, as strings or SubdivisionID
+            objects
 
     Returns:
         True if rhs is a child of lhs; False otherwise
     """
 
-    lhs = lhs.split(" -> ")[1:]
-    rhs = rhs.split(" -> ")[1:]
-    return ((len(rhs) > len(lhs)) and (rhs[:len(lhs)] == lhs))
+    return SubdivisionID.parse(lhs).is_ancestor_of(SubdivisionID.parse(rhs))
 
 def subdivision_same_branch(lhs, rhs):
     return (
@@ -79,20 +288,60 @@ def subdivision_same_branch(lhs, rhs):
         or subdivision_child_of(rhs, lhs)
     )
 
+def hex_cell_key(center, lattice_radius):
+    """ Identify a hexagonal cell by its place on the plane
+
+    Centers are rounded to a centimeter, so the same hexagon reached from
+    different parents has the same key.
+
+    Args:
+        center: An (x, y) tuple of the center of the cell on the plane.
+        lattice_radius: A float of the radius of the hexagon, in meters.
+
+    Returns:
+        A tuple of rounded floats.
+    """
+
+    return (round(center[0], 2), round(center[1], 2), round(lattice_radius, 2))
+
+def get_coordinates(results):
+    """ Get the coordinates of the places in an array of results
+
+    Args:
+        results: An array of results returned by the Google Maps API.
+
+    Returns:
+        A list of (latitude, longitude) tuples. Results without a location are
+        left out.
+    """
+
+    coordinates = []
+    for result in results:
+        try:
+            location = result["geometry"]["location"]
+            coordinates.append((location["lat"], location["lng"]))
+        except (KeyError, TypeError):
+            pass
+
+    return coordinates
+
 # Main scraper class contains functionality for initialization and setting of
 # output directory, logging, and rate limiting
 class Scraper(object):
     """ Main scraper class
 
     Contains functionality for initialization and management of the output
-    directory, logging, and rate limiting. Rate limiting is done by defining
-    periods of a fixed length and a maximum number of requests per period which
-    can not be exceeded; the script sleeps until the next period if the limit
-    is reached.
-
-    The rate_limit method must be called once before every request and handles
-    the rate limiting by tracking the number of requests and time since the
-    current period started.
+    directory, logging, and rate limiting. Rate limiting is done by a rate
+    limiter object provided by the ratelimit library, which can be shared
+    between scrapers. By default, a token bucket allows bursts of up to
+    MAX_BURST requests and otherwise spreads MAX_REQUESTS_PER_PERIOD requests
+    evenly over each period of PERIOD_LENGTH seconds.
+
+    Requests should be made with the request method, which answers them from
+    the response cache if possible and otherwise calls rate_limit before
+    passing them on to gmaps. The rate_limit method must be called once before
+    every request that is not made through request. Output is still separated
+    into periods of PERIOD_LENGTH seconds, each with its own period directory.
 
     Attributes:
         gmaps: A googlemaps.Client object.
@@ -101,6 +350,15 @@ class Scraper(object):
             initialized by the initialize_writer method. Each writer has a dump
             function that dumps data, which is the first and only required
             argument, to a file, database, etc.
+        rate_limiter: A rate limiter object provided by the ratelimit library.
+        response_cache: A response cache object provided by the cache library,
+            or None if responses are not cached.
+        detail_memo: A detail memo object provided by the cache library, or
+            None if place details are not memoized.
+        metrics: A telemetry.Metrics object that requests, retries, errors,
+            cells, throttling and dumps are recorded in.
+        events: An eventlog.EventLog object that reports what the scraper is
+            doing, and writes it to events.jsonl in the output directory.
         output_directory_name: A string containing the base name of the root
             directory containing all output generated by the scraper.
         output_directory: A string containing the name of the subdirectory of
@@ -109,18 +367,23 @@ class Scraper(object):
             output_directory containing all coutput generated by the scraper in
             the current scraping period.
         start_time: A float of the Unix time when the scraper was initialized.
-        request_delay: A float of the time to sleep between requests
         request_period_start_time: A float of the Unix time when the current
             period was started.
         traversed: An integer indicating how many pages were traversed since the
             scraper started.
-        traversed_this_period: An integer indicating how many pages were
-            traversed since the current period was started.
+        throttled_time: A float of the total number of seconds this scraper was
+            held up by the rate limiter.
+        rate_limit_lock: A threading.Lock object that allows rate_limit to be
+            called from multiple threads.
     """
 
     def __init__(self, gmaps, output_directory_name = "Untitled_Scrape",
                  writer = DEFAULT_WRITER, flush_duplicates = True,
-                 flush_output = False, *dummy_args, **dummy_kwargs):
+                 flush_output = False, rate_limiter = None,
+                 response_cache = None, detail_memo = None, metrics = None,
+                 log_level = eventlog.DEFAULT_LEVEL,
+                 log_file_level = eventlog.DEFAULT_LEVEL, *dummy_args,
+                 **dummy_kwargs):
         """ Initializes Scraper class
 
         Performs necessary initialization before the scraper starts running,
@@ -132,15 +395,41 @@ class Scraper(object):
             output_directory_name: A directory which is a subdivision of
                 OUTPUT_DIRECTORY_ROOT where scraped data and logs will be
                 stored.
-            writer: A string containing information about which writer to use.
+            writer: A string containing information about which writer to use,
+                or a writer object to be used as-is, such as one shared with
+                other scrapers.
             flush_duplicates: A boolean describing whether or not the writer
                 should be flushed when initialized.
             flush_output: A boolean describing whether or not the output
                 directory and/or databases should be flushed when the scraper
                 initializes.
+            rate_limiter: An optional rate limiter object provided by the
+                ratelimit library. Scrapers given the same rate limiter share
+                one quota. By default, each scraper gets its own
+                ratelimit.TokenBucket.
+            response_cache: An optional response cache object provided by the
+                cache library, such as cache.SQLite3ResponseCache. Requests
+                that are answered from the cache do not count against the
+                quota.
+            detail_memo: An optional detail memo object provided by the cache
+                library, such as cache.DetailMemo. fetch_place looks places up
+                in it before requesting their details.
+            metrics: An optional telemetry.Metrics object, which can be
+                shared between scrapers. By default, each scraper gets its
+                own.
+            log_level: An integer of the lowest eventlog level that is
+                printed. The details of every cell and request are reported
+                at eventlog.DEBUG.
+            log_file_level: An integer of the lowest eventlog level that is
+                written to events.jsonl.
         """
 
         self.gmaps = gmaps
+        self.response_cache = response_cache
+        self.detail_memo = detail_memo
+        if (metrics is None):
+            metrics = telemetry.Metrics()
+        self.metrics = metrics
         self.gsm = staticmaps.Constructor()
 
         self.writer_type = writer
@@ -152,17 +441,30 @@ class Scraper(object):
             OUTPUT_DIRECTORY_ROOT,
             self.output_directory_name.replace("/", "_"),
         )
+        self.events = eventlog.EventLog(
+            name = self.output_directory_name,
+            path = "%s/%s" % (self.output_directory, eventlog.EVENTS_FILENAME),
+            level = log_file_level,
+            console_level = log_level
+        )
         if (os.path.isdir(self.output_directory)) and (self.flush_output):
-            print("Removing existing directory %s" % self.output_directory)
+            self.events.info("flush_output", "Removing existing directory %s",
+                             self.output_directory)
             shutil.rmtree(self.output_directory)
         self.period_directory = ""
 
         self.start_time = time.time()
 
-        self.request_delay = REQUEST_DELAY
         self.request_period_start_time = time.time()
         self.traversed = 0
-        self.traversed_this_period = 0
+        self.throttled_time = 0.0
+        self.rate_limit_lock = threading.Lock()
+
+        if (rate_limiter is None):
+            rate_limiter = ratelimit.TokenBucket.from_period(
+                MAX_REQUESTS_PER_PERIOD, PERIOD_LENGTH, MAX_BURST
+            )
+        self.rate_limiter = rate_limiter
 
         self.initialize_output_directory()
 
@@ -173,23 +475,31 @@ class Scraper(object):
         gms_io library. Each class should provide a dump function that takes one
         argument, which is the data to be dumped. Each class has different
         initialization arguments; see the comments in gms_io.py for more info.
+
+        If a writer object was given instead of a string, it is used as-is and
+        its duplicate checker is left untouched.
         """
 
+        if (not isinstance(self.writer_type, str)):
+            self.writer = self.writer_type
+            return
+
         # Initialize writer
         if (self.writer_type == "pickle"):
             self.writer = gms_io.PickleWriter(("%s/data.p"
                                                % self.period_directory))
-            print("Using gms_io.PickleWriter")
+            self.events.info("writer", "Using gms_io.PickleWriter")
         elif (self.writer_type == "mongo"):
             self.writer = gms_io.MongoWriter(self.output_directory_name)
             if (self.flush_output):
                 self.writer.flush()
-            print("Using gms_io.MongoWriter")
+            self.events.info("writer", "Using gms_io.MongoWriter")
         else:
             self.writer = gms_io.JSONWriter(
                 ("%s/data.json" % self.output_directory)
             )
-            print("Using gms_io.JSONWriter")
+            self.events.info("writer", "Using gms_io.JSONWriter")
+        self.writer.events = self.events
 
         # Initialize duplicate checker
         try:
@@ -197,8 +507,12 @@ class Scraper(object):
                 set_name = time.strftime("%Y-%m-%dT%H:%M:%S")
             )
         except Exception as err:
-            print("Could not instance RedisDuplicateChecker object: %s" % err)
-            print("Using SQLite3DuplicateChecker instead")
+            self.events.warning(
+                "duplicate_checker",
+                "Could not instance RedisDuplicateChecker object: %s", err
+            )
+            self.events.info("duplicate_checker",
+                             "Using SQLite3DuplicateChecker instead")
             self.writer.duplicate_checker = gms_io.SQLite3DuplicateChecker(
                 db_path = "%s/seen_places.db" % self.output_directory
             )
@@ -225,7 +539,8 @@ class Scraper(object):
 
         self.initialize_writer()
 
-        print("Initialized new period directory %s/" % self.period_directory)
+        self.events.info("period", "Initialized new period directory %s/",
+                         self.period_directory)
 
         # Initialize logs
         logs = {
@@ -243,49 +558,243 @@ class Scraper(object):
         """ Write a timestamped message to a log
 
         Timestamps are floating points that indicate the amount of time since
-        the current period was started.
+        the current period was started. The line is written by the event log's
+        LogWriter, which keeps the log open and writes lines in batches.
 
         Args:
             filename: A string containing the name of the log to be written to.
             message: A string containing the message to be logged.
         """
-        with open("%s/%s" % (self.output_directory, filename), "a") as f:
-            f.write("%f,%s\n" % (time.time() - self.start_time, message))
+
+        self.events.writer.write(
+            "%s/%s" % (self.output_directory, filename),
+            "%f,%s\n" % (time.time() - self.start_time, message)
+        )
+
+    def request(self, endpoint, **params):
+        """ Make a request to the Google Maps API
+
+        Returns the cached response if there is one. Otherwise, waits for the
+        rate limiter, calls the googlemaps.Client method and caches its
+        response.
+
+        Args:
+            endpoint: A string containing the name of the googlemaps.Client
+                method, such as "places_nearby" or "place".
+            params: Keyword arguments passed to the method.
+
+        Returns:
+            The response returned by the method.
+        """
+
+        if (self.response_cache is not None):
+            response = self.response_cache.get(endpoint, params)
+            if (response is not None):
+                self.metrics.inc("gmaps_requests_total", endpoint = endpoint,
+                                 outcome = "cached")
+                return response
+
+        self.rate_limit() ######################################################
+
+        response = self.send_request(endpoint, **params)
+        if (self.response_cache is not None):
+            self.response_cache.put(endpoint, params, response)
+        return response
+
+    def send_request(self, endpoint, **params):
+        """ Call a googlemaps.Client method and record its outcome
+
+        The time the call takes, whether it failed and with which exception,
+        and the number of results it returned are added to self.metrics.
+
+        Args:
+            See request.
+
+        Returns:
+            The response returned by the method.
+        """
+
+        start_time = time.perf_counter()
+        try:
+            response = getattr(self.gmaps, endpoint)(**params)
+        except Exception as err:
+            self.metrics.inc("gmaps_requests_total", endpoint = endpoint,
+                             outcome = "error")
+            self.metrics.inc("gmaps_errors_total", endpoint = endpoint,
+                             error = type(err).__name__)
+            raise
+        finally:
+            self.metrics.observe("gmaps_request_seconds",
+                                 time.perf_counter() - start_time,
+                                 endpoint = endpoint)
+
+        self.metrics.inc("gmaps_requests_total", endpoint = endpoint,
+                         outcome = "ok")
+        if (isinstance(response, dict) and "results" in response):
+            self.metrics.observe("gmaps_results_per_request",
+                                 len(response["results"]),
+                                 endpoint = endpoint)
+        return response
+
+    def dump_results(self, results):
+        """ Dump results with self.writer and record how long it took
+
+        Args:
+            results: An array of dictionaries.
+        """
+
+        with self.metrics.timer("gmaps_dump_seconds"):
+            self.writer.dump(results)
+        self.metrics.inc("gmaps_dumped_records_total", len(results))
+
+    def is_cached(self, endpoint, **params):
+        """ Determine whether a request would be answered from the cache
+
+        Args:
+            See request.
+
+        Returns:
+            True if the response is cached; False otherwise.
+        """
+
+        return (self.response_cache is not None
+                and self.response_cache.contains(endpoint, params))
+
+    def fetch_place(self, place_id):
+        """ Get the details of a place, retrying on errors
+
+        Details found in self.detail_memo are returned without a request.
+        Otherwise, a maximum of MAX_RETRIES attempts are made before the
+        function gives up and logs the place_id to termination_log.csv. This is
+        safe to call from multiple threads.
+
+        Args:
+            place_id: A string containing the place_id.
+
+        Returns:
+            A dictionary containing the details of the place, or None if
+            MAX_RETRIES attempts were made.
+        """
+
+        if (self.detail_memo is not None):
+            result = self.detail_memo.get(place_id)
+            if (result is not None):
+                return result
+
+        for attempt in range(MAX_RETRIES):
+            try:
+                result = self.request("place", place_id = place_id)["result"]
+                if (self.detail_memo is not None):
+                    self.detail_memo.put(place_id, result)
+                return result
+            except Exception as err:
+                self.events.warning("request_error", "Error: %s", err,
+                                    endpoint = "place", place_id = place_id)
+                self.log("error_log.csv", err)
+
+                time.sleep(RETRY_DELAY)
+            if (attempt < MAX_RETRIES - 1):
+                self.events.info("retry", "Retrying (attempt #%d)",
+                                 attempt + 1, endpoint = "place")
+                self.metrics.inc("gmaps_retries_total", endpoint = "place")
+
+        self.events.error("retries_exhausted",
+                          "Max retries exceeded; skipping this place_id.",
+                          place_id = place_id)
+        self.metrics.inc("gmaps_retries_exhausted_total", kind = "place")
+        self.log("termination_log.csv",
+                 "Maximum number of retries exceeded. place_id: %s" % place_id)
+        return None
+
+    def fetch_places(self, place_ids, max_in_flight = 1):
+        """ Fetch the details of places, up to max_in_flight at once
+
+        Args:
+            place_ids: An iterable of place_id strings.
+            max_in_flight: An integer describing the maximum number of places
+                that are fetched at once, on a pool of threads sharing the
+                rate limiter.
+
+        Yields:
+            (place_id, result) tuples as the places are fetched, where result
+            is the value returned by fetch_place. If more than one place is
+            fetched at once, they are yielded in the order they finish.
+        """
+
+        if (max_in_flight <= 1):
+            for place_id in place_ids:
+                yield (place_id, self.fetch_place(place_id))
+            return
+
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers = max_in_flight
+        )
+        futures = {}
+        try:
+            for place_id in place_ids:
+                # Only submit a place once a slot is free, so that the list of
+                # pending place_ids is never copied into the pool
+                if (len(futures) >= max_in_flight):
+                    done, not_done = concurrent.futures.wait(
+                        futures,
+                        return_when = concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        yield (futures.pop(future), future.result())
+                futures[executor.submit(self.fetch_place, place_id)] = place_id
+
+            for future in concurrent.futures.as_completed(list(futures)):
+                yield (futures.pop(future), future.result())
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown()
 
     def rate_limit(self):
         """ Self-imposed rate limiting functionality
 
         THIS MUST BE RUN ONCE BEFORE EVERY REQUEST!!!!
 
-        Limits the number of requests made by holding up the script if the
-        number of requests made this period exceeds the number defined by the
-        MAX_REQUESTS_PER_PERIOD global variable.
+        Limits the number of requests made by holding up the script until the
+        rate limiter allows another request, and starts a new period directory
+        when the current period is over.
+
+        Returns:
+            A float of the number of seconds the script was held up for.
+        """
+
+        wait = self.rate_limiter.acquire()
+        self.count_request(wait)
+        return wait
+
+    def count_request(self, wait):
+        """ Count a request allowed by the rate limiter
+
+        Starts a new period directory when the current period is over.
+
+        Args:
+            wait: A float of the number of seconds the request was held up by
+                the rate limiter.
         """
-        current_period_length = time.time() - self.request_period_start_time
 
-        while ((current_period_length < PERIOD_LENGTH)
-               and (self.traversed_this_period >= MAX_REQUESTS_PER_PERIOD)):
-            print("Max requests per period reached (%d). %f Seconds until next "
-                   "period." % (
-                MAX_REQUESTS_PER_PERIOD, PERIOD_LENGTH - current_period_length))
-            time.sleep(10)
+        with self.rate_limit_lock:
 
             # End of period
-            if ((time.time() - self.request_period_start_time) >= PERIOD_LENGTH):
+            if ((time.time() - self.request_period_start_time)
+                >= PERIOD_LENGTH):
 
                 # Reset variables
                 self.request_period_start_time = time.time()
-                self.traversed_this_period = 0
 
                 self.log("request_log.csv", self.traversed)
 
                 # Create a new output directory
                 self.initialize_output_directory()
-            current_period_length = time.time() - self.request_period_start_time
 
-        # Increment the counters
-        self.traversed += 1
-        self.traversed_this_period += 1
+            # Increment the counters
+            self.traversed += 1
+            self.throttled_time += wait
+        self.metrics.inc("gmaps_throttled_seconds_total", wait)
 
 class DetailScraper(Scraper):
     """ Subclass of Scraper that specifically scrapes place details
@@ -293,116 +802,185 @@ class DetailScraper(Scraper):
     Attributes:
         dump_interval: An integer representing the number of place_ids traversed
             between each dump.
+        start_at: The index of the place_ids array to start scraping at.
+        max_in_flight: An integer describing the maximum number of place_ids
+            that are fetched at once.
+        checkpoint: A checkpoint ledger object provided by the gms_io library,
+            or None if progress is not checkpointed.
     """
 
     def __init__(self, gmaps, output_directory_name, dump_interval = 50,
                  request_delay = 0.5, start_at = 0, writer = DEFAULT_WRITER,
-                 *dummy_args, **dummy_kwargs):
+                 rate_limiter = None, response_cache = None, max_in_flight = 1,
+                 checkpoint = None, metrics = None,
+                 log_level = eventlog.DEFAULT_LEVEL,
+                 log_file_level = eventlog.DEFAULT_LEVEL, *dummy_args,
+                 **dummy_kwargs):
         """ Initializes DetailScraper class
 
         Args:
             See Scraper.__init__.
             dump_interval: An integer representing the number of place_ids
                 traversed between each dump.
-            request_delay: An integer that overrides REQUEST_DELAY.
+            request_delay: Deprecated and ignored. Requests are paced by the
+                rate limiter instead; see Scraper.__init__.
             start_at: The index of the place_ids array to start scraping at.
+            max_in_flight: An integer describing the maximum number of
+                place_ids that are fetched at once, on a pool of threads
+                sharing the rate limiter. Results are still dumped in batches
+                of dump_interval by the calling thread.
+            checkpoint: An optional checkpoint ledger object provided by the
+                gms_io library, such as gms_io.SQLite3CheckpointLedger. Fetched
+                results are recorded in it, and a scrape restarted with the
+                same ledger skips the places it has already fetched. This is
+                more reliable than start_at, which depends on the input not
+                changing.
+            metrics, log_level, log_file_level: See Scraper.__init__.
         """
 
-        Scraper.__init__(self, gmaps, output_directory_name, writer)
+        Scraper.__init__(self, gmaps, output_directory_name, writer,
+                         rate_limiter = rate_limiter,
+                         response_cache = response_cache, metrics = metrics,
+                         log_level = log_level,
+                         log_file_level = log_file_level)
         self.dump_interval = dump_interval
-        self.request_delay = request_delay
         self.start_at = start_at
+        self.max_in_flight = max_in_flight
+        self.checkpoint = checkpoint
+
+    def skip_checkpointed(self, place_ids):
+        """ Leave out the place_ids that are recorded in self.checkpoint
+
+        Args:
+            place_ids: An iterable of place_id strings.
+
+        Yields:
+            The place_ids that have not been fetched yet, in order.
+        """
+
+        skipped = 0
+        for place_id in place_ids:
+            if (self.checkpoint.contains(place_id)):
+                skipped += 1
+            else:
+                yield place_id
+        self.events.info("checkpoint",
+                         "Skipped %d place_ids that were already fetched",
+                         skipped)
+
+    def dump_results(self, results, place_ids = None):
+        """ Dump results and mark them as dumped in self.checkpoint
+
+        Args:
+            results: An array of dictionaries of details.
+            place_ids: An optional list of the place_ids that were requested
+                for each result, which the results are recorded under in
+                self.checkpoint. The API can answer with a different,
+                canonical place_id. Defaults to the place_ids of the results.
+        """
+
+        Scraper.dump_results(self, results)
+        if (self.checkpoint is not None):
+            if (place_ids is None):
+                place_ids = [result["place_id"] for result in results]
+            self.checkpoint.mark_dumped(place_ids)
 
     def scrape(self, target):
         """ The main function of DetailScraper
 
         Scrapes a list of place_ids using the Google Maps API's place details
-        API.
+        API. place_ids are read lazily, so fetching starts immediately and
+        memory use does not depend on the number of place_ids.
 
         Args:
             target: One of the following:
-                * A string containing the path to a JSON file which has been
-                  created by process_output.py.
+                * A string containing the path to a JSON array, such as one
+                  written by gms_io.JSONWriter or created by
+                  process_pickles.py.
+                * A string containing the path to a newline-delimited JSON
+                  file or to a pickle file, or a string of the form
+                  "mongo:COLLECTION_NAME". See gms_io.iter_place_ids.
                 * A string containing a single place_id
-                * A list or tuple containing place_ids
+                * Any other iterable of place_ids or places, such as a list or
+                  a pymongo.cursor.Cursor
         """
 
-        place_ids = []
+        # The place_id requested for each result, which the checkpoint uses
         results = []
+        requested_place_ids = []
         counter = 1
-
-        if (type(target) is str):
-            # File
-            if (os.path.isfile(target)) and (target[-5:] == ".json"):
-                ''' Old method of parsing the file used too much memory
-                file_object = open(target)
-                for datum in json.load(file_object):
-                    place_ids.append(datum["place_id"])
-                file_object.close()
-                '''
-                place_ids = subprocess.check_output(
-                    ["grep", "-Po", "(?<=\"place_id\":).*?(?=\",)", target],
-                    universal_newlines = True
-                ).replace(" ", "").replace("\"", "").rstrip("\n").split("\n")
-                print("Added %d place_ids from %s" % (len(place_ids), target))
-
-            # Single place_id
-            else:
-                place_ids.append(target)
-
-        # Array of place_ids
-        elif (type(target) is list) or (type(target) is tuple):
-            if (type(target[0]) is str):
-                place_ids += target
-
-        if (len(place_ids) == 0):
-            raise Exception("Invalid target supplied")
+        num_place_ids = None
+
+        # Single place_id
+        if (
+            isinstance(target, str)
+            and not os.path.isfile(target)
+            and not target.startswith("mongo:")
+        ):
+            place_ids = [target]
+        else:
+            if (isinstance(target, (list, tuple))):
+                num_place_ids = len(target)
+            place_ids = gms_io.iter_place_ids(target)
 
         if (self.start_at != 0):
-            print("Skipping first %d place_ids" % self.start_at)
-            place_ids = place_ids[self.start_at:]
-
-        num_place_ids = len(place_ids)
-        for place_id in place_ids:
-
-            self.rate_limit() ##################################################
-
-            # Dump results periodically
-            if ((counter % self.dump_interval) == 0):
-                print("Dumping last %d results" % self.dump_interval)
-                self.writer.dump(results)
-                results = []
-
-            print("Scraping place_id %s (%d/%d - %0.3f%%)" % (
-                place_id, counter, num_place_ids,
-                float(counter)/num_place_ids*100,
-            ))
-
-            for attempt in range(MAX_RETRIES):
-                try:
-                    results.append(self.gmaps.place(place_id)["result"])
-                    time.sleep(self.request_delay)
-                    break
-                except Exception as err:
-                    print("Error: %s" % err)
-                    self.log("error_log.csv", err)
-
-                    time.sleep(self.request_delay)
-                    pass
-                print("Retrying (attempt #%d)" % (attempt + 1))
-
-            if (attempt == MAX_RETRIES - 1):
-                print("Max retries exceeded; skipping this place_id.")
-                self.log(
-                    "termination_log.csv",
-                    ("Maximum number of retries exceeded. place_id: %s"
-                     % place_id)
+            self.events.info("start_at", "Skipping first %d place_ids",
+                             self.start_at)
+            place_ids = itertools.islice(place_ids, self.start_at, None)
+            if (num_place_ids is not None):
+                num_place_ids = max(0, num_place_ids - self.start_at)
+
+        if (self.checkpoint is not None):
+            # Save the results that were fetched before a crash
+            replayed = self.checkpoint.undumped_results()
+            if (len(replayed) > 0):
+                self.events.info(
+                    "checkpoint",
+                    "Dumping %d results fetched by a previous run",
+                    len(replayed)
                 )
+                self.dump_results([entry[1] for entry in replayed],
+                                  [entry[0] for entry in replayed])
+            place_ids = self.skip_checkpointed(place_ids)
 
-            counter += 1
+        try:
+            for place_id, result in self.fetch_places(place_ids,
+                                                      self.max_in_flight):
+                if (result is not None):
+                    results.append(result)
+                    requested_place_ids.append(place_id)
+                    if (self.checkpoint is not None):
+                        self.checkpoint.record(place_id, result)
+
+                if (num_place_ids is None):
+                    self.events.debug("place", "Scraped place_id %s (%d)",
+                                      place_id, counter)
+                else:
+                    self.events.debug(
+                        "place", "Scraped place_id %s (%d/%d - %0.3f%%)",
+                        place_id, counter, num_place_ids,
+                        float(counter)/num_place_ids*100
+                    )
+
+                # Dump results periodically
+                if ((counter % self.dump_interval) == 0):
+                    self.events.info("dump", "Dumping last %d results",
+                                     len(results), scraped = counter)
+                    self.dump_results(results, requested_place_ids)
+                    results = []
+                    requested_place_ids = []
+
+                counter += 1
+        finally:
+            # Keep the results of an interrupted scrape
+            if (self.checkpoint is not None):
+                self.checkpoint.commit()
+
+        if (counter == 1 and self.checkpoint is None):
+            raise Exception("Invalid target supplied")
 
         # Dump remaining results
-        self.writer.dump(results)
+        self.dump_results(results, requested_place_ids)
 
 class SubdivisionScraper(Scraper):
     """ Subclass of Scraper specifically for building scrapers that use the
@@ -430,11 +1008,19 @@ class SubdivisionScraper(Scraper):
                     current scrape area in the subdivision tree.
             scrape must return an array containing all of the results found in
             that scrape area.
+            scrape may return a saturation.ScrapeResults object, which also
+            tells the saturation policy what the API said about the results.
         threshold = Undefined by default. A digit that describes the minimum
             number of results that the main scraping function needs to return,
             to trigger a recursion. The default is a little less than the
             maximum number of results that can be expected to be returned,
-            defined by the Google Maps API documentation.
+            defined by the Google Maps API documentation. This is used by
+            saturation.ThresholdPolicy.
+        SATURATION_POLICY: A class attribute naming the saturation policy
+            used by default by scrapers of the class. See
+            saturation.POLICIES.
+        saturation_policy: A saturation policy object provided by the
+            saturation library, which decides whether a cell has to be divided.
         gsm: a staticmaps.Constructor object used for generating Google Static
             Maps API links.
         min_radius: The smallest radius of a subdivision before that branch is
@@ -443,9 +1029,50 @@ class SubdivisionScraper(Scraper):
             subdivision ID should be constantly dumped to a file.
         state_file: The file that, if dump_state is True, the state will be
             dumped to.
+        journal: A frontier.CellJournal object that cells are recorded in, so
+            that a stopped scrape can be resumed exactly, or None.
+        SCRAPE_TYPE: A class attribute naming the kind of scraper, as given
+            to --type, with which failed cells are recorded so that they can
+            be scraped again by the same kind of scraper.
+        failures: A frontier.SQLite3FailureLedger object that cells are
+            recorded in when their requests keep failing, or None.
+        scraping_cells: A dictionary mapping the (query, subdivision ID) pairs
+            of the cells being scraped to their cell dictionaries, so that a
+            cell that fails can be recorded with its bounds.
+        traversal: A string naming the order in which scrape_subdivisions
+            visits cells. See frontier.TRAVERSALS.
+        split_mode: A string naming the way cells are divided. See
+            make_children.
+        polygon: An optional geo.Polygon object that the scrape is clipped
+            to. Cells entirely outside of it are skipped and results outside
+            of it are not saved.
+        results_returned: An integer indicating how many results were
+            returned by self.scrape, counting places returned by more than one
+            cell every time.
+        unique_places: A set of the place_ids of the places returned by
+            self.scrape.
+        hex_cells_made: A dictionary mapping each query to a set of keys of
+            the hexagonal children that were made for it, so that no hexagon
+            is scraped twice. See make_hex_lattice.
+        cells_visited: An integer indicating how many cells were begun,
+            whether they were scraped, divided or terminated.
+        cells_terminated: An integer indicating how many cells were
+            terminated because their radius fell below min_radius.
+        max_depth: An integer describing the depth of the deepest cell
+            visited, where the top-level cells have a depth of 1.
+        results_lock: A threading.Lock object guarding results_returned,
+            unique_places and the cell counters.
+        page_token_delay: A float describing the number of seconds waited
+            before a next_page_token is used. Defaults to PAGE_TOKEN_DELAY.
     """
 
+    SATURATION_POLICY = DEFAULT_SATURATION_POLICY
+    SCRAPE_TYPE = None
+
     def __init__(self, min_radius = MIN_RADIUS_METERS, dump_state = False,
+                 state_file = None, traversal = DEFAULT_TRAVERSAL,
+                 split_mode = DEFAULT_SPLIT_MODE, polygon = None,
+                 saturation_policy = None, journal = None, failures = None,
                  *dummy_args, **dummy_kwargs):
         """ Initializes SubdivisionScraper
 
@@ -454,82 +1081,178 @@ class SubdivisionScraper(Scraper):
                 is terminated.
             dump_state: A bool that describes whether or not the current
                 subdivision ID should be constantly dumped to a file.
+            state_file: An optional string containing the path of the state
+                file. By default, a file named after the current time and PID
+                is created in the output directory.
+            traversal: A string naming the order in which cells are visited:
+                "dfs" (depth first, the default), "bfs" (breadth first) or
+                "density" (highest expected density of places first).
+            split_mode: A string naming the way cells are divided: "grid" (a
+                3x3 grid, the default), "adaptive" (split at the median of
+                the results) or "hex" (a hexagonal lattice of circles).
+            polygon: An optional geo.Polygon object that the scrape is clipped
+                to.
+            saturation_policy: An optional saturation policy object provided
+                by the saturation library, or the name of one: "threshold"
+                (divide cells with at least self.threshold results) or
+                "signals" (divide cells that the API's result cap and paging
+                show to be incomplete). Defaults to self.SATURATION_POLICY.
+            journal: An optional frontier.CellJournal object. When one is
+                given, scrape_subdivisions records the cells it starts and
+                finishes in it, and resumes a query found in it from its
+                pending cells instead of starting over. The journal can be
+                shared by scrapers of different queries.
+            failures: An optional frontier.SQLite3FailureLedger object. By
+                default, cells whose requests keep failing are recorded in
+                FAILURE_LEDGER_FILENAME in the output directory.
         """
 
+        if (traversal not in frontier.TRAVERSALS):
+            raise ValueError("Unknown traversal %s; expected one of %s" % (
+                traversal, ", ".join(sorted(frontier.TRAVERSALS))
+            ))
+
         self.min_radius = min_radius
         self.dump_state = dump_state
-        self.state_file = "%s/%s_PID%d_state.json" % (
-            self.output_directory,
-            time.strftime("%Y-%m-%dT%H:%M:%S"),
-            os.getpid()
-        )
-
-    def scrape_subdivisions(self, min_latitude, max_latitude, min_longitude,
-                            max_longitude, grid_width, query = "",
-                            subdivision_parent_id = "root",
-                            target_subdivision_id = "", resume = False):
-        """ Recursive function that creates subdivisions and invokes the scraper
-
-        This is the main function that manages the creation of subdivisions and
-        invokes the scraper to scrape places from those subdivisions.
-
-        Subdivisions are congruent rectangular areas which are similar to the
-        region defined in the function's arguments. All subdivisions have the
-        same width and height and are arranged in a square grid.
-
-        For example, a 3x3 grid of subdivisions with min_lat = 0, min_long = 0,
-        max_lat = 3, max_long = 3 would look like this:
+        self.journal = journal
+        if (failures is None):
+            failures = frontier.SQLite3FailureLedger(
+                "%s/%s" % (self.output_directory, FAILURE_LEDGER_FILENAME)
+            )
+        self.failures = failures
+        self.scraping_cells = {}
+        self.traversal = traversal
+        if (split_mode not in SPLIT_MODES):
+            raise ValueError("Unknown split mode %s; expected one of %s" % (
+                split_mode, ", ".join(SPLIT_MODES)
+            ))
+        self.split_mode = split_mode
+        self.polygon = polygon
+
+        if (saturation_policy is None):
+            saturation_policy = self.SATURATION_POLICY
+        if (isinstance(saturation_policy, str)):
+            if (saturation_policy not in saturation.POLICIES):
+                raise ValueError(
+                    "Unknown saturation policy %s; expected one of %s" % (
+                        saturation_policy,
+                        ", ".join(sorted(saturation.POLICIES))
+                    )
+                )
+            saturation_policy = saturation.POLICIES[saturation_policy]()
+        self.saturation_policy = saturation_policy
+
+        self.hex_cells_made = {}
+        self.results_lock = threading.Lock()
+        self.reset_counters()
+        self.page_token_delay = PAGE_TOKEN_DELAY
+        if (state_file is None):
+            state_file = "%s/%s_PID%d_state.json" % (
+                self.output_directory,
+                time.strftime("%Y-%m-%dT%H:%M:%S"),
+                os.getpid()
+            )
+        self.state_file = state_file
 
-            increasing latitude
-            ^
-            3 +---+---+---+
-              | 7 | 8 | 9 |
-            2 +---+---+---+
-              | 4 | 5 | 6 |
-            1 +---+---+---+
-              | 1 | 2 | 3 |
-            0 +---+---+---+
-              0   1   2   3 > increasing longitude
+    def reset_counters(self):
+        """ Reset the redundancy and cell counters """
 
-        Where the number inside each box corresponds to the order in which that
-        cell is processed.
+        with self.results_lock:
+            self.results_returned = 0
+            self.unique_places = set()
+            self.cells_visited = 0
+            self.cells_terminated = 0
+            self.max_depth = 0
 
-        To calculate the scraping area, which is circular:
-            We use the Pythagorean theorem to find the diameter of the smallest
-                circle containing all points of the scraping area and divide
-                that by 2 to get the radius.
-            We get the average longitude and latitude to get the center.
+    def subdivision_action(self, subdivision_id_string, target_subdivision_id,
+                           resume):
+        """ Decide how a cell should be handled when skipping to a target
 
-        The scrape function is called on each cell and each cell is further
-        subdivided into another square grid of congruent cells if the threshold,
-        as defined in the initialization, is returned. To do this, the function
-        recurses with the cell's region becoming the new grid's region.
+        Args:
+            subdivision_id_string: A string containing the subdivision ID of
+                the cell being considered.
+            target_subdivision_id: A string or SubdivisionID object containing
+                the subdivision ID of the cell to be skipped to, or None.
+            resume: A bool describing whether or not scraping continues after
+                the target subdivision has been scraped.
 
-        Each cell is assigned a string detailing that cell's ancestry. For
-        example, the bottom left subdivision of the top right subdivision of the
-        root cell has the ID "root -> 9 -> 1".
+        Returns:
+            One of the following strings:
+                "scrape": The cell should be scraped.
+                "divide": The cell should not be scraped, but its children
+                    should be considered.
+                "skip": The cell and its children should be skipped.
+                "stop": The cell and all of its remaining siblings should be
+                    skipped.
+        """
 
-        To re-scrape a subdivision, all arguments except subdivision_parent_id
-        must be supplied.
+        # Both IDs are parsed once, rather than by every comparison
+        subdivision_id = SubdivisionID.parse(subdivision_id_string)
+        if (target_subdivision_id is not None):
+            target_subdivision_id = SubdivisionID.parse(target_subdivision_id)
+
+            if (subdivision_id == target_subdivision_id):
+                self.events.debug("resume", "Skipped to %s",
+                                  subdivision_id_string)
+
+            # Branch out
+            elif (subdivision_id.is_ancestor_of(target_subdivision_id)):
+                self.events.debug("resume", "Dividing %s",
+                                  subdivision_id_string)
+
+            # Next branch
+            elif (subdivision_id < target_subdivision_id):
+                self.events.debug("resume", "Skipping %s",
+                                  subdivision_id_string)
+                return "skip"
+
+            # If not resuming: stop when the branch changes
+            elif (
+                (not resume)
+                and not (subdivision_same_branch(subdivision_id,
+                                                 target_subdivision_id))
+            ):
+                return "stop"
+
+        # We only scrape this subdivision if the following conditions are true
+        if (
+            target_subdivision_id is None
+            or target_subdivision_id.is_ancestor_of(subdivision_id)
+            or (subdivision_id > target_subdivision_id)
+        ):
+            return "scrape"
+
+        return "divide"
+
+    def make_cells(self, min_latitude, max_latitude, min_longitude,
+                   max_longitude, grid_width, subdivision_parent_id = "root"):
+        """ Divide a region into a square grid of cells
+
+        See scrape_subdivisions for a description of the grid and the order in
+        which its cells are numbered. In "hex" mode, the region is covered by
+        a hexagonal lattice of cells instead; see make_hex_cells.
 
         Args:
             min_latitude, max_latitude, min_longitude, max_longitude: Floating
-                points describing the bounds of the scraping region
+                points describing the bounds of the region.
             grid_width: An integer describing the number of rows and columns to
-                subdivide the scraping region into. The total number of cells is
-                grid_width^2.
-            query: A string containing the place_type or keyword to be scraped
-            subdivision_parent_id: A string containing the subdivision ID of the
-                parent region. If there is no parent region, the ID is "root".
-                This variable is managed by the function and should not be
-                modified externally.
-            target_subdivision_id: An optional string containing the subdivision
-                ID of the cell to be skipped to.
-            resume: A bool descibing whether or not to continue scraping after
-                the target subdivsion has been scraped. By default, scraping
-                terminates after the target_subdivision_id is scraped.
-        """
+                divide the region into.
+            subdivision_parent_id: A string containing the subdivision ID of
+                the region.
 
+        Returns:
+            A list of dictionaries, in processing order, each describing a cell
+            with the keys "id", "min_latitude", "max_latitude",
+            "min_longitude", "max_longitude", "center_latitude",
+            "center_longitude" and "radius_meters".
+        """
+
+        if (self.split_mode == "hex"):
+            return self.make_hex_cells(min_latitude, max_latitude,
+                                       min_longitude, max_longitude,
+                                       grid_width, subdivision_parent_id)
+
+        cells = []
         subdivision_id = 0
         subdivision_width = (max_latitude - min_latitude)/grid_width
         subdivision_height = (max_longitude - min_longitude)/grid_width
@@ -538,189 +1261,1087 @@ class SubdivisionScraper(Scraper):
             for column in range(grid_width):
                 # The subdivision ID is used to track the current subdivision's
                 # ancestry. To find exactly where on a grid this subdivision
-                # lies, use the above table.
+                # lies, use the table in scrape_subdivisions.
                 subdivision_id += 1
                 subdivision_id_string = (subdivision_parent_id + " -> "
                                          + str(subdivision_id))
 
-                if (target_subdivision_id is not None):
-
-                    if (subdivision_id_string == target_subdivision_id):
-                        print("Skipped to %s" % subdivision_id_string)
-
-                    # Branch out
-                    elif (subdivision_child_of(subdivision_id_string,
-                                               target_subdivision_id)):
-                        print("Dividing %s" % subdivision_id_string)
-
-                    # Next branch
-                    elif (subdivision_lt(subdivision_id_string,
-                                         target_subdivision_id)):
-                        print("Skipping %s" % subdivision_id_string)
-                        continue
-
-                    # If not resuming: stop when the branch changes
-                    elif (
-                        (not resume)
-                        and not (subdivision_same_branch(subdivision_id_string,
-                                                         target_subdivision_id))
-                    ):
-                        return
-
-
                 # First, we need to establish the bounds of this subdivision
                 subdivision_min_latitude = (min_latitude
                                             + (subdivision_width * float(row)))
-                subdivision_max_latitude = (subdivision_min_latitude
-                                            + subdivision_width)
                 subdivision_min_longitude = (min_longitude
                                              + (subdivision_height
                                                 * float(column)))
-                subdivision_max_longitude = (subdivision_min_longitude
-                                            + subdivision_height)
-
-                # Then, we can establish the center and the radius of the circle
-                # needed to encompass the entire subdivision
-                subdivision_center_longitude = ((subdivision_min_longitude
-                                                 + subdivision_max_longitude)/2)
-                subdivision_center_latitude = ((subdivision_min_latitude
-                                                 + subdivision_max_latitude)/2)
-
-                # The haversine formula is used to convert the width and height
-                # from degrees into meters before finding the radius in meters
-                width_meters = geo.haversine(0, subdivision_min_longitude,
-                                             0, subdivision_max_longitude)
-                height_meters = geo.haversine(0, subdivision_min_latitude,
-                                              0, subdivision_max_latitude)
-
-                # From there, we use the pythagorean theorem to find the radius
-                subdivision_radius_meters = (math.sqrt((width_meters/2)**2
-                                                  + (height_meters/2)**2))
-
-                # This bool will be changed to true if more recursions are
-                # necessary
-                make_subdivisions = False
-
-                # We only scrape this subdivision if the following conditions
-                # are true
+
+                cells.append(self.make_cell(
+                    subdivision_id_string,
+                    subdivision_min_latitude,
+                    subdivision_min_latitude + subdivision_width,
+                    subdivision_min_longitude,
+                    subdivision_min_longitude + subdivision_height
+                ))
+
+        return cells
+
+    def clip_cells(self, cells):
+        """ Remove the cells that lie entirely outside of self.polygon
+
+        Args:
+            cells: A list of cell dictionaries generated by make_cells or
+                make_children.
+
+        Returns:
+            A list of the cells that overlap self.polygon, in the same order.
+            If there is no polygon, cells is returned unchanged.
+        """
+
+        if (self.polygon is None):
+            return cells
+
+        clipped_cells = []
+        for cell in cells:
+            if (self.polygon.intersects_rectangle(cell["min_latitude"],
+                                                  cell["max_latitude"],
+                                                  cell["min_longitude"],
+                                                  cell["max_longitude"])):
+                clipped_cells.append(cell)
+            else:
+                self.events.debug(
+                    "clip", "Skipping %s because it is outside of the polygon",
+                    cell["id"]
+                )
+
+        return clipped_cells
+
+    def make_children(self, cell, results = None, query = ""):
+        """ Divide a cell that has to be subdivided
+
+        In "grid" mode, the cell is divided into a 3x3 grid; see make_cells.
+
+        In "adaptive" mode, the cell is split k-d tree style using the
+        coordinates of its results: the part with the most results is
+        repeatedly cut in two along its longer side, at the median of the
+        results in it, until there are ADAPTIVE_SPLIT_CELLS parts. Each part
+        holds a similar share of the results, so dense spots get small cells
+        and empty areas get large ones, and fewer cells are made than with a
+        grid. A cut never leaves less than MIN_SPLIT_FRACTION of a side on
+        either side of it. Cells without results to go by, such as cells that
+        were too large to be scraped, are divided into a grid.
+
+        In "hex" mode, the cell's hexagon is covered by a finer hexagonal
+        lattice; see make_hex_children.
+
+        Children are numbered from 1 in the order they should be processed.
+        Children entirely outside of self.polygon are left out; see
+        clip_cells.
+
+        Args:
+            cell: A cell dictionary generated by make_cells or make_children.
+            results: An optional array of results returned by self.scrape for
+                the cell.
+            query: A string containing the place_type or keyword being
+                scraped.
+
+        Returns:
+            A list of cell dictionaries. See make_cells.
+        """
+
+        if (self.split_mode == "hex"):
+            return self.clip_cells(self.make_hex_children(cell, query))
+
+        bounds = (cell["min_latitude"], cell["max_latitude"],
+                  cell["min_longitude"], cell["max_longitude"])
+
+        coordinates = []
+        if (self.split_mode == "adaptive" and results is not None):
+            coordinates = [
+                (latitude, longitude)
+                for latitude, longitude in get_coordinates(results)
+                if (bounds[0] <= latitude <= bounds[1]
+                    and bounds[2] <= longitude <= bounds[3])
+            ]
+
+        if (len(coordinates) < 2):
+            return self.clip_cells(self.make_cells(bounds[0], bounds[1],
+                                                   bounds[2], bounds[3], 3,
+                                                   cell["id"]))
+
+        # Each part is a (bounds, coordinates) pair; parts are kept in spatial
+        # order by replacing a part with its two halves
+        parts = [(bounds, coordinates)]
+        while (len(parts) < ADAPTIVE_SPLIT_CELLS):
+            index = max(range(len(parts)), key = lambda i: len(parts[i][1]))
+            part_bounds, points = parts[index]
+            if (len(points) < 2):
+                break
+            south, north, west, east = part_bounds
+
+            # Cut across the longer side: axis 0 is latitude, 1 is longitude
+            height_meters = geo.haversine(west, south, west, north)
+            width_meters = geo.haversine(west, (south + north)/2,
+                                         east, (south + north)/2)
+            axis = 0 if (height_meters >= width_meters) else 1
+            low, high = part_bounds[2*axis:2*axis + 2]
+
+            values = sorted(point[axis] for point in points)
+            median = (values[(len(values) - 1)//2] + values[len(values)//2])/2
+            margin = (high - low)*MIN_SPLIT_FRACTION
+            cut = min(max(median, low + margin), high - margin)
+
+            lower_bounds = list(part_bounds)
+            upper_bounds = list(part_bounds)
+            lower_bounds[2*axis + 1] = cut
+            upper_bounds[2*axis] = cut
+            parts[index:index + 1] = [
+                (tuple(lower_bounds),
+                 [point for point in points if (point[axis] < cut)]),
+                (tuple(upper_bounds),
+                 [point for point in points if (point[axis] >= cut)])
+            ]
+
+        return self.clip_cells([
+            self.make_cell("%s -> %d" % (cell["id"], number + 1), *part_bounds)
+            for number, (part_bounds, points) in enumerate(parts)
+        ])
+
+    def make_cell(self, subdivision_id_string, min_latitude, max_latitude,
+                  min_longitude, max_longitude):
+        """ Describe a rectangular cell and the circle that encompasses it
+
+        Args:
+            subdivision_id_string: A string containing the subdivision ID of
+                the cell.
+            min_latitude, max_latitude, min_longitude, max_longitude: Floating
+                points describing the bounds of the cell.
+
+        Returns:
+            A cell dictionary. See make_cells.
+        """
+
+        # The center and the radius of the circle needed to encompass the
+        # entire subdivision
+        center_longitude = (min_longitude + max_longitude)/2
+        center_latitude = (min_latitude + max_latitude)/2
+
+        # The haversine formula is used to convert the width and height
+        # from degrees into meters before finding the radius in meters
+        width_meters = geo.haversine(0, min_longitude, 0, max_longitude)
+        height_meters = geo.haversine(0, min_latitude, 0, max_latitude)
+
+        # From there, we use the pythagorean theorem to find the radius
+        radius_meters = math.sqrt((width_meters/2)**2 + (height_meters/2)**2)
+
+        return {
+            "id": subdivision_id_string,
+            "min_latitude": min_latitude,
+            "max_latitude": max_latitude,
+            "min_longitude": min_longitude,
+            "max_longitude": max_longitude,
+            "center_latitude": center_latitude,
+            "center_longitude": center_longitude,
+            "radius_meters": radius_meters
+        }
+
+    def make_hex_cells(self, min_latitude, max_latitude, min_longitude,
+                       max_longitude, grid_width,
+                       subdivision_parent_id = "root"):
+        """ Cover a region with a hexagonal lattice of cells
+
+        A cell of the square grid is scraped with the circle around its
+        corners, which is pi/2 times larger than the cell, so neighboring
+        circles overlap heavily and many places are returned by several cells.
+        Circles around the hexagons of a hexagonal lattice cover the plane
+        with the least overlap of any arrangement of equal circles: each circle
+        is only 1.21 times larger than its hexagon. The hexagons are sized so
+        that about grid_width^2 of them cover the region, like the square grid.
+
+        Cells are numbered from south to north, and from west to east within a
+        row of hexagons.
+
+        Args:
+            See make_cells.
+
+        Returns:
+            A list of cell dictionaries. See make_hex_cell.
+        """
+
+        origin = ((min_longitude + max_longitude)/2,
+                  (min_latitude + max_latitude)/2)
+        region = [geo.to_plane(origin, corner) for corner in [
+            (min_longitude, min_latitude), (max_longitude, min_latitude),
+            (max_longitude, max_latitude), (min_longitude, max_latitude)
+        ]]
+
+        # A hexagon of radius r has an area of 3*sqrt(3)/2*r^2
+        area = (region[1][0] - region[0][0])*(region[2][1] - region[1][1])
+        lattice_radius = math.sqrt(2*area/(3*math.sqrt(3)))/grid_width
+
+        return self.make_hex_lattice(origin, (0.0, 0.0), lattice_radius,
+                                     region, subdivision_parent_id)
+
+    def make_hex_children(self, cell, query = ""):
+        """ Cover a hexagonal cell with a finer hexagonal lattice
+
+        The children's radius is HEX_CHILD_RATIO times smaller than the
+        cell's, and only children that overlap the cell's hexagon are made,
+        since the cell's neighbors cover the rest of its circle.
+
+        A hexagon can not be divided into smaller hexagons, so some children
+        stick out into the neighboring cells. All cells of a scrape lie on
+        lattices projected from the same origin, and with an integer
+        HEX_CHILD_RATIO the children of neighboring cells lie on the same
+        lattice, so a child shared by two cells that both have to be divided
+        is only made once per query. See forget_hex_cells.
+
+        Args:
+            cell: A cell dictionary generated by make_hex_cells or
+                make_hex_children.
+            query: A string containing the place_type or keyword being
+                scraped.
+
+        Returns:
+            A list of cell dictionaries. See make_hex_cell.
+        """
+
+        with self.results_lock:
+            made = self.hex_cells_made.setdefault(query, set())
+
+        center = tuple(cell["plane_center"])
+        return self.make_hex_lattice(
+            tuple(cell["origin"]), center,
+            cell["lattice_radius"]/HEX_CHILD_RATIO,
+            geo.hexagon(center, cell["lattice_radius"]), cell["id"], made
+        )
+
+    def remember_hex_cells(self, cells, query = ""):
+        """ Record that hexagonal cells were made, so that they are not made
+        again by make_hex_children
+
+        Args:
+            cells: An iterable of cell dictionaries. Cells that are not
+                hexagonal are ignored.
+            query: A string containing the place_type or keyword the cells
+                were made for.
+        """
+
+        with self.results_lock:
+            made = self.hex_cells_made.setdefault(query, set())
+            for cell in cells:
+                if ("plane_center" in cell):
+                    made.add(hex_cell_key(cell["plane_center"],
+                                          cell["lattice_radius"]))
+
+    def forget_hex_cells(self, query = None):
+        """ Forget which hexagonal children were made, before a new scrape
+
+        Args:
+            query: A string containing the place_type or keyword whose
+                children are forgotten, or None to forget all of them.
+        """
+
+        with self.results_lock:
+            if (query is None):
+                self.hex_cells_made.clear()
+            else:
+                self.hex_cells_made.pop(query, None)
+
+    def make_hex_lattice(self, origin, anchor, lattice_radius, region,
+                         subdivision_parent_id, made = None):
+        """ Make the cells of a hexagonal lattice that overlap a region
+
+        Args:
+            origin: A (longitude, latitude) coordinate pair at the center of
+                the plane the lattice lies on. See geo.to_plane.
+            anchor: An (x, y) tuple of the center of one of the hexagons.
+            lattice_radius: A float of the radius of the hexagons, in meters.
+            region: A list of (x, y) tuples of the corners of the convex region
+                to be covered.
+            subdivision_parent_id: A string containing the subdivision ID of
+                the region.
+            made: An optional set of the keys of cells that were already
+                made. Those cells are left out, and the keys of the new cells
+                are added to it.
+
+        Returns:
+            A list of cell dictionaries. See make_hex_cell.
+        """
+
+        # Rows of hexagons are 1.5 radii apart, and every other row is shifted
+        # by half a hexagon
+        row_spacing = 1.5*lattice_radius
+        column_spacing = math.sqrt(3)*lattice_radius
+        extent = max(math.hypot(x - anchor[0], y - anchor[1])
+                     for x, y in region)
+        rows = int(math.ceil(extent/row_spacing))
+        columns = int(math.ceil(extent/column_spacing)) + 1
+
+        # Cells are numbered before leaving out the ones already made, so
+        # that a cell's ID does not depend on the order cells are scraped in
+        cells = []
+        subdivision_id = 0
+        for row in range(-rows, rows + 1):
+            for column in range(-columns, columns + 1):
+                center = (anchor[0] + column_spacing*(column + (row % 2)/2.0),
+                          anchor[1] + row_spacing*row)
+                if (not geo.convex_polygons_overlap(
+                    geo.hexagon(center, lattice_radius), region
+                )):
+                    continue
+                subdivision_id += 1
+
+                if (made is not None):
+                    key = hex_cell_key(center, lattice_radius)
+                    with self.results_lock:
+                        if (key in made):
+                            continue
+                        made.add(key)
+
+                cells.append(self.make_hex_cell(
+                    "%s -> %d" % (subdivision_parent_id, subdivision_id),
+                    origin, center, lattice_radius
+                ))
+
+        return cells
+
+    def make_hex_cell(self, subdivision_id_string, origin, center,
+                      lattice_radius):
+        """ Describe a hexagonal cell and the circle that encompasses it
+
+        Args:
+            subdivision_id_string: A string containing the subdivision ID of
+                the cell.
+            origin: A (longitude, latitude) coordinate pair at the center of
+                the plane the lattice lies on. See geo.to_plane.
+            center: An (x, y) tuple of the center of the cell on the plane.
+            lattice_radius: A float of the radius of the hexagon on the plane,
+                in meters.
+
+        Returns:
+            A cell dictionary, like those made by make_cell, whose bounds are
+            the bounding box of the hexagon. Its radius_meters is the distance
+            to the hexagon's farthest corner. It has the additional keys
+            "hexagon", a list of the (longitude, latitude) coordinate pairs of
+            the corners, and "origin", "plane_center" and "lattice_radius",
+            which are used to make its children.
+        """
+
+        center_longitude, center_latitude = geo.from_plane(origin, center)
+        corners = [geo.from_plane(origin, corner)
+                   for corner in geo.hexagon(center, lattice_radius)]
+        longitudes = [corner[0] for corner in corners]
+        latitudes = [corner[1] for corner in corners]
+
+        return {
+            "id": subdivision_id_string,
+            "min_latitude": min(latitudes),
+            "max_latitude": max(latitudes),
+            "min_longitude": min(longitudes),
+            "max_longitude": max(longitudes),
+            "center_latitude": center_latitude,
+            "center_longitude": center_longitude,
+            "radius_meters": max(
+                geo.haversine(center_longitude, center_latitude, *corner)
+                for corner in corners
+            ),
+            "hexagon": [list(corner) for corner in corners],
+            "origin": list(origin),
+            "plane_center": list(center),
+            "lattice_radius": lattice_radius
+        }
+
+    def begin_cell(self, cell, query):
+        """ Report on a cell and decide whether it can be scraped directly
+
+        Reports the cell at the DEBUG level, and the progress of the scrape
+        every PROGRESS_INTERVAL cells, dumps the current state if
+        self.dump_state is set and checks the cell's radius against
+        MAX_RADIUS_METERS and self.min_radius.
+
+        Args:
+            cell: A cell dictionary generated by make_cells.
+            query: A string containing the place_type or keyword to be scraped.
+
+        Returns:
+            One of the following strings:
+                "scrape": The cell should be scraped.
+                "divide": The cell is too large to be scraped and should be
+                    subdivided.
+                "terminate": The cell is too small and the branch has been
+                    terminated.
+        """
+
+        depth = cell["id"].count("->")
+        # The visualization is only generated if the record is kept
+        self.events.debug(
+            "cell",
+            "Subdivision ID: %s\nScrape name: %s\nCenter coords: (%f, %f)\n"
+            "Radius: %f meters\nExtents: \n%s\nVisualization: %s",
+            cell["id"], self.output_directory_name, cell["center_latitude"],
+            cell["center_longitude"], cell["radius_meters"],
+            {
+                "min_longitude": cell["min_longitude"],
+                "max_longitude": cell["max_longitude"],
+                "min_latitude": cell["min_latitude"],
+                "max_latitude": cell["max_latitude"]
+            },
+            functools.partial(self.visualize_cell, cell),
+            id = cell["id"], query = query, depth = depth,
+            radius_meters = cell["radius_meters"]
+        )
+
+        with self.results_lock:
+            self.cells_visited += 1
+            self.max_depth = max(self.max_depth, depth)
+            cells_visited = self.cells_visited
+        if ((cells_visited % PROGRESS_INTERVAL) == 0):
+            self.events.info(
+                "progress",
+                "%d cells visited, %d pages traversed, %d unique places found",
+                cells_visited, self.traversed, len(self.unique_places),
+                query = query
+            )
+
+        # dump state to a file
+        if (self.dump_state):
+            with open(self.state_file, "w") as f:
+                json.dump({"id": cell["id"], "query": query}, f)
+
+        # If the radius of the subdivision exceeds the max, skip the result
+        # collection and recurse
+        if (cell["radius_meters"] > MAX_RADIUS_METERS):
+            self.events.debug(
+                "divide", "Making subdivisions because radius exceeded maximum",
+                id = cell["id"]
+            )
+            self.metrics.inc("gmaps_cells_total", depth = depth,
+                             action = "divide")
+            return "divide"
+
+        elif (cell["radius_meters"] < self.min_radius):
+            self.events.warning(
+                "terminate",
+                "Terminating branch because radius is below the minimum",
+                id = cell["id"], query = query
+            )
+            with self.results_lock:
+                self.cells_terminated += 1
+            self.metrics.inc("gmaps_cells_total", depth = depth,
+                             action = "terminate")
+            self.log(
+                "termination_log.csv",
+                (("Radius fell below minimum value. Subdivision "
+                  "ID: %s. Place type: %s. Coordinates: "
+                  "(%f, %f) Radius: %f") % (
+                    cell["id"],
+                    query,
+                    cell["center_latitude"],
+                    cell["center_longitude"],
+                    cell["radius_meters"])
+                )
+            )
+            return "terminate"
+
+        self.metrics.inc("gmaps_cells_total", depth = depth, action = "scrape")
+        return "scrape"
+
+    def visualize_cell(self, cell):
+        """ Generate a Google Static Maps URL showing a cell
+
+        Args:
+            cell: A cell dictionary generated by make_cells.
+
+        Returns:
+            A string containing the URL.
+        """
+
+        self.gsm.add_coords(cell.get("hexagon", [
+            [cell["min_longitude"], cell["min_latitude"]],
+            [cell["max_longitude"], cell["min_latitude"]],
+            [cell["max_longitude"], cell["max_latitude"]],
+            [cell["min_longitude"], cell["max_latitude"]]
+        ]), "polygon")
+        url = self.gsm.generate_url()
+        self.gsm.reset()
+        return url
+
+    def finish_cell(self, cell, query, results):
+        """ Save the results of a scraped cell and decide whether to subdivide
+
+        Args:
+            cell: A cell dictionary generated by make_cells.
+            query: A string containing the place_type or keyword that was
+                scraped.
+            results: An array containing the results returned by self.scrape.
+
+        Returns:
+            True if the cell should be subdivided; False otherwise.
+        """
+
+        self.events.debug(
+            "cell_results",
+            "%d results for place_type %s\n"
+            "%d pages traversed since program was started",
+            len(results), query, self.traversed, id = cell["id"],
+            results = len(results)
+        )
+        self.count_results(results)
+
+        # Save the results, leaving out places outside of the polygon. The
+        # threshold is still applied to all of the results, as it measures
+        # whether the API returned everything in the cell.
+        if (self.polygon is None):
+            self.dump_results(results)
+        else:
+            self.dump_results([
+                result for result in results
+                if (self.result_in_polygon(result))
+            ])
+
+        # If the cell is saturated, recurse
+        return self.saturation_policy.should_split(self, cell, results)
+
+    def count_results(self, results):
+        """ Add the results of a cell to the redundancy counters
+
+        Args:
+            results: An array containing the results returned by self.scrape.
+        """
+
+        with self.results_lock:
+            self.results_returned += len(results)
+            for result in results:
+                if ("place_id" in result):
+                    self.unique_places.add(result["place_id"])
+
+    def redundancy_ratio(self):
+        """ Measure how often places were returned by more than one cell
+
+        Returns:
+            A float of the number of results returned per unique place, which
+            is 1 if no place was returned twice, or 0 if nothing was returned.
+        """
+
+        with self.results_lock:
+            if (len(self.unique_places) == 0):
+                return 0.0
+            return float(self.results_returned)/len(self.unique_places)
+
+    def print_redundancy(self):
+        """ Print the redundancy ratio and the counters behind it, and the
+        decisions of the saturation policy """
+
+        self.events.info(
+            "redundancy", "Redundancy ratio: %0.3f (%d results, %d unique "
+            "places)", self.redundancy_ratio(), self.results_returned,
+            len(self.unique_places)
+        )
+        stats = self.saturation_policy.stats()
+        self.events.info(
+            "saturation", "Saturation policy: %(splits)d of %(cells)d cells "
+            "divided, %(splits_avoided)d divisions avoided and "
+            "%(splits_added)d added compared to the threshold", stats,
+            **stats
+        )
+
+    def result_in_polygon(self, result):
+        """ Determine whether a result should be kept when clipping
+
+        Args:
+            result: A result returned by the Google Maps API.
+
+        Returns:
+            True if the result lies within self.polygon or has no location;
+            False otherwise.
+        """
+
+        coordinates = get_coordinates([result])
+        if (len(coordinates) == 0):
+            return True
+        return self.polygon.contains((coordinates[0][1], coordinates[0][0]))
+
+    def terminate_retries(self, latitude, longitude, radius_meters, query,
+                          subdivision_id_string):
+        """ Give up on a cell after MAX_RETRIES failed attempts
+
+        Logs the branch termination to termination_log.csv and records the
+        cell in self.failures, so that it can be scraped again with
+        --scrape-errors. A cell that is not being scraped by
+        scrape_cell_results, such as one passed to self.scrape directly, is
+        recorded as the square around its circle.
+
+        Args:
+            See the documentation of the "scrape" attribute.
+        """
+
+        self.events.error("retries_exhausted",
+                          "Max retries exceeded; skipping this subdivision.",
+                          id = subdivision_id_string, query = query)
+        self.metrics.inc("gmaps_retries_exhausted_total", kind = "cell")
+        self.log(
+            "termination_log.csv",
+            (("Maximum number of retries exceeded. Subdivision ID: %s. "
+              "Place type: %s. Coordinates: (%f, %f). Radius: %f") % (
+                subdivision_id_string,
+                query,
+                latitude,
+                longitude,
+                radius_meters
+            ))
+        )
+
+        if (self.failures is not None):
+            cell = self.scraping_cells.get((query, subdivision_id_string))
+            if (cell is None):
+                southwest = geo.from_plane((longitude, latitude),
+                                           (-radius_meters, -radius_meters))
+                northeast = geo.from_plane((longitude, latitude),
+                                           (radius_meters, radius_meters))
+                cell = self.make_cell(subdivision_id_string, southwest[1],
+                                      northeast[1], southwest[0], northeast[0])
+            self.failures.record(self.SCRAPE_TYPE, query, cell,
+                                 scrape = self.output_directory_name,
+                                 reason = "Maximum number of retries exceeded")
+
+    def scrape_cell_results(self, cell, query):
+        """ Scrape a single cell and keep its results
+
+        Args:
+            cell: A cell dictionary generated by make_cells.
+            query: A string containing the place_type or keyword to be scraped.
+
+        Returns:
+            A (make_subdivisions, results) tuple, where make_subdivisions is
+            True if the cell should be subdivided and results is the array
+            returned by self.scrape, or None if the cell was not scraped.
+        """
+
+        action = self.begin_cell(cell, query)
+        if (action == "scrape"):
+            self.scraping_cells[(query, cell["id"])] = cell
+            try:
+                results = self.scrape(cell["center_latitude"],
+                                      cell["center_longitude"],
+                                      cell["radius_meters"],
+                                      query,
+                                      cell["id"])
+            finally:
+                del self.scraping_cells[(query, cell["id"])]
+            return (self.finish_cell(cell, query, results), results)
+
+        return ((action == "divide"), None)
+
+    def scrape_cell(self, cell, query):
+        """ Scrape a single cell
+
+        Args:
+            cell: A cell dictionary generated by make_cells.
+            query: A string containing the place_type or keyword to be scraped.
+
+        Returns:
+            True if the cell should be subdivided; False otherwise.
+        """
+
+        return self.scrape_cell_results(cell, query)[0]
+
+    def estimate_densities(self, cells, results = None, parent_estimate = None):
+        """ Estimate the density of places in each of a list of cells
+
+        The density of a child cell is estimated from the results of its
+        parent that lie within it. Results are capped by the API, so these are
+        lower bounds, but they rank siblings correctly. Children of a cell that
+        was not scraped inherit its estimate, and cells nothing is known about
+        are given an infinite estimate so that they are explored first.
+
+        Args:
+            cells: A list of cell dictionaries generated by make_cells.
+            results: An optional array of results returned by self.scrape for
+                the parent of the cells.
+            parent_estimate: An optional float of the parent's estimate.
+
+        Returns:
+            A list of (cell, estimate) tuples, where estimate is a float
+            describing the expected number of places per square kilometer.
+        """
+
+        if (results is None):
+            if (parent_estimate is None):
+                parent_estimate = float("inf")
+            return [(cell, parent_estimate) for cell in cells]
+
+        coordinates = get_coordinates(results)
+        entries = []
+        for cell in cells:
+            count = 0
+            for latitude, longitude in coordinates:
                 if (
-                    target_subdivision_id is None
-                    or (subdivision_child_of(target_subdivision_id,
-                                             subdivision_id_string))
-                    or (subdivision_gt(subdivision_id_string,
-                                       target_subdivision_id))
+                    cell["min_latitude"] <= latitude <= cell["max_latitude"]
+                    and cell["min_longitude"] <= longitude
+                        <= cell["max_longitude"]
                 ):
-                    print("Subdivision ID: %s" % subdivision_id_string)
-                    print("Scrape name: %s" % self.output_directory_name)
-                    print("Center coords: (%f, %f)" % (
-                        subdivision_center_latitude,
-                        subdivision_center_longitude
-                    ))
-                    print("Radius: %f meters" % subdivision_radius_meters)
-                    print("Extents: ")
-                    print({
-                        "min_longitude": subdivision_min_longitude,
-                        "max_longitude": subdivision_max_longitude,
-                        "min_latitude": subdivision_min_latitude,
-                        "max_latitude": subdivision_max_latitude
-                    })
-                    self.gsm.add_coords([
-                        [subdivision_min_longitude, subdivision_min_latitude],
-                        [subdivision_max_longitude, subdivision_min_latitude],
-                        [subdivision_max_longitude, subdivision_max_latitude],
-                        [subdivision_min_longitude, subdivision_max_latitude]
-                    ], "polygon")
-                    print("Visualization: %s" % self.gsm.generate_url())
-                    self.gsm.reset()
-
-                    # dump state to a file
-                    with open(self.state_file, "w") as f:
-                        json.dump(
-                            {
-                                "id": subdivision_id_string,
-                                "query": query,
-                            },
-                            f,
-                            indent = 4
-                        )
-
-                    # If the radius of the subdivision exceeds the max, skip the
-                    # result collection and recurse
-                    if (subdivision_radius_meters > MAX_RADIUS_METERS):
-                        print("Making subdivisions because radius exceeded "
-                              "maximum")
-                        make_subdivisions = True
-
-                    elif (subdivision_radius_meters < self.min_radius):
-                        print("Terminating branch because radius is below the "
-                              "minimum")
-                        self.log(
-                            "termination_log.csv",
-                            (("Radius fell below minimum value. Subdivision "
-                              "ID: %s. Place type: %s. Coordinates: "
-                              "(%f, %f) Radius: %f") % (
-                                subdivision_id_string,
-                                query,
-                                subdivision_center_latitude,
-                                subdivision_center_longitude,
-                                subdivision_radius_meters)
-                            )
-                        )
-
-                    else:
-
-                        # Get results
-                        results = self.scrape(subdivision_center_latitude,
-                                              subdivision_center_longitude,
-                                              subdivision_radius_meters,
-                                              query,
-                                              subdivision_id_string)
-                        print("%d results for place_type %s" % (len(results),
-                                                                query))
-                        print("%d pages traversed since program was started"
-                              % self.traversed)
-
-                        # Save the results
-                        self.writer.dump(results)
-
-                        # If the number of results exceeded the threshold,
-                        # recurse.
-                        threshold = self.threshold
-
-                        # HACK: Relax threshold for higher order subdivisions
-                        depth = subdivision_id_string.count("->")
-                        if (depth <= 4):
-                            threshold = int(self.threshold * (1 - 0.6/depth))
-                            print("Relaxing threshold to %d" % threshold)
-
-                        if (len(results) >= threshold):
-                            print("Making subdivisions because threshold was "
-                                  "met (%d)" % threshold)
-                            make_subdivisions = True
+                    count += 1
 
-                else:
-                    make_subdivisions = True
-
-                # Recurse if necessary
-                if (make_subdivisions):
-                    print("")
-                    kwargs = {
-                        "min_latitude": subdivision_min_latitude,
-                        "max_latitude": subdivision_max_latitude,
-                        "min_longitude": subdivision_min_longitude,
-                        "max_longitude": subdivision_max_longitude,
-                        "grid_width": 3,
-                        "query": query,
-                        "subdivision_parent_id": subdivision_id_string,
-                        "target_subdivision_id": target_subdivision_id,
-                        "resume": resume
-                    }
-                    if (target_subdivision_id is None):
-                        kwargs.pop("target_subdivision_id")
-
-                    self.scrape_subdivisions(**kwargs)
-                else:
-                    print("Branch terminated\n")
+            area = (geo.haversine(cell["min_longitude"], cell["min_latitude"],
+                                  cell["max_longitude"], cell["min_latitude"])
+                    * geo.haversine(cell["min_longitude"],
+                                    cell["min_latitude"],
+                                    cell["min_longitude"],
+                                    cell["max_latitude"]))
+            entries.append((cell, count/max(area/1000000, 1e-9)))
+
+        return entries
+
+    def scrape_subdivisions(self, min_latitude, max_latitude, min_longitude,
+                            max_longitude, grid_width, query = "",
+                            subdivision_parent_id = "root",
+                            target_subdivision_id = "", resume = False):
+        """ Function that creates subdivisions and invokes the scraper
+
+        This is the main function that manages the creation of subdivisions and
+        invokes the scraper to scrape places from those subdivisions.
+
+        Subdivisions are congruent rectangular areas which are similar to the
+        region defined in the function's arguments. All subdivisions have the
+        same width and height and are arranged in a square grid.
+
+        For example, a 3x3 grid of subdivisions with min_lat = 0, min_long = 0,
+        max_lat = 3, max_long = 3 would look like this:
+
+            increasing latitude
+            ^
+            3 +---+---+---+
+              | 7 | 8 | 9 |
+            2 +---+---+---+
+              | 4 | 5 | 6 |
+            1 +---+---+---+
+              | 1 | 2 | 3 |
+            0 +---+---+---+
+              0   1   2   3 > increasing longitude
+
+        Where the number inside each box corresponds to the order in which that
+        cell is processed.
+
+        To calculate the scraping area, which is circular:
+            We use the Pythagorean theorem to find the diameter of the smallest
+                circle containing all points of the scraping area and divide
+                that by 2 to get the radius.
+            We get the average longitude and latitude to get the center.
+
+        The scrape function is called on each cell and each cell is further
+        subdivided into another square grid of congruent cells if the threshold,
+        as defined in the initialization, is returned. The cells waiting to be
+        scraped are kept in a stack, queue or heap, depending on
+        self.traversal, rather than on the call stack, so the tree can be as
+        deep as needed and can be traversed depth first (the default),
+        breadth first or densest cell first.
+
+        Each cell is assigned a string detailing that cell's ancestry. For
+        example, the bottom left subdivision of the top right subdivision of the
+        root cell has the ID "root -> 9 -> 1".
+
+        To re-scrape a subdivision, all arguments except subdivision_parent_id
+        must be supplied.
+
+        If self.journal is set, every cell started and finished is recorded in
+        it. If the query was already started in the journal, the scrape
+        resumes from the cells that were left pending instead of starting
+        over, and the region arguments are ignored.
+
+        Args:
+            min_latitude, max_latitude, min_longitude, max_longitude: Floating
+                points describing the bounds of the scraping region
+            grid_width: An integer describing the number of rows and columns to
+                subdivide the scraping region into. The total number of cells is
+                grid_width^2.
+            query: A string containing the place_type or keyword to be scraped
+            subdivision_parent_id: A string containing the subdivision ID of the
+                parent region. If there is no parent region, the ID is "root".
+                This variable is managed by the function and should not be
+                modified externally.
+            target_subdivision_id: An optional string containing the subdivision
+                ID of the cell to be skipped to.
+            resume: A bool descibing whether or not to continue scraping after
+                the target subdivsion has been scraped. By default, scraping
+                terminates after the target_subdivision_id is scraped.
+        """
+
+        self.forget_hex_cells(query)
+        pending = frontier.TRAVERSALS[self.traversal]()
+        if (self.journal is not None and self.journal.has_query(query)):
+            for batch in self.resume_from_journal(query):
+                pending.push(batch)
+        else:
+            entries = self.estimate_densities(self.clip_cells(
+                self.make_cells(min_latitude, max_latitude, min_longitude,
+                                max_longitude, grid_width,
+                                subdivision_parent_id)
+            ))
+            if (self.journal is not None):
+                self.journal.push(query, entries)
+            pending.push(entries)
+
+        self.scrape_pending(pending, query, target_subdivision_id, resume)
+        self.print_redundancy()
+
+    def scrape_pending(self, pending, query, target_subdivision_id = None,
+                       resume = False):
+        """ Scrape cells and their children until none are pending
+
+        Args:
+            pending: A traversal object provided by the frontier library,
+                holding the cells to be scraped.
+            See scrape_subdivisions for the other args.
+        """
+
+        while (len(pending) > 0):
+            cell, estimate = pending.pop()
+
+            # Skipping a cell skips its subtree, as its children are never
+            # pushed. A cell that stops its grid is skipped as well: all of
+            # its remaining siblings get the same action.
+            action = self.subdivision_action(cell["id"], target_subdivision_id,
+                                             resume)
+            if (action in ("skip", "stop")):
+                continue
+            if (self.journal is not None):
+                self.journal.start(query, cell)
+
+            # Cells that are not scraped are divided to reach the target. In
+            # adaptive mode they are scraped anyway, since their results
+            # decide how they are split.
+            if (action == "divide" and self.split_mode != "adaptive"):
+                make_subdivisions, results = (True, None)
+            else:
+                make_subdivisions, results = self.scrape_cell_results(cell,
+                                                                      query)
+                make_subdivisions = make_subdivisions or (action == "divide")
+
+            children = []
+            if (make_subdivisions):
+                children = self.estimate_densities(
+                    self.make_children(cell, results, query), results,
+                    estimate
+                )
+                pending.push(children)
+            else:
+                self.events.debug("branch_terminated", "Branch terminated",
+                                  id = cell["id"])
+            if (self.journal is not None):
+                self.journal.finish(query, cell, children)
+
+        if (self.journal is not None):
+            self.journal.sync()
+
+    def scrape_failure(self, failure):
+        """ Scrape a cell recorded in a failure ledger, and all of its children
+
+        The cell is scraped as it was recorded, so its subdivision ID and
+        bounds are the same as in the scrape it failed in.
+
+        Args:
+            failure: A dictionary returned by
+                frontier.SQLite3FailureLedger.unresolved.
+        """
+
+        pending = frontier.TRAVERSALS[self.traversal]()
+        pending.push(self.estimate_densities([failure["cell"]]))
+        self.scrape_pending(pending, failure["query"])
+
+    def resume_from_journal(self, query):
+        """ Reconstruct the pending cells of a query from self.journal
+
+        Hexagonal cells in the journal are remembered, so that children that
+        were already made are not made again.
+
+        Args:
+            query: A string containing the place_type or keyword to be scraped.
+
+        Returns:
+            A list of batches of (cell, estimate) tuples. See
+            frontier.CellJournal.pending.
+        """
+
+        batches = self.journal.pending(query)
+        self.remember_hex_cells(self.journal.cells(query), query)
+        self.events.info(
+            "journal", "Resuming %s from %s: %d cells pending, %d of them "
+            "interrupted", query, self.journal.path,
+            sum(len(batch) for batch in batches),
+            self.journal.interrupted(query), query = query
+        )
+        return batches
+
+    def plan(self, density_model, min_latitude, max_latitude, min_longitude,
+             max_longitude, grid_width, query = "", verbose = False):
+        """ Estimate what a scrape would cost without making any requests
+
+        Runs scrape_subdivisions on a copy of the scraper whose requests are
+        answered by a planner.SimulatedClient, which serves places drawn by a
+        density model. The copy keeps the scraper's traversal, split mode,
+        polygon, saturation policy, threshold and min_radius, so it walks the
+        tree the real scrape would walk if the places were where the model
+        puts them. It does not share the scraper's writer, rate limiter,
+        caches, counters or state file: nothing is saved and nothing waits.
+
+        Args:
+            density_model: A density model object provided by the planner
+                library.
+            min_latitude, max_latitude, min_longitude, max_longitude,
+                grid_width, query: See scrape_subdivisions.
+            verbose: A bool describing whether or not the output of the
+                simulated scrape is printed.
+
+        Returns:
+            A dictionary with the following keys:
+                "places": The number of places drawn by the density model.
+                "places_found": The number of those places the scrape finds.
+                "requests": A dictionary mapping each endpoint to the number
+                    of requests made to it.
+                "total_requests": The total number of requests.
+                "cells": The number of cells visited.
+                "max_depth": The depth of the deepest cell visited.
+                "cells_terminated": The number of cells terminated because
+                    their radius fell below min_radius.
+                "redundancy_ratio": See redundancy_ratio.
+                "estimated_seconds": The wall-clock time the scrape is
+                    estimated to take with the scraper's rate limiter. See
+                    planner.estimate_seconds.
+        """
+
+        points = density_model.points(min_latitude, max_latitude,
+                                      min_longitude, max_longitude)
+        client = planner.SimulatedClient(points)
+
+        simulation = copy.copy(self)
+        simulation.gmaps = client
+        simulation.gsm = staticmaps.Constructor()
+        simulation.rate_limiter = ratelimit.RateLimiter()
+        simulation.response_cache = None
+        simulation.metrics = telemetry.Metrics()
+        simulation.events = eventlog.EventLog(
+            name = self.events.name,
+            console_level = (self.events.console_level if (verbose)
+                             else eventlog.ERROR + 1),
+            writer = self.events.writer
+        )
+        if (self.detail_memo is not None):
+            simulation.detail_memo = cache.DetailMemo()
+        simulation.page_token_delay = 0
+        simulation.hex_cells_made = {}
+        simulation.results_lock = threading.Lock()
+        simulation.reset_counters()
+        simulation.saturation_policy = copy.copy(self.saturation_policy)
+        simulation.saturation_policy.reset()
+        simulation.writer_type = gms_io.NullWriter()
+        simulation.output_directory = tempfile.mkdtemp(prefix = "plan_")
+        simulation.state_file = "%s/state.json" % simulation.output_directory
+        simulation.journal = None
+        simulation.failures = None
+        simulation.scraping_cells = {}
+
+        try:
+            with open(os.devnull, "w") as devnull:
+                with contextlib.redirect_stdout(
+                        sys.stdout if (verbose) else devnull):
+                    simulation.initialize_output_directory()
+                    simulation.scrape_subdivisions(
+                        min_latitude, max_latitude, min_longitude,
+                        max_longitude, grid_width, query
+                    )
+        finally:
+            simulation.events.writer.release(simulation.output_directory)
+            simulation.events.writer.flush()
+            shutil.rmtree(simulation.output_directory, ignore_errors = True)
+
+        requests = dict(client.requests)
+        return {
+            "places": len(points),
+            "places_found": len(simulation.unique_places),
+            "requests": requests,
+            "total_requests": sum(requests.values()),
+            "cells": simulation.cells_visited,
+            "max_depth": simulation.max_depth,
+            "cells_terminated": simulation.cells_terminated,
+            "redundancy_ratio": simulation.redundancy_ratio(),
+            "estimated_seconds": planner.estimate_seconds(
+                sum(requests.values()),
+                client.page_tokens,
+                self.rate_limiter,
+                self.page_token_delay,
+                getattr(self, "max_in_flight", 1)
+            )
+        }
+
+    def seed_frontier(self, shared_frontier, min_latitude, max_latitude,
+                      min_longitude, max_longitude, grid_width, query = ""):
+        """ Add the top-level cells of a region to a frontier
+
+        Seeding is idempotent, so every worker sharing the frontier can seed it
+        before calling scrape_frontier.
+
+        Args:
+            shared_frontier: A frontier object provided by the frontier
+                library.
+            See scrape_subdivisions for the other args.
+        """
+
+        shared_frontier.push(self.clip_cells(self.make_cells(min_latitude,
+                                                             max_latitude,
+                                                             min_longitude,
+                                                             max_longitude,
+                                                             grid_width)),
+                             query)
+
+    def scrape_frontier(self, shared_frontier, worker = None,
+                        poll_interval = 5):
+        """ Scrape cells from a frontier shared with other workers
+
+        Instead of recursing, this leases cells from a durable queue, scrapes
+        them and adds the children of cells that need to be subdivided back to
+        the queue. Any number of workers, in any number of processes, can
+        consume the same frontier; cells leased by a worker that crashed are
+        handed out again once their lease expires.
+
+        Returns once no cells are pending or leased by other workers.
+
+        Args:
+            shared_frontier: A frontier object provided by the frontier
+                library.
+            worker: A string identifying this worker. Defaults to the hostname
+                and PID.
+            poll_interval: A float describing how many seconds to wait for
+                other workers to add cells when none are pending.
+        """
+
+        if (worker is None):
+            worker = "%s:%d" % (os.uname()[1], os.getpid())
+
+        self.forget_hex_cells()
+        while True:
+            leased = shared_frontier.lease(worker)
+            if (leased is None):
+                if (shared_frontier.outstanding() == 0):
+                    break
+                time.sleep(poll_interval)
+                continue
+            cell, query = leased
+
+            try:
+                make_subdivisions, results = self.scrape_cell_results(cell,
+                                                                      query)
+            except:
+                shared_frontier.release(cell, query)
+                raise
+
+            if (make_subdivisions):
+                children = self.make_children(cell, results, query)
+            else:
+                self.events.debug("branch_terminated", "Branch terminated",
+                                  id = cell["id"])
+                children = []
+
+            shared_frontier.complete(cell, query, children)
+
+        self.print_redundancy()
 
 class PlacesNearbyScraper(SubdivisionScraper):
     """ A subclass of SubdivisionScraper specifically for scraping places_nearby
@@ -732,6 +2353,8 @@ class PlacesNearbyScraper(SubdivisionScraper):
         See SubdivisionScraper.
     """
 
+    SCRAPE_TYPE = "places_nearby"
+
     def __init__(self, *args, **kwargs):
         """ Initializes PlacesNearbyScraper class
 
@@ -744,9 +2367,11 @@ class PlacesNearbyScraper(SubdivisionScraper):
 
         self.threshold = 50
 
-        print("Configured scraper to scrape places_nearby; threshold = %d" % (
+        self.events.info(
+            "configured",
+            "Configured scraper to scrape places_nearby; threshold = %d",
             self.threshold
-        ))
+        )
 
     def scrape(self, latitude, longitude, radius_meters, query,
                subdivision_id_string, page = 1, retries = 0, token = "none"):
@@ -772,79 +2397,77 @@ class PlacesNearbyScraper(SubdivisionScraper):
                 next page of results, passed by the previous recursion.
 
         Returns:
-            An array containing places returned by the Google Maps API function.
+            A saturation.ScrapeResults array containing places returned by the
+            Google Maps API function.
 
             A blank array is returned if MAX_RETRIES attempts were made.
         """
 
-        combined_results = []
-
-        self.rate_limit() ######################################################
+        combined_results = saturation.ScrapeResults(
+            result_cap = NEARBY_RESULT_CAP
+        )
 
-        print("Retrieving page %d" % page)
+        self.events.debug("page", "Retrieving page %d", page,
+                          id = subdivision_id_string)
         try:
+            params = {
+                "location": {
+                    "lat": latitude,
+                    "lng": longitude
+                },
+                "radius": radius_meters,
+                "type": query
+            }
             # Only provide a page_token if the next_page_token was provided
-            if (token == "none"):
-                results = self.gmaps.places_nearby(
-                    location = {
-                        "lat": latitude,
-                        "lng": longitude
-                    },
-                    radius = radius_meters,
-                    type = query
-                )
-            else:
-                results = self.gmaps.places_nearby(
-                    location = {
-                        "lat": latitude,
-                        "lng": longitude
-                    },
-                    radius = radius_meters,
-                    type = query,
-                    page_token = token
-                )
+            if (token != "none"):
+                params["page_token"] = token
+            results = self.request("places_nearby", **params)
 
             # From https://developers.google.com/places/web-service/search:
             # "next_page_token contains a token that can be used to return up to
             # 20 additional results. A next_page_token will not be returned if
             # there are no additional results to display."
             # If the next_page_token exists, recurse and append to the
-            # combined_results array.
-            time.sleep(self.request_delay)
+            # combined_results array. Cached pages can be replayed at once.
             if "next_page_token" in results:
-                token = results["next_page_token"]
-                combined_results += self.scrape(
-                    latitude, longitude, radius_meters, query,
-                    subdivision_id_string, page + 1, retries, token
-                )
+                # The API serves no more than NEARBY_MAX_PAGES pages, so a
+                # token on the last one means results were left out, and is
+                # not used
+                if (page >= NEARBY_MAX_PAGES):
+                    combined_results.truncated = True
+                else:
+                    token = results["next_page_token"]
+                    if (not self.is_cached("places_nearby",
+                                           **dict(params,
+                                                  page_token = token))):
+                        time.sleep(self.page_token_delay)
+                    combined_results.merge(self.scrape(
+                        latitude, longitude, radius_meters, query,
+                        subdivision_id_string, page + 1, retries, token
+                    ))
 
             combined_results += results["results"]
 
         except Exception as err:
-            print("Error: %s" % err)
+            self.events.warning("request_error", "Error: %s", err,
+                                endpoint = "places_nearby",
+                                id = subdivision_id_string)
             self.log("error_log.csv", err)
 
-            time.sleep(self.request_delay)
+            time.sleep(RETRY_DELAY)
 
             if (retries <= MAX_RETRIES):
-                print("Retrying (attempt #%d)" % (retries + 1))
-                combined_results += self.scrape(
+                self.events.info("retry", "Retrying (attempt #%d)",
+                                 retries + 1, endpoint = "places_nearby")
+                self.metrics.inc("gmaps_retries_total",
+                                 endpoint = "places_nearby")
+                combined_results.merge(self.scrape(
                     latitude, longitude, radius_meters, query,
                     subdivision_id_string, page, retries + 1, token
-                )
+                ))
             else:
-                print("Max retries exceeded; skipping this subdivision.")
-                self.log(
-                    "termination_log.csv",
-                    (("Maximum number of retries exceeded. Subdivision ID: %s. "
-                      "Place type: %s. Coordinates: (%f, %f). Radius: %f") % (
-                        subdivision_id_string,
-                        query,
-                        latitude,
-                        longitude,
-                        radius_meters
-                    ))
-                )
+                self.terminate_retries(latitude, longitude, radius_meters,
+                                       query, subdivision_id_string)
 
             pass
 
@@ -860,6 +2483,8 @@ class PlacesRadarScraper(SubdivisionScraper):
         See SubdivisionScraper.
     """
 
+    SCRAPE_TYPE = "places_radar"
+
     def __init__(self, *args, **kwargs):
         """ Initializes PlacesRadarScraper class
 
@@ -872,9 +2497,11 @@ class PlacesRadarScraper(SubdivisionScraper):
 
         self.threshold = 200
 
-        print("Configured scraper to scrape places_radar; threshold = %d" % (
+        self.events.info(
+            "configured",
+            "Configured scraper to scrape places_radar; threshold = %d",
             self.threshold
-        ))
+        )
 
     def scrape(self, latitude, longitude, radius_meters, query,
                subdivision_id_string):
@@ -890,18 +2517,18 @@ class PlacesRadarScraper(SubdivisionScraper):
         for the main args.
 
         Returns:
-            An array containing places returned by the Google Maps API function.
+            A saturation.ScrapeResults array containing places returned by the
+            Google Maps API function.
 
             A blank array is returned if MAX_RETRIES attempts were made.
         """
 
         results = []
 
-        self.rate_limit() ######################################################
-
         for attempt in range(MAX_RETRIES):
             try:
-                results = self.gmaps.places_radar(
+                results = self.request(
+                    "places_radar",
                     location = {
                         "lat": latitude,
                         "lng": longitude
@@ -909,59 +2536,70 @@ class PlacesRadarScraper(SubdivisionScraper):
                     radius = radius_meters,
                     type = query
                 )["results"]
-                time.sleep(self.request_delay)
                 break
             except Exception as err:
-                print("Error: %s" % err)
+                self.events.warning("request_error", "Error: %s", err,
+                                    endpoint = "places_radar",
+                                    id = subdivision_id_string)
                 self.log("error_log.csv", err)
 
-                time.sleep(self.request_delay)
+                time.sleep(RETRY_DELAY)
                 pass
-            print("Retrying (attempt #%d)" % (attempt + 1))
-
-        if (attempt == MAX_RETRIES - 1):
-            print("Max retries exceeded; skipping this subdivision.")
-            self.log(
-                "termination_log.csv",
-                (("Maximum number of retries exceeded. Subdivision ID: %s. "
-                  "Place type: %s. Coordinates: (%f, %f). Radius: %f") % (
-                    subdivision_id_string,
-                    query,
-                    latitude,
-                    longitude,
-                    radius_meters
-                ))
-            )
+            if (attempt < MAX_RETRIES - 1):
+                self.events.info("retry", "Retrying (attempt #%d)",
+                                 attempt + 1, endpoint = "places_radar")
+                self.metrics.inc("gmaps_retries_total",
+                                 endpoint = "places_radar")
+        else:
+            # No attempt succeeded
+            self.terminate_retries(latitude, longitude, radius_meters,
+                                   query, subdivision_id_string)
 
-        return results
+        return saturation.ScrapeResults(results, RADAR_RESULT_CAP)
 
 class PlacesTextScraper(SubdivisionScraper):
     """ A subclass of SubdivisionScraper specifically for scraping keyword
     searches
 
     A subclass that defines self.scrape as a function that fetches results from
-    googlemaps.Client.places_radar, performing searches for a specific keyword.
+    googlemaps.Client.places_radar, performing searches for a specific keyword,
+    and then fetches the details of every result. Details are memoized in
+    self.detail_memo, so places found again by overlapping or divided cells
+    are not paid for twice.
 
     Attributes:
         See SubdivisionScraper.
+        detail_max_in_flight: An integer describing the maximum number of
+            places whose details are fetched at once.
     """
 
+    SCRAPE_TYPE = "text_radar"
+
     def __init__(self, *args, **kwargs):
         """ Initializes PlacesTextScraper class
 
         Args:
-            See Scraper.__init__.
+            See Scraper.__init__. If no detail_memo is given, an in-memory
+                cache.DetailMemo is used.
+            detail_max_in_flight: An optional integer describing the maximum
+                number of places whose details are fetched at once (default
+                MAX_IN_FLIGHT).
         """
 
         Scraper.__init__(self, *args, **kwargs)
         SubdivisionScraper.__init__(self, *args, **kwargs)
 
         self.threshold = 160
-
-        print("Configured scraper to scrape places_radar using text search; "
-              "threshold = %d" % (
-            self.threshold
-        ))
+        self.detail_max_in_flight = kwargs.get("detail_max_in_flight",
+                                               MAX_IN_FLIGHT)
+        if (self.detail_memo is None):
+            self.detail_memo = cache.DetailMemo()
+
+        self.events.info(
+            "configured",
+            "Configured scraper to scrape places_radar using text search; "
+            "threshold = %d", self.threshold
+        )
 
     def scrape(self, latitude, longitude, radius_meters, query,
                subdivision_id_string):
@@ -972,23 +2610,28 @@ class PlacesTextScraper(SubdivisionScraper):
         MAX_RETRIES attempts are made before the function gives up and logs the
         branch termination to termination_log.csv.
 
+        The details of the places found are then fetched as one batch, up to
+        detail_max_in_flight at once, skipping places that are already in
+        self.detail_memo. Places whose details could not be fetched are logged
+        to termination_log.csv by fetch_place and left out.
+
         Args:
             See the "scrape" attribute above.
 
         Returns:
-            An array containing places returned by the Google Maps API function.
+            An array containing the details of the places returned by the
+            Google Maps API function.
 
             A blank array is returned if MAX_RETRIES attempts were made.
         """
 
-        results = []
-
-        self.rate_limit() ######################################################
+        intermediate_results = []
 
         for attempt in range(MAX_RETRIES):
             try:
                 # Do an initial, exploratory radar search
-                intermediate_results = self.gmaps.places_radar(
+                intermediate_results = self.request(
+                    "places_radar",
                     location = {
                         "lat": latitude,
                         "lng": longitude
@@ -996,61 +2639,393 @@ class PlacesTextScraper(SubdivisionScraper):
                     radius = radius_meters,
                     keyword = query
                 )["results"]
-                time.sleep(self.request_delay)
-
-                # Get the details of each radar search result
-                current_place = 1
-                for place in intermediate_results:
-                    for place_attempt in range(MAX_RETRIES):
-
-                        self.rate_limit() ######################################
-
-                        try:
-                            place_id = place["place_id"]
-                            print("Fetching details for place %d of %d (%s)" % (
-                                current_place, len(intermediate_results),
-                                place_id
-                            ))
-                            results.append(self.gmaps.place(place_id)["result"])
-                            current_place += 1
-                            time.sleep(self.request_delay)
-                            break
-                        except Exception as err:
-                            print("Error getting details: %s" % err)
-                            self.log("error_log.csv", err)
-
-                            time.sleep(self.request_delay)
-                            pass
-
-                    if (place_attempt == MAX_RETRIES - 1):
-                        print("Max retries exceeded; skipping this place_id.")
-                        self.log(
-                            "termination_log.csv",
-                            (("Maximum number of retries for a place exceeded. "
-                              "place_id: %s. ") % place_id)
-                        )
-
                 break
             except Exception as err:
-                print("Error: %s" % err)
+                self.events.warning("request_error", "Error: %s", err,
+                                    endpoint = "places_radar",
+                                    id = subdivision_id_string)
                 self.log("error_log.csv", err)
 
-                time.sleep(self.request_delay)
+                time.sleep(RETRY_DELAY)
                 pass
-            print("Retrying (attempt #%d)" % (attempt + 1))
+            if (attempt < MAX_RETRIES - 1):
+                self.events.info("retry", "Retrying (attempt #%d)",
+                                 attempt + 1, endpoint = "places_radar")
+                self.metrics.inc("gmaps_retries_total",
+                                 endpoint = "places_radar")
+        else:
+            # No attempt succeeded
+            self.terminate_retries(latitude, longitude, radius_meters,
+                                   query, subdivision_id_string)
+
+        # Get the details of each radar search result
+        self.events.debug("details", "Fetching details for %d places",
+                          len(intermediate_results), id = subdivision_id_string)
+        details = dict(self.fetch_places(
+            [place["place_id"] for place in intermediate_results],
+            self.detail_max_in_flight
+        ))
 
-        if (attempt == MAX_RETRIES - 1):
-            print("Max retries exceeded; skipping this subdivision.")
-            self.log(
-                "termination_log.csv",
-                (("Maximum number of retries exceeded. Subdivision ID: %s. "
-                  "Place type: %s. Coordinates: (%f, %f). Radius: %f") % (
-                    subdivision_id_string,
-                    query,
-                    latitude,
-                    longitude,
-                    radius_meters
-                ))
-            )
+        # Keep the order of the radar search results. Whether the radar
+        # search hit its cap decides whether the cell is saturated, as some
+        # details may be missing.
+        results = saturation.ScrapeResults(
+            result_cap = RADAR_RESULT_CAP,
+            truncated = (len(intermediate_results) >= RADAR_RESULT_CAP)
+        )
+        for place in intermediate_results:
+            if (details[place["place_id"]] is not None):
+                results.append(details[place["place_id"]])
 
         return results
+
+class AsyncSubdivisionScraper(SubdivisionScraper):
+    """ Subclass of SubdivisionScraper that scrapes cells concurrently
+
+    A subclass of the SubdivisionScraper class that walks the subdivision tree
+    using asyncio. Sibling cells and their children are scheduled as separate
+    tasks, and requests are made on a thread pool so that up to max_in_flight
+    calls to self.scrape can be running at once. The subdivision IDs, results
+    and logs are the same as those of SubdivisionScraper.scrape_subdivisions;
+    only the order in which cells are processed differs. Since all pending
+    cells are scraped at once, self.traversal has no effect.
+
+    Quota management is unchanged: self.scrape still calls self.rate_limit
+    before every request, which is safe to call from multiple threads.
+    Subclasses can instead override scrape_async with a coroutine that makes
+    its requests with request_async, which waits for the rate limiter without
+    holding a slot.
+
+    For actual scrapers, see the child classes AsyncPlacesNearbyScraper and
+    AsyncPlacesRadarScraper.
+
+    Attributes:
+        max_in_flight: An integer describing the maximum number of calls to
+            self.scrape, or requests made by request_async, that can be
+            running at once.
+        semaphore: An asyncio.Semaphore limiting the number of calls in flight.
+            This is only defined while scrape_subdivisions is running.
+        executor: A concurrent.futures.ThreadPoolExecutor that self.scrape is
+            run on. This is only defined while scrape_subdivisions is running.
+    """
+
+    def __init__(self, max_in_flight = MAX_IN_FLIGHT, *dummy_args,
+                 **dummy_kwargs):
+        """ Initializes AsyncSubdivisionScraper
+
+        Args:
+            max_in_flight: An integer describing the maximum number of calls to
+                self.scrape that can be running at once.
+        """
+
+        self.max_in_flight = max_in_flight
+        self.semaphore = None
+        self.executor = None
+
+    def scrape_subdivisions(self, min_latitude, max_latitude, min_longitude,
+                            max_longitude, grid_width, query = "",
+                            subdivision_parent_id = "root",
+                            target_subdivision_id = "", resume = False):
+        """ Scrape subdivisions concurrently
+
+        Runs an event loop until the entire subdivision tree has been scraped.
+        See SubdivisionScraper.scrape_subdivisions for a description of the
+        algorithm and the arguments.
+        """
+
+        self.forget_hex_cells(query)
+
+        async def run():
+            self.semaphore = asyncio.Semaphore(self.max_in_flight)
+            await self.scrape_grid_async(min_latitude, max_latitude,
+                                         min_longitude, max_longitude,
+                                         grid_width, query,
+                                         subdivision_parent_id,
+                                         target_subdivision_id, resume)
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers = self.max_in_flight
+        )
+        try:
+            asyncio.run(run())
+        finally:
+            self.executor.shutdown()
+            self.executor = None
+            self.semaphore = None
+            if (self.journal is not None):
+                self.journal.sync()
+
+        self.print_redundancy()
+
+    async def scrape_grid_async(self, min_latitude, max_latitude,
+                                min_longitude, max_longitude, grid_width,
+                                query, subdivision_parent_id,
+                                target_subdivision_id, resume):
+        """ Scrape every cell of a grid concurrently
+
+        The pending cells of a query that was already started in self.journal
+        are scraped instead. See SubdivisionScraper.scrape_subdivisions.
+
+        Args:
+            See SubdivisionScraper.scrape_subdivisions.
+        """
+
+        if (self.journal is not None and self.journal.has_query(query)):
+            cells = [entry[0] for batch in self.resume_from_journal(query)
+                     for entry in batch]
+        else:
+            cells = self.clip_cells(self.make_cells(min_latitude, max_latitude,
+                                                    min_longitude,
+                                                    max_longitude, grid_width,
+                                                    subdivision_parent_id))
+            if (self.journal is not None):
+                self.journal.push(query, self.estimate_densities(cells))
+
+        await self.scrape_cells_async(cells, query, target_subdivision_id,
+                                      resume)
+
+    async def scrape_cells_async(self, cells, query, target_subdivision_id,
+                                 resume):
+        """ Scrape sibling cells concurrently
+
+        Args:
+            cells: A list of cell dictionaries generated by make_cells or
+                make_children.
+            See SubdivisionScraper.scrape_subdivisions for the other args.
+        """
+
+        tasks = []
+        for cell in cells:
+            action = self.subdivision_action(cell["id"], target_subdivision_id,
+                                             resume)
+            if (action == "skip"):
+                continue
+            elif (action == "stop"):
+                break
+
+            tasks.append(self.scrape_branch_async(cell, action, query,
+                                                  target_subdivision_id,
+                                                  resume))
+
+        await asyncio.gather(*tasks)
+
+    async def scrape_branch_async(self, cell, action, query,
+                                  target_subdivision_id, resume):
+        """ Scrape a cell and, if necessary, all of its children
+
+        Args:
+            cell: A cell dictionary generated by make_cells.
+            action: The string returned by subdivision_action for the cell.
+            See SubdivisionScraper.scrape_subdivisions for the other args.
+        """
+
+        if (self.journal is not None):
+            self.journal.start(query, cell)
+
+        # Cells that are not scraped are divided to reach the target, but are
+        # scraped anyway in adaptive mode. See scrape_subdivisions.
+        if (action == "divide" and self.split_mode != "adaptive"):
+            make_subdivisions, results = (True, None)
+        else:
+            make_subdivisions, results = await self.scrape_cell_results_async(
+                cell, query
+            )
+            make_subdivisions = make_subdivisions or (action == "divide")
+
+        children = []
+        if (make_subdivisions):
+            children = self.make_children(cell, results, query)
+        else:
+            self.events.debug("branch_terminated", "Branch terminated",
+                              id = cell["id"])
+
+        # The children are recorded before any of them is started
+        if (self.journal is not None):
+            self.journal.finish(query, cell,
+                                self.estimate_densities(children, results))
+        if (len(children) > 0):
+            await self.scrape_cells_async(children, query,
+                                          target_subdivision_id, resume)
+
+    async def scrape_cell_results_async(self, cell, query):
+        """ Scrape a single cell without blocking the event loop
+
+        Args:
+            See SubdivisionScraper.scrape_cell_results.
+
+        Returns:
+            See SubdivisionScraper.scrape_cell_results.
+        """
+
+        action = self.begin_cell(cell, query)
+        if (action == "scrape"):
+            self.scraping_cells[(query, cell["id"])] = cell
+            try:
+                results = await self.scrape_async(cell["center_latitude"],
+                                                  cell["center_longitude"],
+                                                  cell["radius_meters"],
+                                                  query,
+                                                  cell["id"])
+            finally:
+                del self.scraping_cells[(query, cell["id"])]
+            return (self.finish_cell(cell, query, results), results)
+
+        return ((action == "divide"), None)
+
+    async def scrape_async(self, *args):
+        """ Run self.scrape on the thread pool once a slot becomes available
+
+        Args:
+            See the documentation of the "scrape" attribute in
+            SubdivisionScraper.
+
+        Returns:
+            The array returned by self.scrape.
+        """
+
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, functools.partial(self.scrape, *args)
+            )
+
+    async def request_async(self, endpoint, **params):
+        """ Make a request to the Google Maps API without blocking the event
+        loop
+
+        Behaves like Scraper.request, but waits for the rate limiter with
+        asyncio and only holds a slot while the request is running.
+
+        Args:
+            See Scraper.request.
+
+        Returns:
+            The response returned by the googlemaps.Client method.
+        """
+
+        if (self.response_cache is not None):
+            response = self.response_cache.get(endpoint, params)
+            if (response is not None):
+                self.metrics.inc("gmaps_requests_total", endpoint = endpoint,
+                                 outcome = "cached")
+                return response
+
+        self.count_request(await self.rate_limiter.acquire_async())
+
+        async with self.semaphore:
+            response = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                functools.partial(self.send_request, endpoint, **params)
+            )
+        if (self.response_cache is not None):
+            self.response_cache.put(endpoint, params, response)
+        return response
+
+class AsyncPlacesNearbyScraper(AsyncSubdivisionScraper, PlacesNearbyScraper):
+    """ A concurrent version of PlacesNearbyScraper
+
+    Pages are requested one at a time by a coroutine instead of by
+    PlacesNearbyScraper.scrape, so that the wait for a next_page_token to
+    become valid does not hold a slot. While a cell waits for its next page,
+    other cells make their requests.
+
+    Attributes:
+        See AsyncSubdivisionScraper and PlacesNearbyScraper.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """ Initializes AsyncPlacesNearbyScraper class
+
+        Args:
+            See Scraper.__init__ and AsyncSubdivisionScraper.__init__.
+        """
+
+        PlacesNearbyScraper.__init__(self, *args, **kwargs)
+        AsyncSubdivisionScraper.__init__(self, **kwargs)
+
+    async def scrape_async(self, latitude, longitude, radius_meters, query,
+                           subdivision_id_string):
+        """ Get points of interest from the Google Maps API using places_nearby
+
+        See PlacesNearbyScraper.scrape. Retries are counted across all of the
+        pages of a cell, as they are there.
+
+        Args:
+            See the documentation of the "scrape" attribute in
+            SubdivisionScraper.
+
+        Returns:
+            A saturation.ScrapeResults array containing places returned by the
+            Google Maps API function.
+        """
+
+        combined_results = saturation.ScrapeResults(
+            result_cap = NEARBY_RESULT_CAP
+        )
+        params = {
+            "location": {
+                "lat": latitude,
+                "lng": longitude
+            },
+            "radius": radius_meters,
+            "type": query
+        }
+        page = 1
+        retries = 0
+
+        while True:
+            self.events.debug("page", "Retrieving page %d", page,
+                              id = subdivision_id_string)
+            try:
+                results = await self.request_async("places_nearby", **params)
+            except Exception as err:
+                self.events.warning("request_error", "Error: %s", err,
+                                    endpoint = "places_nearby",
+                                    id = subdivision_id_string)
+                self.log("error_log.csv", err)
+
+                await asyncio.sleep(RETRY_DELAY)
+
+                if (retries <= MAX_RETRIES):
+                    self.events.info("retry", "Retrying (attempt #%d)",
+                                     retries + 1, endpoint = "places_nearby")
+                    self.metrics.inc("gmaps_retries_total",
+                                     endpoint = "places_nearby")
+                    retries += 1
+                    continue
+
+                self.terminate_retries(latitude, longitude, radius_meters,
+                                       query, subdivision_id_string)
+                break
+
+            combined_results += results["results"]
+            if ("next_page_token" not in results):
+                break
+            # The API serves no more than NEARBY_MAX_PAGES pages
+            if (page >= NEARBY_MAX_PAGES):
+                combined_results.truncated = True
+                break
+
+            # The slot is given up while the token becomes valid
+            params["page_token"] = results["next_page_token"]
+            if (not self.is_cached("places_nearby", **params)):
+                await asyncio.sleep(self.page_token_delay)
+            page += 1
+
+        return combined_results
+
+class AsyncPlacesRadarScraper(AsyncSubdivisionScraper, PlacesRadarScraper):
+    """ A concurrent version of PlacesRadarScraper
+
+    Attributes:
+        See AsyncSubdivisionScraper and PlacesRadarScraper.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """ Initializes AsyncPlacesRadarScraper class
+
+        Args:
+            See Scraper.__init__ and AsyncSubdivisionScraper.__init__.
+        """
+
+        PlacesRadarScraper.__init__(self, *args, **kwargs)
+        AsyncSubdivisionScraper.__init__(self, **kwargs)
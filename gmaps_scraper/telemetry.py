@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+# Library providing counters and histograms of what scrapers spend their time
+# on, which can be exported in the Prometheus text format or as JSON
+
+import atexit
+import contextlib
+import http.server
+import json
+import os
+import threading
+import time
+
+# Upper bounds of the buckets of histograms of durations, in seconds
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+
+# Upper bounds of the buckets of histograms of numbers of results
+COUNT_BUCKETS = (0, 1, 5, 10, 20, 40, 60, 100, 200, 500, 1000)
+
+# The metrics recorded by scrapers, mapped to their help text and, for
+# histograms, their buckets
+METRICS = {
+    "gmaps_requests_total": (
+        "Requests by endpoint and outcome (ok, error or cached)", None
+    ),
+    "gmaps_request_seconds": (
+        "Time taken by requests that reached the API", SECONDS_BUCKETS
+    ),
+    "gmaps_errors_total": (
+        "Failed requests by endpoint and exception class", None
+    ),
+    "gmaps_retries_total": ("Attempts repeated after an error", None),
+    "gmaps_retries_exhausted_total": (
+        "Cells or places given up on after MAX_RETRIES attempts", None
+    ),
+    "gmaps_results_per_request": (
+        "Results returned by each request", COUNT_BUCKETS
+    ),
+    "gmaps_cells_total": (
+        "Cells begun by depth and action (scrape, divide or terminate)", None
+    ),
+    "gmaps_throttled_seconds_total": (
+        "Time spent waiting for the rate limiter", None
+    ),
+    "gmaps_dump_seconds": ("Time taken by calls to Writer.dump",
+                           SECONDS_BUCKETS),
+    "gmaps_dumped_records_total": ("Records passed to Writer.dump", None)
+}
+
+# Seconds between writes of a Prometheus text file
+TEXTFILE_INTERVAL = 15.0
+
+def metric_key(name, labels):
+    """ Identify a counter or histogram
+
+    Args:
+        name: A string containing the name of the metric.
+        labels: A dictionary mapping label names to values.
+
+    Returns:
+        A (name, labels) tuple, where labels is a sorted tuple of
+        (label, value) pairs whose values are strings.
+    """
+
+    return (name, tuple(sorted((label, str(value))
+                               for label, value in labels.items())))
+
+class Histogram(object):
+    """ Counts of observed values in buckets
+
+    Attributes:
+        buckets: A tuple of the upper bounds of the buckets, in increasing
+            order. Values above the last bound are only counted in count.
+        bucket_counts: A list of the number of values in each bucket, not
+            counting the values in lower buckets.
+        count: An integer indicating how many values were observed.
+        sum: A float of the sum of the observed values.
+        min, max: The smallest and largest observed values, or None if no
+            value was observed.
+    """
+
+    def __init__(self, buckets):
+        """ Initializes Histogram class
+
+        Args:
+            buckets: A tuple of the upper bounds of the buckets.
+        """
+
+        self.buckets = buckets
+        self.bucket_counts = [0]*len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        """ Add a value
+
+        Args:
+            value: A number.
+        """
+
+        for i, bound in enumerate(self.buckets):
+            if (value <= bound):
+                self.bucket_counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        if (self.min is None or value < self.min):
+            self.min = value
+        if (self.max is None or value > self.max):
+            self.max = value
+
+    def quantile(self, fraction):
+        """ Estimate a quantile from the buckets
+
+        Args:
+            fraction: A float between 0 and 1.
+
+        Returns:
+            The upper bound of the bucket the quantile lies in, capped by the
+            largest value, or None if no value was observed.
+        """
+
+        if (self.count == 0):
+            return None
+
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.bucket_counts):
+            seen += bucket_count
+            if (seen >= fraction*self.count):
+                return min(bound, self.max)
+        return self.max
+
+class Metrics(object):
+    """ A registry of counters and histograms
+
+    Every counter and histogram is identified by a name and a set of labels,
+    such as gmaps_requests_total{endpoint="places_nearby",outcome="ok"}. They
+    are created when they are first used. This is safe to use from multiple
+    threads, and one object can be shared by several scrapers.
+
+    Attributes:
+        counters: A dictionary mapping (name, labels) keys to numbers, where
+            labels is a sorted tuple of (label, value) pairs.
+        histograms: A dictionary mapping (name, labels) keys to Histogram
+            objects.
+        start_time: A float of the Unix time when the registry was created.
+        lock: A threading.Lock object guarding the counters and histograms.
+    """
+
+    def __init__(self):
+        """ Initializes Metrics class """
+
+        self.counters = {}
+        self.histograms = {}
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+
+    def inc(self, name, amount = 1, **labels):
+        """ Add to a counter
+
+        Args:
+            name: A string containing the name of the counter.
+            amount: A number to be added.
+            labels: Keyword arguments giving the labels of the counter.
+        """
+
+        key = metric_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """ Add a value to a histogram
+
+        The buckets of the histogram are taken from METRICS, or are
+        SECONDS_BUCKETS for histograms that are not listed there.
+
+        Args:
+            name: A string containing the name of the histogram.
+            value: A number.
+            labels: Keyword arguments giving the labels of the histogram.
+        """
+
+        key = metric_key(name, labels)
+        with self.lock:
+            if (key not in self.histograms):
+                buckets = METRICS.get(name, (None, None))[1]
+                self.histograms[key] = Histogram(buckets or SECONDS_BUCKETS)
+            self.histograms[key].observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """ Time a block of code and add the duration to a histogram
+
+        Args:
+            See observe.
+        """
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def value(self, name, **labels):
+        """ Get the value of a counter
+
+        Args:
+            See inc.
+
+        Returns:
+            The value of the counter, or 0 if it was never used.
+        """
+
+        key = metric_key(name, labels)
+        with self.lock:
+            return self.counters.get(key, 0)
+
+    def to_prometheus(self):
+        """ Export the metrics in the Prometheus text format
+
+        Returns:
+            A string.
+        """
+
+        def format_labels(labels, extra = ()):
+            pairs = ["%s=\"%s\"" % (label, value.replace("\\", "\\\\")
+                                    .replace("\"", "\\\"")
+                                    .replace("\n", "\\n"))
+                     for label, value in tuple(labels) + tuple(extra)]
+            if (len(pairs) == 0):
+                return ""
+            return "{%s}" % ",".join(pairs)
+
+        def header(name, kind):
+            return ["# HELP %s %s" % (name, METRICS.get(name, (name,))[0]),
+                    "# TYPE %s %s" % (name, kind)]
+
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(),
+                                key = lambda item: item[0])
+
+            previous_name = None
+            for (name, labels), value in counters:
+                if (name != previous_name):
+                    lines += header(name, "counter")
+                    previous_name = name
+                lines.append("%s%s %s" % (name, format_labels(labels),
+                                          repr(float(value))))
+
+            previous_name = None
+            for (name, labels), histogram in histograms:
+                if (name != previous_name):
+                    lines += header(name, "histogram")
+                    previous_name = name
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets,
+                                               histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append("%s_bucket%s %d" % (
+                        name,
+                        format_labels(labels, [("le", repr(float(bound)))]),
+                        cumulative
+                    ))
+                lines.append("%s_bucket%s %d" % (
+                    name, format_labels(labels, [("le", "+Inf")]),
+                    histogram.count
+                ))
+                lines.append("%s_sum%s %s" % (name, format_labels(labels),
+                                              repr(float(histogram.sum))))
+                lines.append("%s_count%s %d" % (name, format_labels(labels),
+                                                histogram.count))
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """ Summarize the metrics
+
+        Returns:
+            A dictionary with the keys "uptime_seconds", "counters" and
+            "histograms". Counters and histograms map each name to a list of
+            dictionaries, one for each set of labels, with the labels under
+            "labels". Histograms are summarized by their count, sum, mean,
+            min, max and estimated median (p50) and 99th percentile (p99).
+        """
+
+        counters = {}
+        histograms = {}
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, []).append({
+                    "labels": dict(labels),
+                    "value": value
+                })
+            for (name, labels), histogram in sorted(
+                    self.histograms.items(), key = lambda item: item[0]):
+                histograms.setdefault(name, []).append({
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "mean": (histogram.sum/histogram.count
+                             if (histogram.count > 0) else None),
+                    "min": histogram.min,
+                    "max": histogram.max,
+                    "p50": histogram.quantile(0.5),
+                    "p99": histogram.quantile(0.99)
+                })
+
+        return {
+            "uptime_seconds": time.time() - self.start_time,
+            "counters": counters,
+            "histograms": histograms
+        }
+
+    def write_prometheus(self, path):
+        """ Write the metrics to a Prometheus text file
+
+        The file is replaced atomically, so that a collector such as the
+        node_exporter textfile collector never reads half of it.
+
+        Args:
+            path: A string containing the path of the file.
+        """
+
+        temporary_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(temporary_path, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(temporary_path, path)
+
+    def write_summary(self, path):
+        """ Write a summary of the metrics to a JSON file
+
+        Args:
+            path: A string containing the path of the file.
+        """
+
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent = 4)
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """ Answers requests for /metrics with the server's metrics """
+
+    def do_GET(self):
+        """ Answer a request for /metrics """
+
+        if (self.path.split("?")[0] != "/metrics"):
+            self.send_error(404)
+            return
+
+        data = self.server.metrics.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *dummy_args):
+        """ Keep requests out of the output """
+
+        pass
+
+class MetricsServer(http.server.ThreadingHTTPServer):
+    """ Serves metrics at /metrics over HTTP for Prometheus to scrape
+
+    Attributes:
+        metrics: The Metrics object being served.
+        url: A string containing the base URL of the server.
+        thread: The threading.Thread object serving requests, or None if the
+            server is not running.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, metrics, host = "127.0.0.1", port = 0):
+        """ Initializes MetricsServer class
+
+        Args:
+            metrics: A Metrics object.
+            host: A string containing the address to listen on.
+            port: An integer describing the port to listen on. By default, a
+                free port is chosen.
+        """
+
+        http.server.ThreadingHTTPServer.__init__(self, (host, port),
+                                                 MetricsRequestHandler)
+        self.metrics = metrics
+        self.url = "http://%s:%d" % self.server_address[:2]
+        self.thread = None
+
+    def start(self):
+        """ Start serving requests on a background thread
+
+        Returns:
+            The server, so that it can be started as it is made.
+        """
+
+        self.thread = threading.Thread(target = self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """ Stop serving requests and close the socket """
+
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+        self.thread = None
+
+class TextfileExporter(object):
+    """ Writes metrics to a Prometheus text file every few seconds
+
+    Attributes:
+        metrics: The Metrics object being exported.
+        path: A string containing the path of the file.
+        interval: A float describing the number of seconds between writes.
+        stopped: A threading.Event object that is set to stop writing.
+        thread: The threading.Thread object writing the file, or None if it is
+            not running.
+    """
+
+    def __init__(self, metrics, path, interval = TEXTFILE_INTERVAL):
+        """ Initializes TextfileExporter class
+
+        Args:
+            See the attributes.
+        """
+
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def run(self):
+        """ Write the file until stopped """
+
+        while (not self.stopped.wait(self.interval)):
+            self.metrics.write_prometheus(self.path)
+
+    def start(self):
+        """ Start writing the file on a background thread
+
+        Returns:
+            The exporter, so that it can be started as it is made.
+        """
+
+        self.thread = threading.Thread(target = self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """ Stop writing and write the file one last time """
+
+        self.stopped.set()
+        if (self.thread is not None):
+            self.thread.join()
+            self.thread = None
+        self.metrics.write_prometheus(self.path)
+
+def export_at_exit(metrics, summary_path = None, textfile_path = None):
+    """ Write the metrics when the interpreter exits
+
+    Args:
+        metrics: A Metrics object.
+        summary_path: An optional string containing the path of a JSON file
+            that a summary is written to. See Metrics.summary.
+        textfile_path: An optional string containing the path of a Prometheus
+            text file.
+    """
+
+    def export():
+        if (textfile_path is not None):
+            metrics.write_prometheus(textfile_path)
+        if (summary_path is not None):
+            metrics.write_summary(summary_path)
+            print("Wrote a summary of the metrics to %s" % summary_path)
+
+    atexit.register(export)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# Tests of the durable structures provided by frontier.py
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from gmaps_scraper import frontier
+
+def make_cell(subdivision_id):
+    """ Make a minimal cell dictionary
+
+    Args:
+        subdivision_id: A string containing the subdivision ID of the cell.
+
+    Returns:
+        A cell dictionary with only an ID.
+    """
+
+    return {"id": subdivision_id}
+
+class CellJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "journal.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resume_after_torn_record(self):
+        journal = frontier.CellJournal(self.path)
+        journal.push("q", [(make_cell("root -> 1"), 1.0),
+                           (make_cell("root -> 2"), 2.0)])
+        journal.start("q", make_cell("root -> 1"))
+        journal.close()
+
+        # A scraper killed while writing leaves half of its last record
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(0)
+            lines = f.read().split(b"\n")
+            last = lines[-2]
+            f.truncate(size - 1 - len(last)//2)
+
+        journal = frontier.CellJournal(self.path)
+        journal.finish("q", make_cell("root -> 1"),
+                       [(make_cell("root -> 1 -> 1"), 3.0)])
+        journal.close()
+
+        journal = frontier.CellJournal(self.path)
+        pending = [entry[0]["id"] for batch in journal.pending("q")
+                   for entry in batch]
+        journal.close()
+        self.assertEqual(pending, ["root -> 2", "root -> 1 -> 1"])
+        self.assertTrue(journal.is_finished("q", "root -> 1"))
+
+class FrontierTests(object):
+    """ Tests shared by every frontier, which are run by subclasses that
+    define make_frontier """
+
+    def test_lease_and_complete(self):
+        shared_frontier = self.make_frontier()
+        shared_frontier.push([make_cell("root -> 1"), make_cell("root -> 2")],
+                             "q")
+        (cell, query) = shared_frontier.lease("a")
+        self.assertEqual((cell["id"], query), ("root -> 1", "q"))
+        self.assertEqual(shared_frontier.lease("b")[0]["id"], "root -> 2")
+        self.assertIsNone(shared_frontier.lease("c"))
+
+        shared_frontier.complete(cell, query, [make_cell("root -> 1 -> 1")])
+        # Cells that are already known are not pushed again
+        shared_frontier.push([make_cell("root -> 1")], "q")
+        self.assertEqual(shared_frontier.outstanding(), 2)
+        self.assertEqual(shared_frontier.lease("a")[0]["id"],
+                         "root -> 1 -> 1")
+        self.assertIsNone(shared_frontier.lease("a"))
+
+    def test_release(self):
+        shared_frontier = self.make_frontier()
+        shared_frontier.push([make_cell("root -> 1")], "q")
+        (cell, query) = shared_frontier.lease("a")
+        shared_frontier.release(cell, query)
+        self.assertEqual(shared_frontier.lease("b")[0]["id"], "root -> 1")
+
+    def test_expired_lease(self):
+        shared_frontier = self.make_frontier(lease_length = 0.05)
+        shared_frontier.push([make_cell("root -> 1")], "q")
+        shared_frontier.lease("a")
+        self.assertIsNone(shared_frontier.lease("b"))
+
+        # The worker holding the lease has crashed
+        time.sleep(0.1)
+        (cell, query) = shared_frontier.lease("b")
+        self.assertEqual(cell["id"], "root -> 1")
+        shared_frontier.complete(cell, query)
+        self.assertEqual(shared_frontier.outstanding(), 0)
+
+    def test_shared_by_workers(self):
+        first = self.make_frontier()
+        second = self.make_frontier()
+        first.push([make_cell("root -> %d" % i) for i in range(1, 10)], "q")
+        second.push([make_cell("root -> %d" % i) for i in range(1, 10)], "q")
+
+        leased = []
+        for i in range(9):
+            shared_frontier = first if (i % 2 == 0) else second
+            leased.append(shared_frontier.lease()[0]["id"])
+        self.assertEqual(sorted(leased),
+                         ["root -> %d" % i for i in range(1, 10)])
+        self.assertIsNone(first.lease())
+        self.assertIsNone(second.lease())
+
+class SQLite3FrontierTest(FrontierTests, unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.frontiers = []
+
+    def tearDown(self):
+        for shared_frontier in self.frontiers:
+            shared_frontier.connection.close()
+        shutil.rmtree(self.directory)
+
+    def make_frontier(self, lease_length = frontier.LEASE_LENGTH):
+        shared_frontier = frontier.SQLite3Frontier(
+            os.path.join(self.directory, "frontier.db"), lease_length
+        )
+        self.frontiers.append(shared_frontier)
+        return shared_frontier
+
+class RedisFrontierTest(FrontierTests, unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if (not hasattr(frontier, "RedisFrontier")):
+            raise unittest.SkipTest("redis is not installed")
+        cls.name = "test_frontier_%d" % os.getpid()
+        try:
+            frontier.RedisFrontier(cls.name).flush()
+        except Exception as err:
+            raise unittest.SkipTest("Redis is not running: %s" % err)
+
+    def setUp(self):
+        frontier.RedisFrontier(self.name).flush()
+
+    def tearDown(self):
+        frontier.RedisFrontier(self.name).flush()
+
+    def make_frontier(self, lease_length = frontier.LEASE_LENGTH):
+        return frontier.RedisFrontier(self.name, lease_length)
+
+class SQLite3FailureLedgerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, "failures.db")
+        self.ledger = frontier.SQLite3FailureLedger(self.db_path)
+
+    def tearDown(self):
+        self.ledger.close()
+        shutil.rmtree(self.directory)
+
+    def test_record_and_resolve(self):
+        # The database is only created when a failure is recorded
+        self.assertFalse(os.path.exists(self.db_path))
+
+        self.ledger.record("places_nearby", "cafe", make_cell("root -> 1"),
+                           reason = "timeout")
+        self.ledger.record("places_radar", "cafe", make_cell("root -> 2"))
+        self.ledger.record("places_nearby", "cafe", make_cell("root -> 1"))
+        failures = self.ledger.unresolved("places_nearby")
+        self.assertEqual([(failure["cell"]["id"], failure["failures"])
+                          for failure in failures], [("root -> 1", 2)])
+        self.assertEqual(self.ledger.outstanding(), 2)
+
+        self.assertTrue(self.ledger.resolve(failures[0]))
+        self.assertEqual(self.ledger.unresolved("places_nearby"), [])
+        self.assertEqual(self.ledger.outstanding(), 1)
+
+    def test_failed_again_before_resolved(self):
+        self.ledger.record("places_nearby", "cafe", make_cell("root -> 1"))
+        failure = self.ledger.unresolved()[0]
+
+        # Another scraper fails on the cell while it is being scraped again
+        other_ledger = frontier.SQLite3FailureLedger(self.db_path)
+        other_ledger.record("places_nearby", "cafe", make_cell("root -> 1"))
+        other_ledger.close()
+
+        self.assertFalse(self.ledger.resolve(failure))
+        self.assertEqual(self.ledger.unresolved()[0]["failures"], 2)
+        self.assertTrue(self.ledger.resolve(self.ledger.unresolved()[0]))
+
+        # A resolved cell that fails again is unresolved again
+        self.ledger.record("places_nearby", "cafe", make_cell("root -> 1"))
+        self.assertEqual(self.ledger.outstanding(), 1)
+
+if (__name__ == "__main__"):
+    unittest.main()
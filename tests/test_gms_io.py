@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# Tests of the duplicate checker and checkpoint ledger provided by gms_io.py
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from gmaps_scraper import gms_io
+
+class SQLite3DuplicateCheckerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, "seen_places.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_check_many(self):
+        checker = gms_io.SQLite3DuplicateChecker(db_path = self.db_path)
+        self.assertEqual(checker.check_many(["a", "b", "a"]),
+                         [True, True, False])
+        self.assertFalse(checker.check("b"))
+        self.assertTrue(checker.check("c"))
+        checker.close()
+
+    def test_legacy_table(self):
+        # Earlier versions kept every id given to them, without an index
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("CREATE TABLE seen_places (id TEXT)")
+        connection.executemany("INSERT INTO seen_places VALUES (?)",
+                               [("a",), ("b",), ("a",), ("a",)])
+        connection.commit()
+        connection.close()
+
+        checker = gms_io.SQLite3DuplicateChecker(db_path = self.db_path)
+        self.assertFalse(checker.check("a"))
+        self.assertEqual(checker.check_many(["b", "c", "c"]),
+                         [False, True, False])
+        self.assertEqual(checker.connection.execute(
+            "SELECT id, Count(*) FROM seen_places GROUP BY id ORDER BY id"
+        ).fetchall(), [("a", 1), ("b", 1), ("c", 1)])
+        checker.close()
+
+        # A migrated table is not deduplicated again
+        checker = gms_io.SQLite3DuplicateChecker(db_path = self.db_path)
+        statements = []
+        checker.connection.set_trace_callback(statements.append)
+        checker.index_table()
+        self.assertEqual(statements, ["PRAGMA table_info(seen_places)",
+                                      "PRAGMA index_list(seen_places)"])
+        self.assertFalse(checker.check("c"))
+        checker.close()
+
+class SQLite3CheckpointLedgerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, "checkpoint.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replay_after_crash(self):
+        ledger = gms_io.SQLite3CheckpointLedger(self.db_path)
+        # The API can answer with a place_id other than the requested one
+        ledger.record("requested_1", {"place_id": "canonical_1"})
+        ledger.record("requested_2", {"place_id": "requested_2"})
+        ledger.mark_dumped(["requested_2"])
+        ledger.record("requested_3", {"place_id": "requested_3"})
+        ledger.commit()
+        ledger.connection.close()
+
+        # The scrape is restarted with the same ledger
+        ledger = gms_io.SQLite3CheckpointLedger(self.db_path)
+        self.assertEqual(sorted(ledger.undumped_results()), [
+            ("requested_1", {"place_id": "canonical_1"}),
+            ("requested_3", {"place_id": "requested_3"})
+        ])
+        for place_id in ("requested_1", "requested_2", "requested_3"):
+            self.assertTrue(ledger.contains(place_id))
+        self.assertFalse(ledger.contains("canonical_1"))
+
+        ledger.mark_dumped(["requested_1", "requested_3"])
+        self.assertEqual(ledger.undumped_results(), [])
+        ledger.connection.close()
+
+    def test_uncommitted_records_are_lost(self):
+        ledger = gms_io.SQLite3CheckpointLedger(self.db_path,
+                                                batch_size = 2,
+                                                batch_seconds = 3600)
+        ledger.record("place_1", {"place_id": "place_1"})
+        ledger.record("place_2", {"place_id": "place_2"})
+        ledger.record("place_3", {"place_id": "place_3"})
+
+        # Only whole batches survive a crash
+        other_ledger = gms_io.SQLite3CheckpointLedger(self.db_path)
+        self.assertEqual(sorted(place_id for (place_id, result)
+                                in other_ledger.undumped_results()),
+                         ["place_1", "place_2"])
+        other_ledger.connection.close()
+        ledger.connection.close()
+
+if (__name__ == "__main__"):
+    unittest.main()
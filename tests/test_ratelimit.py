@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# Tests of the rate limiters provided by ratelimit.py
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from gmaps_scraper import ratelimit
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        bucket = ratelimit.TokenBucket(rate = 10, capacity = 2)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        # Requests that find the bucket empty wait for their own token
+        self.assertAlmostEqual(bucket.reserve(), 0.1, delta = 0.01)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, delta = 0.01)
+
+    def test_from_period(self):
+        bucket = ratelimit.TokenBucket.from_period(100, 10, capacity = 10)
+        self.assertEqual(bucket.rate, 9.0)
+        self.assertEqual(bucket.capacity, 10.0)
+
+class SQLite3RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, "quota.db")
+        self.limiters = []
+
+    def tearDown(self):
+        for limiter in self.limiters:
+            limiter.connection.close()
+        shutil.rmtree(self.directory)
+
+    def make_limiter(self, name = "default"):
+        """ Make a rate limiter using the test database
+
+        Args:
+            name: A string containing the name of the bucket.
+
+        Returns:
+            A ratelimit.SQLite3RateLimiter object.
+        """
+
+        limiter = ratelimit.SQLite3RateLimiter(10, capacity = 1,
+                                               db_path = self.db_path,
+                                               name = name)
+        self.limiters.append(limiter)
+        return limiter
+
+    def test_shared_bucket(self):
+        # Limiters made by different processes share one quota
+        first = self.make_limiter()
+        second = self.make_limiter()
+        self.assertEqual(first.reserve(), 0.0)
+        self.assertAlmostEqual(second.reserve(), 0.1, delta = 0.01)
+        self.assertAlmostEqual(first.reserve(), 0.2, delta = 0.01)
+
+        # Buckets with other names have quotas of their own
+        self.assertEqual(self.make_limiter("other").reserve(), 0.0)
+
+    def test_bucket_survives_restart(self):
+        limiter = self.make_limiter()
+        limiter.reserve()
+        limiter.reserve()
+        limiter.connection.close()
+        self.limiters.remove(limiter)
+
+        self.assertAlmostEqual(self.make_limiter().reserve(), 0.2,
+                               delta = 0.01)
+
+if (__name__ == "__main__"):
+    unittest.main()
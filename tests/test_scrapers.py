@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# Tests of the scrapers provided by scrapers.py, against a fake client
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from gmaps_scraper import eventlog
+from gmaps_scraper import frontier
+from gmaps_scraper import gms_io
+from gmaps_scraper import scrapers
+
+class FlakyClient(object):
+    """ A stand-in for googlemaps.Client whose first requests fail
+
+    Attributes:
+        failures_left: An integer describing the number of requests that fail
+            before requests start succeeding.
+        calls: An integer describing the number of requests made.
+    """
+
+    def __init__(self, failures):
+        """ Initializes FlakyClient class
+
+        Args:
+            failures: An integer describing the number of requests that fail.
+        """
+
+        self.failures_left = failures
+        self.calls = 0
+
+    def attempt(self):
+        """ Count a request, failing it if failures are left """
+
+        self.calls += 1
+        if (self.failures_left > 0):
+            self.failures_left -= 1
+            raise Exception("Simulated failure")
+
+    def places_radar(self, **params):
+        self.attempt()
+        return {"results": [{"place_id": "p1"}]}
+
+    def place(self, place_id):
+        return {"result": {"place_id": place_id}}
+
+class ScraperTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output_directory_root = scrapers.OUTPUT_DIRECTORY_ROOT
+        self.retry_delay = scrapers.RETRY_DELAY
+        scrapers.OUTPUT_DIRECTORY_ROOT = self.directory
+        scrapers.RETRY_DELAY = 0
+        self.failures = frontier.SQLite3FailureLedger(
+            os.path.join(self.directory, "failures.db")
+        )
+        self.scrapers = []
+
+    def tearDown(self):
+        self.failures.close()
+        # The logs are written on a background thread
+        for scraper in self.scrapers:
+            scraper.events.writer.release(scraper.output_directory)
+            scraper.events.writer.flush()
+        scrapers.OUTPUT_DIRECTORY_ROOT = self.output_directory_root
+        scrapers.RETRY_DELAY = self.retry_delay
+        shutil.rmtree(self.directory)
+
+    def make_scraper(self, scraper_class, gmaps):
+        """ Make a scraper writing nothing outside of the test directory
+
+        Args:
+            scraper_class: A subclass of SubdivisionScraper.
+            gmaps: A stand-in for googlemaps.Client.
+
+        Returns:
+            An instance of scraper_class.
+        """
+
+        # Nothing is printed, as failures are expected
+        scraper = scraper_class(gmaps, output_directory_name = "test",
+                                writer = gms_io.NullWriter(),
+                                flush_duplicates = False,
+                                failures = self.failures,
+                                log_level = eventlog.ERROR + 1)
+        self.scrapers.append(scraper)
+        return scraper
+
+class RetryTest(ScraperTestCase):
+
+    def test_last_attempt_succeeds(self):
+        for scraper_class in (scrapers.PlacesRadarScraper,
+                              scrapers.PlacesTextScraper):
+            gmaps = FlakyClient(scrapers.MAX_RETRIES - 1)
+            scraper = self.make_scraper(scraper_class, gmaps)
+            results = scraper.scrape(42.3, -71.1, 1000, "cafe", "root")
+
+            self.assertEqual(gmaps.calls, scrapers.MAX_RETRIES)
+            self.assertEqual([result["place_id"] for result in results],
+                             ["p1"])
+            self.assertEqual(self.failures.unresolved(), [])
+
+    def test_every_attempt_fails(self):
+        gmaps = FlakyClient(scrapers.MAX_RETRIES)
+        scraper = self.make_scraper(scrapers.PlacesRadarScraper, gmaps)
+        results = scraper.scrape(42.3, -71.1, 1000, "cafe", "root")
+
+        self.assertEqual(list(results), [])
+        self.assertEqual([failure["cell"]["id"]
+                          for failure in self.failures.unresolved()],
+                         ["root"])
+
+        # Nothing is retried after the last attempt
+        self.assertEqual(scraper.metrics.value("gmaps_retries_total",
+                                               endpoint = "places_radar"),
+                         scrapers.MAX_RETRIES - 1)
+        self.assertEqual(scraper.metrics.value(
+            "gmaps_retries_exhausted_total", kind = "cell"
+        ), 1)
+
+    def test_every_place_attempt_fails(self):
+        gmaps = FlakyClient(scrapers.MAX_RETRIES)
+        gmaps.place = lambda place_id: gmaps.places_radar()
+        scraper = self.make_scraper(scrapers.PlacesTextScraper, gmaps)
+
+        self.assertIsNone(scraper.fetch_place("p1"))
+        self.assertEqual(scraper.metrics.value("gmaps_retries_total",
+                                               endpoint = "place"),
+                         scrapers.MAX_RETRIES - 1)
+
+if (__name__ == "__main__"):
+    unittest.main()